@@ -0,0 +1,7 @@
+"""Frozen former implementations, the reference of the speed-ups measured by
+src/analysis/benchmark_suite.py and of the equivalence tests in tests.
+
+The functions are copies of the code before it was vectorized and must not be
+changed or used outside of the benchmarks and tests.
+
+"""
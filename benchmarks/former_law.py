@@ -0,0 +1,57 @@
+"""Former Sainte-Lague procedures of functions_law, as of 87fd276^."""
+import pandas as pd
+
+
+def sainte_lague_new_loops(preliminary_divisor, data, available_seats):
+    """Former sainte_lague_new of functions_law, stepping the divisor by 50."""
+
+    # Jede Landesliste (jedes Bundesland) erhält so viele Sitze, wie sich nach Teilung der Summe
+    # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben.
+    allocated_seats = data.divide(preliminary_divisor).copy()
+    # "Zahlenbruchteile unter 0,5 werden auf die darunter liegende ganze Zahl abgerundet,
+    #  solche über 0,5 werden auf die darüber liegende ganze Zahl aufgerundet. "
+    allocated_seats = allocated_seats.round(0).astype(int)
+
+    # Calculate sum of listenplaetze after first iteration
+    sum_of_seats = allocated_seats.sum()
+
+    if sum_of_seats != available_seats:
+        if sum_of_seats > available_seats:
+            preliminary_divisor = preliminary_divisor + 50
+        elif sum_of_seats < available_seats:
+            preliminary_divisor = preliminary_divisor - 50
+        allocated_seats = sainte_lague_new_loops(
+            preliminary_divisor, data, available_seats
+        )
+
+    return allocated_seats
+
+
+def sainte_lague_last_loops(preliminary_divisor, data, available_seats, direktmandate):
+    """Former sainte_lague_last of functions_law, stepping the divisor by 50."""
+
+    # Jede Landesliste (jedes Bundesland) erhält so viele Sitze, wie sich nach Teilung der Summe
+    # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben.
+    prel_allocated_seats = data.divide(preliminary_divisor).copy()
+
+    # "Zahlenbruchteile unter 0,5 werden auf die darunter liegende ganze Zahl abgerundet,
+    #  solche über 0,5 werden auf die darüber liegende ganze Zahl aufgerundet. "
+    prel_allocated_seats = prel_allocated_seats.round(0).astype(int)
+    allocated_seats = pd.concat([prel_allocated_seats, direktmandate]).max(level=0)
+
+    # Calculate sum of listenplaetze after first iteration
+    sum_of_seats = allocated_seats.sum()
+
+    if sum_of_seats != available_seats:
+        if sum_of_seats > available_seats:
+            preliminary_divisor = preliminary_divisor + 50
+        elif sum_of_seats < available_seats:
+            preliminary_divisor = preliminary_divisor - 50
+        allocated_seats = sainte_lague_last_loops(
+            preliminary_divisor,
+            data,
+            available_seats,
+            direktmandate,
+        )
+
+    return allocated_seats
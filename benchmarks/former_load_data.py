@@ -0,0 +1,185 @@
+"""Former cleanup of the 2017 files in load_data.py, as of 31ad826^."""
+import numpy as np
+
+from src.data_management.functions_load import BUNDESLÄNDER
+from src.data_management.functions_load import KÜRZEL
+
+
+def clean_election_results_loops(data):
+    """Former cleanup of btw2017_kerg.csv in load_data.py."""
+
+    data = data.copy()
+    delete = ["Nr", "gehört zu", "Vorperiode"]
+    for item in delete:
+        data = data.loc[:, ~(data == item).any()]
+        data.columns = range(data.shape[1])
+
+    delete = ["Wahlberechtigte", "Wähler", "Ungültige", "Gültige"]
+    for item in delete:
+        erststimmen = data.loc[:, (data == item).any()].columns[0]
+        zweitstimmen = erststimmen
+        data.drop(data.columns[erststimmen], axis=1, inplace=True)
+        data.drop(data.columns[zweitstimmen], axis=1, inplace=True)
+        data.columns = range(data.shape[1])
+
+    for i in range(1, data.shape[1], 2):
+        data.loc[0, i + 1] = data.loc[0, i]
+
+    data.drop(index=2, inplace=True)
+    data.reset_index(inplace=True, drop=True)
+    data = data.T
+
+    zero_cols = []
+    for column in range(0, data.shape[1], 1):
+        if data[column].isnull().all():
+            zero_cols.append(column)
+    data.drop(columns=zero_cols, inplace=True)
+    data.columns = range(data.shape[1])
+
+    zero_rows = []
+    for row in range(0, len(data.index), 1):
+        if data.loc[row, :].isnull().all():
+            zero_rows.append(row)
+    data.drop(index=zero_rows, inplace=True)
+    data.columns = data.loc[0, :]
+    data.drop(index=0, inplace=True)
+    data.reset_index(drop=True, inplace=True)
+
+    data.rename(columns={"Gebiet": "Partei", np.nan: "Stimme"}, inplace=True)
+    data.fillna(0, inplace=True)
+
+    parteien = {
+        "Christlich Demokratische Union Deutschlands": "CDU",
+        "Sozialdemokratische Partei Deutschlands": "SPD",
+        "Christlich-Soziale Union in Bayern e.V.": "CSU",
+        "BÜNDNIS 90/DIE GRÜNEN": "Grüne",
+        "Freie Demokratische Partei": "FDP",
+        "Alternative für Deutschland": "AfD",
+    }
+    for partei in parteien.keys():
+        data = data.replace(partei, parteien[partei])
+
+    return data
+
+
+def clean_population_loops(data):
+    """Former cleanup of bevoelkerung_2016.csv in load_data.py."""
+
+    data = data.drop(columns=[0, 3, 4, 6, 7, 8, 9, 10, 11])
+    data.columns = range(data.shape[1])
+    data.loc[0, 0] = "Bundesland"
+    data.loc[0, 1] = "Altersgruppe"
+
+    zero_rows = []
+    for row in range(0, len(data.index), 1):
+        if data.loc[row, :].isnull().all():
+            zero_rows.append(row)
+    data.drop(index=zero_rows, inplace=True)
+    data.columns = data.loc[0, :]
+    data.drop(index=[0, 1], inplace=True)
+    data.reset_index(drop=True, inplace=True)
+
+    data = data[(data == "Insgesamt").any(axis=1)]
+    data = data.drop(columns=["Altersgruppe"])
+    data.reset_index(drop=True, inplace=True)
+
+    return data
+
+
+def wahlkreise_by_bundesland_loops(raw_data):
+    """Former collection of the Wahlkreise by Bundesland in load_data.py."""
+
+    bundesländer_col = {}
+    for bundesland in BUNDESLÄNDER.values():
+        bundesländer_col[bundesland] = raw_data.columns.get_loc(bundesland)
+
+    bundesländer_col["Stimme"] = 1
+    bundesländer_col = dict(sorted(bundesländer_col.items(), key=lambda item: item[1]))
+    bundesländer_wahlkreise = {}
+
+    previous_key = "Stimme"
+    for key in bundesländer_col:
+        bundesländer_wahlkreise[key] = raw_data.columns[
+            (bundesländer_col[previous_key] + 1) : (bundesländer_col[key])
+        ].tolist()
+        previous_key = key
+    bundesländer_wahlkreise.pop("Stimme", None)
+
+    return bundesländer_wahlkreise
+
+
+def candidate_lists_loops(data):
+    """Former split of the Bewerber in load_data.py."""
+
+    data = data.copy()
+    data["Bundesland"] = data["Wahlkreis_Land"]
+    data["Bundesland"].fillna(data["Liste_Land"], inplace=True)
+    kürzel = {key: BUNDESLÄNDER[code] for key, code in KÜRZEL.items()}
+    data["Bundesland"].replace(kürzel, inplace=True)
+    data["Partei"] = data["Wahlkreis_ParteiBez"]
+    data["Partei"].fillna(data["Liste_ParteiBez"], inplace=True)
+
+    listen = {}
+    for bundesland in list(set(data["Bundesland"].tolist())):
+        bundesland_df = data[data["Bundesland"] == bundesland].copy()
+        key_value = {}
+        for partei in list(set(bundesland_df["Partei"].tolist())):
+            key_value[partei] = bundesland_df[bundesland_df["Partei"] == partei].copy()
+            key_value[partei].drop(
+                columns=[
+                    "Wahlkreis_Land",
+                    "Wahlkreis_ParteiBez",
+                    "Wahlkreis_ParteiKurzBez",
+                    "Liste_Land",
+                    "Liste_ParteiBez",
+                    "Liste_ParteiKurzBez",
+                    "Bundesland",
+                    "Partei",
+                ],
+                inplace=True,
+            )
+            key_value[partei].sort_values(by=["Liste_Platz"], inplace=True)
+            key_value[partei].reset_index(inplace=True, drop=True)
+        listen[bundesland] = key_value
+
+    return listen
+
+
+def gemeinden_wahlkreise_loops(data):
+    """Former assignment of Gemeinden to Wahlkreise in load_data.py."""
+
+    data = data.copy()
+    data["Gemeindename"] = [s.split(", ", 1)[0] for s in data["Gemeindename"].tolist()]
+
+    gemeinde_wahlkreis = {}
+    for index in range(len(data["Gemeindename"].tolist())):
+        gemeinde_wahlkreis[data["Gemeindename"].iloc[index]] = data[
+            "Wahlkreis-Bez"
+        ].iloc[index]
+
+    return gemeinde_wahlkreis
+
+
+def clean_loops(files):
+    """Former cleanup of all 2017 files, same steps as the "2017/load_data_clean"
+    benchmark.
+
+    Input:
+    files (dict): output of read_files of benchmark_suite
+
+    Output:
+    cleaned (dict): "raw_data", "bundesländer_wahlkreise", "population",
+        "listen" and "gemeinde_wahlkreis"
+
+    """
+
+    raw_data = clean_election_results_loops(files["kerg"])
+    cleaned = {
+        "raw_data": raw_data,
+        "bundesländer_wahlkreise": wahlkreise_by_bundesland_loops(raw_data),
+        "population": clean_population_loops(files["population"]),
+        "listen": candidate_lists_loops(files["bewerber"]),
+        "gemeinde_wahlkreis": gemeinden_wahlkreise_loops(files["gemeinden"]),
+    }
+
+    return cleaned
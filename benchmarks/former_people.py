@@ -0,0 +1,29 @@
+"""Former allocation of the list seats in functions_people."""
+
+
+def allocate_listenplaetze_loops(
+    listen_by_party_and_bundesland,
+    bundesländer,
+    eligible_parties,
+    available_list_seats,
+):
+    """Former allocate_listenplaetze of functions_people, as of c4c20eb^."""
+
+    for bundesland in bundesländer:
+        parteilisten = listen_by_party_and_bundesland[bundesland].copy()
+        for partei in eligible_parties:
+            if available_list_seats.loc[partei, bundesland] > 0:
+                to_replace = (
+                    parteilisten[partei]
+                    .loc[parteilisten[partei]["Sitz_Bundestag"] == 0]
+                    .copy()
+                )
+                to_replace["Sitz_Bundestag"].iloc[
+                    : (available_list_seats.loc[partei, bundesland])
+                ] = 1
+                parteilisten[partei].loc[
+                    parteilisten[partei]["Sitz_Bundestag"] == 0
+                ] = to_replace
+        listen_by_party_and_bundesland[bundesland] = parteilisten
+
+    return listen_by_party_and_bundesland
@@ -0,0 +1,663 @@
+"""Benchmark suite of the seat allocation and the data pipeline.
+
+Every benchmark is timed on the results of the Bundestagswahl 2017 (as prepared
+by load_data.py) and, where the input can be scaled, on a synthetic election
+with 50 parties and 2,000 Wahlkreise. The best time of several runs and the peak
+memory allocated during one run (traced with tracemalloc) are compared against a
+stored baseline; the suite fails if a benchmark got slower or needs more memory
+than the baseline times a threshold. Benchmarks named "<name>_former" time the
+frozen former implementation (package benchmarks) of benchmark "<name>", the
+suite reports the speed-up between both.
+
+Run from the root of the project with python -m src.analysis.benchmark_suite,
+--update stores the current results as new baseline. If numba is installed, the
+suite first checks that the compiled kernels give the same allocations as the
+NumPy backend and fails otherwise.
+
+"""
+import argparse
+import copy
+import json
+import pickle
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.former_load_data import clean_loops
+from benchmarks.former_people import allocate_listenplaetze_loops
+from src.analysis.functions_kernels import BACKEND
+from src.analysis.functions_kernels import COMPILED
+from src.analysis.functions_law import allocation_seats_after2013
+from src.analysis.functions_law import bundestagswahl_2013_2017
+from src.analysis.functions_law import direktmandate
+from src.analysis.functions_law import eligible_parties
+from src.analysis.functions_law import memoized_initial_seats
+from src.analysis.functions_law import sainte_lague_last
+from src.analysis.functions_law import sainte_lague_new
+from src.analysis.functions_law import sainte_lague_report
+from src.analysis.functions_law import votes_by_stimme
+from src.analysis.functions_law import votes_frame
+from src.analysis.functions_law_arrays import bundestagswahl_2013_2017_arrays
+from src.analysis.functions_law_arrays import sainte_lague_batch_report
+from src.analysis.functions_people import allocate_listenplaetze
+from src.analysis.functions_people import candidate_table
+from src.analysis.functions_people import keep_eligible_parties
+from src.analysis.functions_people import mark_direktmandate
+from src.analysis.functions_people import prepare_lists
+from src.analysis.functions_people import tag_bundestagsabgeordnete
+from src.analysis.functions_people import tag_bundestagsabgeordnete_table
+from src.config import BLD
+from src.config import SRC
+from src.data_management.functions_cache import read_table
+from src.data_management.functions_load import candidate_lists
+from src.data_management.functions_load import clean_election_results
+from src.data_management.functions_load import clean_population
+from src.data_management.functions_load import gemeinden_wahlkreise
+from src.data_management.functions_load import wahlkreise_by_bundesland
+
+BASELINE = BLD / "benchmarks" / "baseline.json"
+
+ORIGINAL_DATA = SRC / "original_data"
+
+RENAME_PARTIES = {
+    "CDU": "Christlich Demokratische Union Deutschlands",
+    "SPD": "Sozialdemokratische Partei Deutschlands",
+    "Grüne": "BÜNDNIS 90/DIE GRÜNEN",
+    "CSU": "Christlich-Soziale Union in Bayern e.V.",
+    "FDP": "Freie Demokratische Partei",
+    "AfD": "Alternative für Deutschland",
+}
+
+
+def election_inputs():
+    """Collect the input of bundestagswahl_2013_2017 for 2017 from bld.
+
+    Output:
+    inputs (dict): "erststimmen", "zweitstimmen_bundesland",
+        "zweitstimmen_bundesgebiet", "bundesländer_wahlkreise" and
+        "initial_seats_by_state"
+
+    """
+
+    data = pd.read_parquet(BLD / "data" / "raw_data.parquet")
+    population = pd.read_parquet(BLD / "data" / "population_data.parquet")
+    with open(BLD / "data" / "wahlkreis_bundeslaender.pickle", "rb") as handle:
+        bundesländer_wahlkreise = pickle.load(handle)
+
+    bundesländer = list(bundesländer_wahlkreise.keys())
+    wahlkreise = [
+        wahlkreis
+        for bundesland in bundesländer
+        for wahlkreis in bundesländer_wahlkreise[bundesland]
+    ]
+
+    votes = votes_by_stimme(data, wahlkreise + bundesländer + ["Bundesgebiet"])
+
+    inputs = {
+        "erststimmen": votes_frame(votes, "Erststimmen", wahlkreise),
+        "zweitstimmen_bundesland": votes_frame(votes, "Zweitstimmen", bundesländer),
+        "zweitstimmen_bundesgebiet": votes_frame(
+            votes, "Zweitstimmen", ["Bundesgebiet"]
+        ),
+        "bundesländer_wahlkreise": bundesländer_wahlkreise,
+        "initial_seats_by_state": allocation_seats_after2013(
+            population.set_index("Bundesland")["Deutsche"], 598
+        ),
+    }
+
+    return inputs
+
+
+def synthetic_election(n_parteien=50, n_wahlkreise=2000, n_länder=16, seed=0):
+    """Draw an election in the format of election_inputs.
+
+    The national vote shares fall with the rank of the party, so a few parties
+    pass the 5% threshold. The Wahlkreise are spread evenly over the
+    Bundesländer, which get two seats per Wahlkreis.
+
+    Input:
+    n_parteien (int): number of parties
+    n_wahlkreise (int): number of Wahlkreise
+    n_länder (int): number of Bundesländer
+    seed (int): seed of the random number generator
+
+    Output:
+    inputs (dict): same as election_inputs
+
+    """
+
+    rng = np.random.default_rng(seed)
+    parteien = pd.Index([f"Partei {i + 1}" for i in range(n_parteien)], name="Partei")
+    wahlkreise = [f"Wahlkreis {i + 1}" for i in range(n_wahlkreise)]
+    bundesländer = [f"Land {i + 1}" for i in range(n_länder)]
+    wahlkreis_land = np.arange(n_wahlkreise) * n_länder // n_wahlkreise
+
+    shares = 1 / np.arange(1, n_parteien + 1) ** 0.8
+    wähler = rng.integers(100_000, 200_000, n_wahlkreise)
+    erststimmen = rng.multinomial(wähler, shares / shares.sum()).T
+    zweitstimmen = rng.multinomial(wähler, shares / shares.sum()).T
+    zweitstimmen_bundesland = (
+        pd.DataFrame(zweitstimmen.T, columns=parteien)
+        .groupby(wahlkreis_land)
+        .sum()
+        .T.set_axis(bundesländer, axis=1)
+    )
+
+    inputs = {
+        "erststimmen": pd.DataFrame(erststimmen, index=parteien, columns=wahlkreise),
+        "zweitstimmen_bundesland": zweitstimmen_bundesland,
+        "zweitstimmen_bundesgebiet": pd.DataFrame(
+            {"Bundesgebiet": zweitstimmen.sum(axis=1)}, index=parteien
+        ),
+        "bundesländer_wahlkreise": {
+            bundesland: [wahlkreise[i] for i in np.flatnonzero(wahlkreis_land == land)]
+            for land, bundesland in enumerate(bundesländer)
+        },
+        "initial_seats_by_state": pd.Series(
+            2 * np.bincount(wahlkreis_land, minlength=n_länder), index=bundesländer
+        ),
+    }
+
+    return inputs
+
+
+def allocation_cases(name, inputs):
+    """Benchmarks of the Sainte-Lague procedures and the whole election.
+
+    Input:
+    name (str): name of the inputs, prefix of the benchmarks
+    inputs (dict): output of election_inputs or synthetic_election
+
+    Output:
+    cases (dict): function without arguments by name of the benchmark
+
+    """
+
+    zweitstimmen = inputs["zweitstimmen_bundesgebiet"]["Bundesgebiet"]
+    seats = int(inputs["initial_seats_by_state"].sum())
+    # The largest party is allocated to its Landeslisten with its Direktmandate.
+    partei = zweitstimmen.idxmax()
+    direktmandate_bundesland = pd.Series(
+        {
+            bundesland: direktmandate(inputs["erststimmen"][wahlkreise])
+            .loc[partei]
+            .sum()
+            for bundesland, wahlkreise in inputs["bundesländer_wahlkreise"].items()
+        }
+    )
+    zweitstimmen_partei = inputs["zweitstimmen_bundesland"].loc[partei]
+    seats_partei = int(round(seats * zweitstimmen[partei] / zweitstimmen.sum()))
+    arguments = (
+        inputs["erststimmen"],
+        inputs["zweitstimmen_bundesland"],
+        inputs["zweitstimmen_bundesgebiet"],
+        inputs["bundesländer_wahlkreise"],
+        inputs["initial_seats_by_state"],
+    )
+
+    cases = {
+        f"{name}/sainte_lague_new": lambda: sainte_lague_new(
+            zweitstimmen.sum() / seats, zweitstimmen, seats
+        ),
+        f"{name}/sainte_lague_last": lambda: sainte_lague_last(
+            zweitstimmen_partei.sum() / seats_partei,
+            zweitstimmen_partei,
+            max(seats_partei, int(direktmandate_bundesland.sum())),
+            direktmandate_bundesland,
+        ),
+        f"{name}/allocation_seats_after2013": lambda: allocation_seats_after2013(
+            zweitstimmen, seats
+        ),
+        f"{name}/bundestagswahl_2013_2017": lambda: bundestagswahl_2013_2017(
+            *arguments
+        ),
+        f"{name}/bundestagswahl_2013_2017_arrays": lambda: (
+            bundestagswahl_2013_2017_arrays(*arguments)
+        ),
+    }
+
+    return cases
+
+
+def people_inputs():
+    """Compute the inputs of allocate_listenplaetze for 2017.
+
+    Output:
+    inputs (dict): "listen" the lists of the eligible parties marked for the
+        Direktmandate, "bundesländer", "bundesländer_wahlkreise",
+        "eligible_parties", "direktmandate" and "available_list_seats"
+
+    """
+
+    population = read_table(BLD / "data" / "population_data.parquet")
+    population = population.set_index("Bundesland")["Deutsche"]
+    initial_seats_by_state = memoized_initial_seats(population, 598)
+
+    data = read_table(BLD / "data" / "raw_data.parquet")
+    with open(BLD / "data" / "wahlkreis_bundeslaender.pickle", "rb") as handle:
+        bundesländer_wahlkreise = pickle.load(handle)
+    with open(BLD / "data" / "bundesland_partei_listen.pickle", "rb") as handle:
+        listen = pickle.load(handle)
+
+    bundesländer = list(bundesländer_wahlkreise.keys())
+    wahlkreise = [
+        wahlkreis
+        for bundesland in bundesländer
+        for wahlkreis in bundesländer_wahlkreise[bundesland]
+    ]
+    votes = votes_by_stimme(data, wahlkreise + bundesländer + ["Bundesgebiet"])
+    erststimmen = votes_frame(votes, "Erststimmen", wahlkreise)
+    zweitstimmen_bundesland = votes_frame(votes, "Zweitstimmen", bundesländer)
+    zweitstimmen_bundesgebiet = votes_frame(votes, "Zweitstimmen", ["Bundesgebiet"])
+    bundestagssitze = bundestagswahl_2013_2017(
+        erststimmen,
+        zweitstimmen_bundesland,
+        zweitstimmen_bundesgebiet,
+        bundesländer_wahlkreise,
+        initial_seats_by_state,
+    )[0]
+
+    direktmandate_wahlkreise = erststimmen.apply(direktmandate)
+    direktmandate_wahlkreise.rename(index=RENAME_PARTIES, inplace=True)
+    direktmandate_bundesländer = pd.DataFrame(
+        {
+            bundesland: direktmandate_wahlkreise[
+                bundesländer_wahlkreise[bundesland]
+            ].sum(axis=1)
+            for bundesland in bundesländer
+        }
+    )
+    parteien = eligible_parties(
+        zweitstimmen_bundesgebiet.rename(index=RENAME_PARTIES),
+        direktmandate_bundesländer.sum(axis=1),
+    )
+    available_list_seats = (
+        bundestagssitze.T.rename(index=RENAME_PARTIES) - direktmandate_bundesländer
+    )
+    available_list_seats = available_list_seats.fillna(0).astype(int)
+
+    listen = keep_eligible_parties(listen, parteien)
+    listen = prepare_lists(listen)
+    listen = mark_direktmandate(
+        listen, bundesländer_wahlkreise, direktmandate_wahlkreise
+    )
+
+    inputs = {
+        "listen": listen,
+        "bundesländer": bundesländer,
+        "bundesländer_wahlkreise": bundesländer_wahlkreise,
+        "eligible_parties": parteien,
+        "direktmandate": direktmandate_wahlkreise,
+        "available_list_seats": available_list_seats,
+    }
+
+    return inputs
+
+
+def people_cases():
+    """Benchmarks of tagging the members of the Bundestag 2017 and of allocating
+    the list seats.
+
+    tag_bundestagsabgeordnete and allocate_listenplaetze change the lists, so
+    every run gets a copy made outside of the timing.
+
+    Output:
+    cases (dict): function without arguments by name of the benchmark, or a
+        tuple of a setup function and a function of its output
+
+    """
+
+    inputs = people_inputs()
+    with open(BLD / "data" / "bundesland_partei_listen.pickle", "rb") as handle:
+        listen = pickle.load(handle)
+    bewerber = candidate_table(copy.deepcopy(listen))
+    arguments = (
+        inputs["bundesländer"],
+        inputs["eligible_parties"],
+        inputs["available_list_seats"],
+    )
+
+    cases = {
+        "2017/allocate_listenplaetze": (
+            lambda: copy.deepcopy(inputs["listen"]),
+            lambda listen_copy: allocate_listenplaetze(listen_copy, *arguments),
+        ),
+        "2017/allocate_listenplaetze_former": (
+            lambda: copy.deepcopy(inputs["listen"]),
+            lambda listen_copy: allocate_listenplaetze_loops(listen_copy, *arguments),
+        ),
+        "2017/tag_bundestagsabgeordnete": (
+            lambda: copy.deepcopy(listen),
+            lambda listen_copy: tag_bundestagsabgeordnete(
+                listen_copy,
+                inputs["bundesländer_wahlkreise"],
+                inputs["direktmandate"],
+                inputs["eligible_parties"],
+                inputs["bundesländer"],
+                inputs["available_list_seats"],
+            ),
+        ),
+        "2017/tag_bundestagsabgeordnete_table": lambda: (
+            tag_bundestagsabgeordnete_table(
+                bewerber,
+                inputs["direktmandate"],
+                inputs["eligible_parties"],
+                inputs["available_list_seats"],
+            )
+        ),
+    }
+
+    return cases
+
+
+def read_files():
+    """Parse the 2017 files as load_data.py does."""
+
+    files = {
+        "kerg": pd.read_csv(
+            ORIGINAL_DATA / "election_results" / "btw2017_kerg.csv",
+            sep=";",
+            skiprows=5,
+            header=None,
+        ),
+        "population": pd.read_csv(
+            ORIGINAL_DATA / "population" / "bevoelkerung_2016.csv",
+            sep=";",
+            skiprows=5,
+            header=None,
+            encoding="cp1252",
+        ),
+        "bewerber": pd.read_csv(
+            ORIGINAL_DATA / "candidates" / "btw2017bewerb_gewaehlt.csv",
+            sep=";",
+            skiprows=7,
+            header=0,
+            encoding="cp1252",
+        ),
+        "gemeinden": pd.read_csv(
+            ORIGINAL_DATA
+            / "wahlkreise_info"
+            / "20170228_BTW17_WKr_Gemeinden_ASCII.csv",
+            sep=";",
+            skiprows=7,
+            header=0,
+            encoding="cp1252",
+        ),
+    }
+
+    return files
+
+
+def load_data_cases():
+    """Benchmarks of the ingest of load_data.py: parsing the csv files of 2017
+    and cleaning them.
+
+    Output:
+    cases (dict): function without arguments by name of the benchmark
+
+    """
+
+    files = read_files()
+
+    def clean():
+        clean_election_results(files["kerg"])
+        wahlkreise_by_bundesland(files["kerg"])
+        clean_population(files["population"])
+        candidate_lists(files["bewerber"])
+        gemeinden_wahlkreise(files["gemeinden"])
+
+    cases = {
+        "2017/load_data_read": read_files,
+        "2017/load_data_clean": clean,
+        "2017/load_data_clean_former": lambda: clean_loops(files),
+    }
+
+    return cases
+
+
+def run_backends(function):
+    """Call a function with the NumPy backend and with the kernels.
+
+    Input:
+    function (function): function without arguments
+
+    Output:
+    outputs (list): result or message of the ValueError of both backends
+
+    """
+
+    outputs = []
+    for enabled in [False, True]:
+        BACKEND["enabled"] = enabled
+        try:
+            outputs.append(function())
+        except ValueError as error:
+            outputs.append(str(error))
+
+    return outputs
+
+
+def backend_parity(n_cases=200, seed=0):
+    """Compare the kernels of functions_kernels with the NumPy backend on random
+    allocations with ties, minimum seats and poor preliminary divisors.
+
+    Input:
+    n_cases (int): number of random allocations and batches
+    seed (int): seed of the random allocations
+
+    Output:
+    mismatches (list): names of the cases with different results or errors
+
+    """
+
+    rng = np.random.default_rng(seed)
+    backend = dict(BACKEND)
+    mismatches = []
+    try:
+        for case in range(n_cases):
+            n_entities = int(rng.integers(1, 12))
+            votes = rng.integers(0, 50, n_entities) * rng.choice([0.5, 1.0, 1000.0])
+            if rng.random() < 0.2:
+                votes[:] = votes[0]
+            seats = int(rng.integers(0, 40))
+            min_seats = rng.integers(0, 4, n_entities) if rng.random() < 0.5 else None
+            preliminary_divisor = [None, 1e-3, 1e6][case % 3]
+            reports = run_backends(
+                lambda: sainte_lague_report(
+                    votes, seats, min_seats, preliminary_divisor
+                )
+            )
+
+            n_rows = int(rng.integers(1, 30))
+            batch_votes = rng.integers(0, 30, (n_rows, n_entities)) * 1000.0
+            batch_seats = rng.integers(0, 60, n_rows)
+            batch_min_seats = rng.integers(0, 5, (n_rows, n_entities))
+            for threads in [1, 3]:
+                BACKEND["threads"] = threads
+                reports += run_backends(
+                    lambda: sainte_lague_batch_report(
+                        batch_votes, batch_seats, batch_min_seats
+                    )
+                )
+
+            for numpy_report, kernel_report in zip(reports[::2], reports[1::2]):
+                if isinstance(numpy_report, str) or isinstance(kernel_report, str):
+                    same = numpy_report == kernel_report
+                else:
+                    same = all(
+                        np.array_equal(
+                            numpy_report[key], kernel_report[key], equal_nan=True
+                        )
+                        for key in numpy_report
+                    )
+                if not same:
+                    mismatches.append(f"case {case}")
+                    break
+    finally:
+        BACKEND.update(backend)
+
+    return mismatches
+
+
+def measure(case, repeat):
+    """Time a benchmark and trace the peak memory it allocates.
+
+    Functions without setup are called in loops of at least 0.2 seconds like
+    timeit does, functions with setup once per run on a fresh setup.
+
+    Input:
+    case (function or tuple): function without arguments, or a setup function
+        and a function of its output
+    repeat (int): number of timed runs
+
+    Output:
+    seconds (float): best time of one call over all runs
+    peak (int): peak of the memory allocated during one additional call in bytes
+
+    """
+
+    if callable(case):
+        timer = timeit.Timer(case)
+        number, _ = timer.autorange()
+        seconds = min(timer.repeat(repeat, number)) / number
+        setup, function = (lambda: None), (lambda _: case())
+    else:
+        setup, function = case
+        seconds = np.inf
+        for _ in range(repeat):
+            argument = setup()
+            start = time.perf_counter()
+            function(argument)
+            seconds = min(seconds, time.perf_counter() - start)
+
+    argument = setup()
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def run_suite(repeat=5, synthetic=True):
+    """Run all benchmarks.
+
+    Input:
+    repeat (int): number of timed runs of each benchmark
+    synthetic (bool): include the synthetic election with 50 parties and 2,000
+        Wahlkreise
+
+    Output:
+    results (pd.DataFrame): "Sekunden" and "Speicher" (peak bytes) by benchmark
+
+    """
+
+    cases = allocation_cases("2017", election_inputs())
+    if synthetic:
+        cases.update(allocation_cases("50x2000", synthetic_election()))
+    cases.update(people_cases())
+    cases.update(load_data_cases())
+
+    results = pd.DataFrame(columns=["Sekunden", "Speicher"], dtype=float)
+    for name, case in cases.items():
+        results.loc[name] = measure(case, repeat)
+    results.index.name = "Benchmark"
+
+    return results
+
+
+def speed_ups(results):
+    """Speed-up of the benchmarks over their former implementations.
+
+    Input:
+    results (pd.DataFrame): output of run_suite
+
+    Output:
+    speed_ups (pd.Series): seconds of "<name>_former" by seconds of "<name>"
+
+    """
+
+    former = [name for name in results.index if name.endswith("_former")]
+    speed_ups = pd.Series(
+        {
+            name[: -len("_former")]: results.loc[name, "Sekunden"]
+            / results.loc[name[: -len("_former")], "Sekunden"]
+            for name in former
+        },
+        name="Speed-up",
+        dtype=float,
+    )
+
+    return speed_ups
+
+
+def compare(results, baseline, threshold=1.5):
+    """Compare benchmark results with a baseline.
+
+    Input:
+    results (pd.DataFrame): output of run_suite
+    baseline (pd.DataFrame): earlier output of run_suite
+    threshold (float): factor by which time or memory may grow
+
+    Output:
+    comparison (pd.DataFrame): results, baseline, ratios and "Regression" by
+        benchmark, benchmarks without baseline are never regressions
+
+    """
+
+    comparison = results.join(baseline, rsuffix="_Baseline")
+    comparison["Faktor_Zeit"] = comparison["Sekunden"] / comparison["Sekunden_Baseline"]
+    comparison["Faktor_Speicher"] = (
+        comparison["Speicher"] / comparison["Speicher_Baseline"]
+    )
+    comparison["Regression"] = (comparison["Faktor_Zeit"] > threshold) | (
+        comparison["Faktor_Speicher"] > threshold
+    )
+
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update", action="store_true", help="store a new baseline")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--no-synthetic", action="store_true")
+    arguments = parser.parse_args()
+
+    if COMPILED:
+        mismatches = backend_parity()
+        if mismatches:
+            sys.exit(
+                "Compiled kernels differ from the NumPy backend in "
+                f"{', '.join(mismatches)}"
+            )
+
+    results = run_suite(arguments.repeat, synthetic=not arguments.no_synthetic)
+    print(speed_ups(results))
+
+    if arguments.update or not BASELINE.exists():
+        BASELINE.parent.mkdir(parents=True, exist_ok=True)
+        with open(BASELINE, "w") as handle:
+            json.dump(results.to_dict(orient="index"), handle, indent=2)
+        print(results)
+        print(f"Baseline stored in {BASELINE}.")
+        return
+
+    with open(BASELINE) as handle:
+        baseline = pd.DataFrame.from_dict(json.load(handle), orient="index")
+    comparison = compare(results, baseline, arguments.threshold)
+    with pd.option_context("display.width", 200, "display.max_columns", 10):
+        print(comparison)
+
+    if comparison["Regression"].any():
+        regressions = comparison.index[comparison["Regression"]].tolist()
+        sys.exit(f"Regression against the baseline: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,11 @@ import pandas as pd
 
 from src.analysis.functions_law import direktmandate
 from src.analysis.functions_law import eligible_parties
+from src.analysis.functions_law_arrays import election_arrays
+from src.analysis.functions_sensitivity import baseline_state
+from src.analysis.functions_sensitivity import decisive_votes
+from src.analysis.functions_sensitivity import sensitivity_erststimmen
+from src.data_management.functions_cache import read_table
 
 user = "Dominik"
 
@@ -18,15 +23,21 @@ if user == "Jakob":
 else:
     pass
 
-from functions_law import partition_of_votes
+from functions_law import votes_by_stimme
+from functions_law import votes_frame
 from functions_law import bundestagswahl_2013_2017
-from functions_law import allocation_seats_after2013
+from functions_law import memoized_initial_seats
+from functions_mapping import sum_by_land_frame
+from functions_mapping import wahlkreis_mapping
 
 from functions_people import prepare_lists
 from functions_people import mark_direktmandate
 from functions_people import keep_eligible_parties
 from functions_people import allocate_listenplaetze
 from functions_people import tag_bundestagsabgeordnete
+from functions_people import candidate_table
+from functions_people import lists_from_table
+from functions_people import tag_bundestagsabgeordnete_table
 
 if user == "Jakob":
     path = "C:/Users/jakob/sciebo/Bonn/6th_semester/election_calculator"
@@ -36,34 +47,29 @@ else:
     print("No such user exists!")
 
 # * STEP 1: Calculate initial number of seats for each state.
-population = pd.read_json(f"{path}/bld/data/population_data.json")
+population = read_table(f"{path}/bld/data/population_data.parquet")
 population.set_index(["Bundesland"], inplace=True)
 population = pd.to_numeric(population["Deutsche"])
 min_seats_bundestag = 598
-initial_seats_by_state = allocation_seats_after2013(population, min_seats_bundestag)
+initial_seats_by_state = memoized_initial_seats(population, min_seats_bundestag)
 
 # * Step 2: Calculate the number of Direktmandate.
 # * Load the data we need. (Left as raw as possible.)
-data = pd.read_json(f"{path}/bld/data/raw_data.json")
+data = read_table(f"{path}/bld/data/raw_data.parquet")
 
 with open("../../bld/data/wahlkreis_bundeslaender.pickle", "rb") as handle:
     bundesländer_wahlkreise = pickle.load(handle)
 
-wahlkreise = []
-for bundesland in bundesländer_wahlkreise.keys():
-    wahlkreise = wahlkreise + bundesländer_wahlkreise[bundesland]
+# Wahlkreise and the Bundesland code of each of them, compiled once.
+mapping = wahlkreis_mapping(bundesländer_wahlkreise)
+wahlkreise = mapping["wahlkreise"]
+bundesländer = mapping["bundesländer"]
 
-# * Separating Erst- und Zweitstimmen.
-erststimmen = partition_of_votes(data, wahlkreise)[0]
-erststimmen.set_index(["Partei"], inplace=True)
-bundesländer = list(bundesländer_wahlkreise.keys())
-zweitstimmen_bundesland = partition_of_votes(data, bundesländer)[1]
-zweitstimmen_bundesland.set_index(["Partei"], inplace=True)
-
-zweitstimmen_bundesgebiet = (
-    data[data["Stimme"] == "Zweitstimmen"].loc[:, ["Partei", "Bundesgebiet"]].copy()
-)
-zweitstimmen_bundesgebiet.set_index(["Partei"], inplace=True)
+# * Separating Erst- und Zweitstimmen of all Gebiete at once.
+votes = votes_by_stimme(data, wahlkreise + bundesländer + ["Bundesgebiet"])
+erststimmen = votes_frame(votes, "Erststimmen", wahlkreise)
+zweitstimmen_bundesland = votes_frame(votes, "Zweitstimmen", bundesländer)
+zweitstimmen_bundesgebiet = votes_frame(votes, "Zweitstimmen", ["Bundesgebiet"])
 
 bts_bundesland, ausgleich_ueberhang, government = bundestagswahl_2013_2017(
     erststimmen,
@@ -71,6 +77,18 @@ bts_bundesland, ausgleich_ueberhang, government = bundestagswahl_2013_2017(
     zweitstimmen_bundesgebiet,
     bundesländer_wahlkreise,
     initial_seats_by_state,
+    mapping,
+)
+
+# Cache all intermediate results for the sensitivity analyses.
+baseline = baseline_state(
+    election_arrays(
+        erststimmen,
+        zweitstimmen_bundesland,
+        zweitstimmen_bundesgebiet,
+        bundesländer_wahlkreise,
+        initial_seats_by_state,
+    )
 )
 
 
@@ -89,200 +107,51 @@ rename_parties = {
 direktmandate = erststimmen.apply(direktmandate)
 direktmandate.rename(index=rename_parties, inplace=True)
 
-direktmandate["Sum"] = 0
-for bundesland in bundesländer_wahlkreise.keys():
-    direktmandate[bundesland] = 0
-    for wahlkreis in bundesländer_wahlkreise[bundesland]:
-        direktmandate[bundesland] = direktmandate[bundesland] + direktmandate[wahlkreis]
-    direktmandate["Sum"] = direktmandate["Sum"] + direktmandate[bundesland]
+direktmandate_bundesland = sum_by_land_frame(direktmandate, mapping)
+direktmandate["Sum"] = direktmandate_bundesland.sum(axis=1)
+direktmandate[bundesländer] = direktmandate_bundesland
 
 zweitstimmen_bundesgebiet.rename(index=rename_parties, inplace=True)
 parties_eligible = eligible_parties(zweitstimmen_bundesgebiet, direktmandate["Sum"])
 
 bts_bundesland_t = bts_bundesland.T
 bts_bundesland_t.rename(index=rename_parties, inplace=True)
-listenplaetze_to_allocate = (
-    bts_bundesland_t - direktmandate[list(bundesländer_wahlkreise.keys())]
-)
+listenplaetze_to_allocate = bts_bundesland_t - direktmandate[bundesländer]
 listenplaetze_to_allocate.fillna(0, inplace=True)
 listenplaetze_to_allocate = listenplaetze_to_allocate.astype(int)
 
 parties_eligible = eligible_parties(zweitstimmen_bundesgebiet, direktmandate["Sum"])
 
-abgeordnete_im_bundestag = keep_eligible_parties(
-    abgeordnete_im_bundestag, parties_eligible
+bewerber = candidate_table(bundesland_partei_listen)
+sitz_bundestag = tag_bundestagsabgeordnete_table(
+    bewerber, direktmandate, parties_eligible, listenplaetze_to_allocate
 )
-
-abgeordnete_im_bundestag_final = allocate_listenplaetze(
-    abgeordnete_im_bundestag,
-    list(bundesländer_wahlkreise.keys()),
-    listenplaetze_to_allocate,
+abgeordnete_im_bundestag_final = lists_from_table(
+    bewerber, sitz_bundestag, parties_eligible
 )
 
 num_abgeordnete_wk = pd.DataFrame(index=wahlkreise, columns=["Num_Abgeordnete"])
 
 
-effect_changed_erststimme = pd.DataFrame(
-    0, index=erststimmen.keys(), columns=["# geänderte Sitze", "benötigte Stimmen"]
-)
+# * Effect of changed Erststimmen: runner-up wins each Wahlkreis by one vote.
+effect_changed_erststimme = sensitivity_erststimmen(baseline)
 
-# for wahlkreis in erststimmen.keys():
-#     print("Wahlkreis:", wahlkreis)
-#     # replace value of second largest party by value of largest party + 1
-#     erststimmen_manipulated = erststimmen.copy()
-#     largest_party = erststimmen_manipulated[wahlkreis].nlargest(2).index.values[0]
-#     second_largest_party = (
-#         erststimmen_manipulated[wahlkreis].nlargest(2).index.values[1]
-#     )
-#     erststimmen_manipulated.loc[second_largest_party, wahlkreis] = (
-#         erststimmen_manipulated.loc[largest_party, wahlkreis] + 1
-#     )
-#     num_votes_manipulated = (
-#         erststimmen_manipulated.loc[second_largest_party, wahlkreis]
-#         - erststimmen.loc[second_largest_party, wahlkreis]
-#     )
-
-#     # Calculate results with manipulated votes
-#     (
-#         bts_bundesland_manipulated,
-#         ausgleich_ueberhang_manipulated,
-#         government_manipulated,
-#     ) = bundestagswahl_2013_2017(
-#         erststimmen_manipulated,
-#         zweitstimmen_bundesland,
-#         zweitstimmen_bundesgebiet,
-#         bundesländer_wahlkreise,
-#         initial_seats_by_state,
-#     )
-
-#     # Save effect size and number of necessary votes of for each Wahlkreis
-#     num_changes = (bts_bundesland - bts_bundesland_manipulated).abs().sum().sum()
-
-#     effect_changed_erststimme.loc[wahlkreis, "# geänderte Sitze"] = num_changes
-#     effect_changed_erststimme.loc[
-#         wahlkreis, "benötigte Stimmen"
-#     ] = num_votes_manipulated
-
-# effect_changed_erststimme.sort_values(by=["benötigte Stimmen"], inplace=True)
-# effect_changed_erststimme.sort_values(
-#     by=["# geänderte Sitze"], ascending=False, inplace=True, kind="mergesort"
-# )
+effect_changed_erststimme.sort_values(by=["benötigte Stimmen"], inplace=True)
+effect_changed_erststimme.sort_values(
+    by=["# geänderte Sitze"], ascending=False, inplace=True, kind="mergesort"
+)
 
 # # Analyses of most interesting result
 # # ausgleich_ueberhang-ausgleich_ueberhang_manipulated
 
 
-# # * Variation in Zweitstimmen
-# # Relevant level is Bundesland
-# # Iteratively increase and decrease number of votes for each party within each Bundesland
-# # until one effect on seats appears (starting step size: 100)
-
-# # Alternative: Check for changes within next 2000 votes, pick maximum
-# # More convincing: I want to know whether chanes occur
-# # DataFrame: Bundesland, changed party, number of changed votes, effect on other partys
-# # Also Dictionary: Bundesland, Party, Numofvotes: save DataFrame with differences
-# # Kann man Fälle über alle DataFrames im Dictionary prüfen, also bspw.
-# ein Mandat mehr für Grün in BW?
-
-# # Determine first change, then look again for other change (substract from initial DataFrame)
-
-
-# my_dict = {-1: 'apple', 2: 'ball', -5: "test"}
-# my_dict[535] = {"CDU": "viel", "SPD": "wenig"}
-
-# # Ziel: Index: Partei und ansteigend/absteigend, Keys: Bundesland
-
-# zweitstimmen_bundesland_manipulated = zweitstimmen_bundesland.copy()
-# zweitstimmen_bundesgebiet_manipulated = zweitstimmen_bundesgebiet.copy()
-
-# num_changes = 0
-
-# factor = 4
-# votes_change = 10^4
-# vorzeichen = 1
-
-# 1335
-
-# # if change: factor - 1, and decrease votes by votes_change
-
-# # gehe so lange hoch, bis sich eine Änderung ergibt
-
+# * Variation in Zweitstimmen
+# Relevant level is Bundesland: for each party and Bundesland the smallest
+# increase and decrease of Zweitstimmen until one effect on seats appears.
+decisive_zweitstimmen = decisive_votes(baseline)
 
-# [Hessen][Grünen][-2561]
-# [Hessen][Grünen][418]
-
-
-# [Grünen]["Hessen 418"]
-
-# def identify_decisive_votes(vorzeichen, factor, votes_change, num_seats_changed_before,
-#  max_votes_changed, zweitstimmen_bundesland_manipulated,
-# zweitstimmen_bundesgebiet_manipulated):
-#     """Identify necessary number of votes for a change in seats
-
-#     Input:
-
-#     Output:
-
-#     """
-
-#     print(votes_change)
-#     zweitstimmen_bundesland_manipulated.loc["CDU", "Hamburg"] = (
-#         zweitstimmen_bundesland_manipulated.loc["CDU", "Hamburg"] + votes_change
-#     )
-#     zweitstimmen_bundesgebiet_manipulated.loc["CDU"] + votes_change
-#     (
-#         bts_bundesland_manipulated,
-#         ausgleich_ueberhang_manipulated,
-#         government_manipulated,
-#     ) = bundestagswahl_2013_2017(
-#         erststimmen,
-#         zweitstimmen_bundesland_manipulated,
-#         zweitstimmen_bundesgebiet_manipulated,
-#         bundesländer_wahlkreise,
-#         initial_seats_by_state,
-#     )
-
-#     num_seats_changed = (bts_bundesland - bts_bundesland_manipulated).abs().sum().sum()
-#     change_in_seats = num_seats_changed_before - num_seats_changed
-
-#     if votes_change > max_votes_changed:
-#         print("Max number of vote variantion reached at:", votes_change)
-#         return
-
-#     while factor > 1 & change_in_seats > 0:
-#         if factor > 1:
-#             if change_in_seats == 0:
-#                 votes_change = votes_change + vorzeichen * 10 ^ factor
-#             elif change_in_seats != 0:
-#                 vorzeichen = vorzeichen*(-1)
-#                 factor = factor - 1
-
-#     elif factor == 1 & change_in_seats > 0:
-#         return bts_bundesland_manipulated, ausgleich_ueberhang_manipulated,
-#               government_manipulated
-
-
-#     while factor > 1 & votes_change < max_votes_changed:
-#         if :
-#         else:
-#             pass
-#         identify_decisive_votes(vorzeichen, factor, votes_change, max_votes_changed,
-# zweitstimmen_bundesland_manipulated, zweitstimmen_bundesgebiet_manipulated)
-
-#     else:
-
-
-# while num_changes == 0:
-
-
-# bts_bundesland_manipulated - bts_bundesland
 
 # offene Baustellen:
-<<<<<<< HEAD
-# TODO Relative Pfade (pytask? oder zu nervig?)
-# TODO government as boolean
-=======
 # TODO Relative Pfade (für pytask muss man die Pfade anpassen,
 # TODO  finde ich gerade nicht sinnvoll
 # TODO government as boolean
->>>>>>> 8b3f97238c57947b23653a28e77f7580de0bbd63
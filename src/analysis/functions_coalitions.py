@@ -0,0 +1,151 @@
+"""Majorities of all coalitions of the parties in the Bundestag.
+
+Every coalition is a bitmask over the parties, bit i standing for the i-th party.
+The seats of all coalitions are one product of the seats by party with the
+membership matrix of the bitmasks, which works the same for the final seats of
+one election and for a batch of simulated draws.
+
+"""
+import numpy as np
+import pandas as pd
+
+# Number of draws × coalitions evaluated at once in majority_probabilities.
+CHUNK_ENTRIES = 1 << 24
+
+
+def coalition_membership(n_parteien):
+    """Enumerate all non-empty coalitions of a number of parties as bitmasks.
+
+    Input:
+    n_parteien (int): number of parties
+
+    Output:
+    masks (np.ndarray): bitmask of each coalition, 1 to 2**n_parteien - 1
+    membership (np.ndarray): coalitions × parties, 1 if the party is a member
+
+    """
+
+    masks = np.arange(1, 1 << n_parteien, dtype=np.int64)
+    membership = (masks[:, None] >> np.arange(n_parteien)) & 1
+
+    return masks, membership
+
+
+def coalition_labels(masks, parteien):
+    """Name coalitions by their members joined with "+".
+
+    Input:
+    masks (np.ndarray): bitmasks of the coalitions
+    parteien (list): parties in the order of the bits
+
+    Output:
+    labels (list): name of each coalition
+
+    """
+
+    labels = [
+        "+".join(partei for bit, partei in enumerate(parteien) if int(mask) >> bit & 1)
+        for mask in masks
+    ]
+
+    return labels
+
+
+def majority(seats):
+    """Number of seats of an absolute majority (more than half of the seats).
+
+    Input:
+    seats (np.ndarray): size of the Bundestag
+
+    Output:
+    majority (np.ndarray): seats needed for a majority
+
+    """
+
+    return np.asarray(seats) // 2 + 1
+
+
+def coalition_majorities(seats_by_party):
+    """Check every coalition of the parties with seats for a majority.
+
+    Input:
+    seats_by_party (pd.Series): final seats in the Bundestag by party
+
+    Output:
+    coalitions (pd.DataFrame): by coalition the bitmask "mask" over the parties
+        with seats, "n_parteien", "sum_seats", "margin" to the majority,
+        "majority" and "minimal" (majority which is lost by leaving out any
+        member)
+
+    """
+
+    seats_by_party = seats_by_party[seats_by_party > 0]
+    seats = seats_by_party.to_numpy(dtype=np.int64)
+    masks, membership = coalition_membership(len(seats))
+
+    sum_seats = membership @ seats
+    margin = sum_seats - majority(seats.sum())
+    has_majority = margin >= 0
+    # Without any of its members the coalition has to lose the majority.
+    without_member = np.where(membership == 1, margin[:, None] - seats, -1)
+    minimal = has_majority & (without_member < 0).all(axis=1)
+
+    coalitions = pd.DataFrame(
+        {
+            "mask": masks,
+            "n_parteien": membership.sum(axis=1),
+            "sum_seats": sum_seats,
+            "margin": margin,
+            "majority": has_majority,
+            "minimal": minimal,
+        },
+        index=pd.Index(
+            coalition_labels(masks, seats_by_party.index.tolist()), name="Koalition"
+        ),
+    )
+
+    return coalitions
+
+
+def majority_probabilities(seats):
+    """Estimate the probability of a majority of every coalition from simulated
+    seat distributions.
+
+    The majority refers to the size of the Bundestag in each draw. Only parties
+    with seats in at least one draw form coalitions, the draws are evaluated in
+    chunks of at most CHUNK_ENTRIES draws × coalitions.
+
+    Input:
+    seats (pd.DataFrame): seats by draw (row) and party (column), e.g. "seats"
+        of simulate_seat_distribution
+
+    Output:
+    probabilities (pd.DataFrame): by coalition the bitmask "mask", "n_parteien"
+        and the share of draws with a majority "probability"
+
+    """
+
+    seats = seats.loc[:, (seats > 0).any(axis=0)]
+    values = seats.to_numpy(dtype=np.int64)
+    masks, membership = coalition_membership(values.shape[1])
+
+    needed = majority(values.sum(axis=1))
+    chunk_size = max(1, CHUNK_ENTRIES // len(masks))
+    wins = np.zeros(len(masks), dtype=np.int64)
+    for start in range(0, len(values), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        sum_seats = values[chunk] @ membership.T
+        wins += (sum_seats >= needed[chunk, None]).sum(axis=0)
+
+    probabilities = pd.DataFrame(
+        {
+            "mask": masks,
+            "n_parteien": membership.sum(axis=1),
+            "probability": wins / len(values),
+        },
+        index=pd.Index(
+            coalition_labels(masks, seats.columns.tolist()), name="Koalition"
+        ),
+    )
+
+    return probabilities
@@ -0,0 +1,318 @@
+"""Timing of the stages of the seat allocation.
+
+Stages are marked in the code with "with stage(name):". As long as no recorder
+is active, stage returns a shared empty context manager and count_iterations
+returns at once, so the marks cost nothing measurable. Inside
+"with instrument() as recorder:" every stage is recorded with its wall time, the
+number of iterations of the Sainte-Lague procedures in it and, if requested,
+the peak of the memory allocated in it (traced with tracemalloc). Nested stages
+are counted in their parent as well.
+
+The recorder only sees the calls of its own thread, the workers of
+simulate_seat_distribution have to be instrumented separately.
+
+Inside "with divisor_telemetry() as telemetry:" every divisor procedure of the
+same thread adds its calls, iterations and ties to the counters, outside
+record_divisor returns at once. Independent of both, every divisor procedure
+stops with an error before it would need more than
+DIVISOR_LIMITS["max_iterations"] iterations.
+
+"""
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+# The active recorder by thread, see instrument.
+RECORDER = threading.local()
+
+NO_STAGE = contextlib.nullcontext()
+
+# The active counters of the divisor procedures by thread, see divisor_telemetry.
+TELEMETRY = threading.local()
+
+# Iterations after which an allocation is stopped, e.g. because of a misleading
+# preliminary divisor.
+DIVISOR_LIMITS = {"max_iterations": 100_000}
+
+
+@contextlib.contextmanager
+def instrument(callback=None, memory=False):
+    """Record all stages within the context.
+
+    Input:
+    callback (function): called with every finished stage (dict)
+    memory (bool): trace the peak memory allocated in each stage, slows down
+        all allocations
+
+    Output:
+    recorder (dict): "events" the finished stages in the order they ended, each
+        with "name", "start" and "duration" (microseconds), "depth",
+        "iterations" and "bytes" (None without memory)
+
+    """
+
+    recorder = {
+        "events": [],
+        "stack": [],
+        "start": time.perf_counter_ns(),
+        "callback": callback,
+        "memory": memory,
+    }
+    previous = getattr(RECORDER, "current", None)
+    start_tracing = memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    RECORDER.current = recorder
+    try:
+        yield recorder
+    finally:
+        RECORDER.current = previous
+        if start_tracing:
+            tracemalloc.stop()
+
+
+def stage(name):
+    """Mark a stage of the computation.
+
+    Input:
+    name (str): name of the stage
+
+    Output:
+    context (context manager): records the stage if a recorder is active
+
+    """
+
+    recorder = getattr(RECORDER, "current", None)
+    if recorder is None:
+        return NO_STAGE
+
+    return record_stage(recorder, name)
+
+
+@contextlib.contextmanager
+def record_stage(recorder, name):
+    """Record one stage, see stage."""
+
+    stack = recorder["stack"]
+    if recorder["memory"]:
+        current, peak = tracemalloc.get_traced_memory()
+        # Keep the peak of the enclosing stage before resetting it.
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+    else:
+        current = 0
+    entry = {"iterations": 0, "current": current, "peak": current}
+    stack.append(entry)
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        stack.pop()
+        size = None
+        if recorder["memory"]:
+            entry["peak"] = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+            size = entry["peak"] - entry["current"]
+        if stack:
+            stack[-1]["iterations"] += entry["iterations"]
+            stack[-1]["peak"] = max(stack[-1]["peak"], entry["peak"])
+
+        event = {
+            "name": name,
+            "start": (start - recorder["start"]) / 1000,
+            "duration": (end - start) / 1000,
+            "depth": len(stack),
+            "iterations": entry["iterations"],
+            "bytes": size,
+        }
+        recorder["events"].append(event)
+        if recorder["callback"] is not None:
+            recorder["callback"](event)
+
+
+def count_iterations(number):
+    """Add iterations of a divisor procedure to the innermost active stage.
+
+    Input:
+    number (int): number of iterations
+
+    """
+
+    recorder = getattr(RECORDER, "current", None)
+    if recorder is not None and recorder["stack"]:
+        recorder["stack"][-1]["iterations"] += int(number)
+
+
+def check_iterations(iterations, max_iterations=None):
+    """Stop a divisor procedure that would need too many iterations.
+
+    Input:
+    iterations (int): iterations the allocation needs
+    max_iterations (int): limit, defaults to DIVISOR_LIMITS["max_iterations"]
+
+    """
+
+    if max_iterations is None:
+        max_iterations = DIVISOR_LIMITS["max_iterations"]
+    if iterations > max_iterations:
+        raise ValueError(
+            f"Sainte-Lague procedure does not converge within {max_iterations} "
+            f"iterations, it would need {iterations}. Check the votes and the "
+            "preliminary divisor or raise the limit."
+        )
+
+
+@contextlib.contextmanager
+def divisor_telemetry():
+    """Count the allocations of the divisor procedures of this thread within the
+    context. Nested contexts are counted in their parent as well.
+
+    Output:
+    telemetry (dict): allocations ("calls"), seats handed out or taken away one
+        by one ("iterations"), the most iterations of one allocation
+        ("max_iterations") and allocations with a tie between Hoechstzahlen
+        ("ties")
+
+    """
+
+    telemetry = {"calls": 0, "iterations": 0, "max_iterations": 0, "ties": 0}
+    previous = getattr(TELEMETRY, "current", None)
+    TELEMETRY.current = telemetry
+    try:
+        yield telemetry
+    finally:
+        TELEMETRY.current = previous
+        if previous is not None:
+            previous.update(combine_telemetry([previous, telemetry]))
+
+
+def record_divisor(calls, iterations, max_iterations, ties):
+    """Add allocations of a divisor procedure to the active divisor_telemetry.
+
+    Input:
+    calls (int): number of allocations
+    iterations (int): iterations of all allocations
+    max_iterations (int): most iterations of one allocation
+    ties (int): allocations with a tie between Hoechstzahlen
+
+    """
+
+    telemetry = getattr(TELEMETRY, "current", None)
+    if telemetry is None:
+        return
+
+    telemetry["calls"] += int(calls)
+    telemetry["iterations"] += int(iterations)
+    telemetry["max_iterations"] = max(telemetry["max_iterations"], int(max_iterations))
+    telemetry["ties"] += int(ties)
+
+
+def combine_telemetry(telemetries):
+    """Aggregate the counters of several processes or chunks.
+
+    Input:
+    telemetries (list): outputs of divisor_telemetry
+
+    Output:
+    telemetry (dict): summed counters, the largest "max_iterations"
+
+    """
+
+    telemetry = {"calls": 0, "iterations": 0, "max_iterations": 0, "ties": 0}
+    for counters in telemetries:
+        for key in ["calls", "iterations", "ties"]:
+            telemetry[key] += counters[key]
+        telemetry["max_iterations"] = max(
+            telemetry["max_iterations"], counters["max_iterations"]
+        )
+
+    return telemetry
+
+
+def summary(recorder):
+    """Sum the recorded stages by name.
+
+    Input:
+    recorder (dict): output of instrument
+
+    Output:
+    summary (pd.DataFrame): "calls", "seconds", "iterations" and the largest
+        "bytes" by stage, in the order the stages were first entered
+
+    """
+
+    events = pd.DataFrame(
+        recorder["events"],
+        columns=["name", "start", "duration", "depth", "iterations", "bytes"],
+    )
+    events = events.sort_values("start", kind="stable")
+    summary = events.groupby("name", sort=False).agg(
+        calls=("duration", "size"),
+        seconds=("duration", "sum"),
+        iterations=("iterations", "sum"),
+        bytes=("bytes", "max"),
+    )
+    summary["seconds"] = summary["seconds"] / 1e6
+
+    return summary
+
+
+def to_json(recorder, path=None):
+    """Export the recorded stages as JSON.
+
+    Input:
+    recorder (dict): output of instrument
+    path (str or Path): file to write, None only returns the JSON
+
+    Output:
+    content (str): JSON list of the stages
+
+    """
+
+    content = json.dumps(recorder["events"], indent=2)
+    if path is not None:
+        with open(path, "w") as handle:
+            handle.write(content)
+
+    return content
+
+
+def to_chrome_trace(recorder, path=None):
+    """Export the recorded stages in the Trace Event Format of chrome://tracing
+    and Perfetto.
+
+    Input:
+    recorder (dict): output of instrument
+    path (str or Path): file to write, None only returns the JSON
+
+    Output:
+    content (str): JSON object with the complete events ("ph": "X")
+
+    """
+
+    trace = {
+        "traceEvents": [
+            {
+                "name": event["name"],
+                "ph": "X",
+                "ts": event["start"],
+                "dur": event["duration"],
+                "pid": 0,
+                "tid": 0,
+                "args": {"iterations": event["iterations"], "bytes": event["bytes"]},
+            }
+            for event in recorder["events"]
+        ],
+        "displayTimeUnit": "ms",
+    }
+    content = json.dumps(trace)
+    if path is not None:
+        with open(path, "w") as handle:
+            handle.write(content)
+
+    return content
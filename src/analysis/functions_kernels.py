@@ -0,0 +1,188 @@
+"""Compiled kernels of the Sainte-Lague procedures.
+
+If numba is installed, the steps of the divisor procedures that hand out (or
+take away) one seat at a time are compiled with numba.njit(nogil=True), so
+threads can run them in parallel on parts of a batch. Without numba the NumPy
+implementations in functions_law and functions_law_arrays are used. numba is an
+optional dependency, backend_parity of benchmark_suite compares both backends.
+
+The kernels only change the integer seats. Rounding at the preliminary divisor
+and the Zuteilungsdivisor stay with NumPy, and the kernels compare the same
+Hoechstzahlen votes / (seats ± 0.5) with the same tie-breaking (the first of
+the tied entities), so both backends give bit-identical results.
+
+"""
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# The kernels are compiled.
+COMPILED = numba is not None
+
+# "enabled" uses the kernels, by default if numba is installed, "threads" is the
+# number of threads a batch is split into (only with numba).
+BACKEND = {"enabled": COMPILED, "threads": 1}
+
+# Status of a kernel.
+OK = 0
+NO_VOTES = 1
+MIN_SEATS_EXCEEDED = 2
+
+MESSAGES = {
+    NO_VOTES: "No votes left to allocate the remaining seats.",
+    MIN_SEATS_EXCEEDED: "Minimum seats exceed the number of seats to be allocated.",
+}
+
+
+def jit(function):
+    """Compile a kernel with numba if it is installed.
+
+    Input:
+    function (function): kernel in plain Python
+
+    Output:
+    kernel (function): compiled kernel or function itself
+
+    """
+
+    if not COMPILED:
+        return function
+
+    return numba.njit(nogil=True, cache=True)(function)
+
+
+@jit
+def step_seats(votes, seats, min_seats, difference):
+    """Hand out (difference > 0) or take away (difference < 0) seats one by one
+    at the highest (lowest) Hoechstzahl, in place.
+
+    Input:
+    votes (np.ndarray): votes by entity (float64)
+    seats (np.ndarray): rounded seats by entity (int64), changed in place
+    min_seats (np.ndarray): seats every entity gets at least (int64)
+    difference (int): seats missing in total
+
+    Output:
+    status (int): OK, NO_VOTES or MIN_SEATS_EXCEEDED
+
+    """
+
+    n_entities = len(votes)
+    # Entfallen zu wenig Sitze, erhält die höchste nächste Höchstzahl einen Sitz.
+    for _ in range(difference):
+        best = -1
+        highest = 0.0
+        for i in range(n_entities):
+            if votes[i] > 0:
+                hoechstzahl = votes[i] / (seats[i] + 0.5)
+                if best < 0 or hoechstzahl > highest:
+                    best = i
+                    highest = hoechstzahl
+        if best < 0:
+            return NO_VOTES
+        seats[best] += 1
+
+    # Entfallen zu viele Sitze, verliert die niedrigste Höchstzahl ihren Sitz.
+    for _ in range(-difference):
+        best = -1
+        lowest = 0.0
+        for i in range(n_entities):
+            if seats[i] > min_seats[i]:
+                hoechstzahl = votes[i] / (seats[i] - 0.5)
+                if best < 0 or hoechstzahl < lowest:
+                    best = i
+                    lowest = hoechstzahl
+        if best < 0:
+            return MIN_SEATS_EXCEEDED
+        seats[best] -= 1
+
+    return OK
+
+
+@jit
+def step_seats_rows(votes, seats, min_seats, difference):
+    """Apply step_seats to every row of a batch, in place.
+
+    Input:
+    votes (np.ndarray): votes, rows × entities (float64)
+    seats (np.ndarray): rounded seats, rows × entities (int64)
+    min_seats (np.ndarray): minimum seats, rows × entities (int64)
+    difference (np.ndarray): seats missing in each row (int64)
+
+    Output:
+    status (int): NO_VOTES if any row has no votes left, else
+        MIN_SEATS_EXCEEDED if any row failed, else OK
+
+    """
+
+    result = OK
+    for row in range(len(votes)):
+        status = step_seats(votes[row], seats[row], min_seats[row], difference[row])
+        if status == NO_VOTES:
+            return status
+        if status != OK:
+            result = status
+
+    return result
+
+
+def step_seats_batch(votes, seats, min_seats, difference):
+    """Run step_seats_rows, split into BACKEND["threads"] parts of the rows.
+
+    Input:
+    votes (np.ndarray): votes, rows × entities (float64)
+    seats (np.ndarray): rounded seats, rows × entities (int64), changed in place
+    min_seats (np.ndarray): minimum seats, rows × entities (int64)
+    difference (np.ndarray): seats missing in each row (int64)
+
+    Output:
+    status (int): same as step_seats_rows
+
+    """
+
+    votes = np.ascontiguousarray(votes, dtype=np.float64)
+    min_seats = np.ascontiguousarray(min_seats, dtype=np.int64)
+    difference = np.ascontiguousarray(difference, dtype=np.int64)
+    n_threads = min(BACKEND["threads"], len(votes))
+    if n_threads > 1 and not COMPILED:
+        # The plain Python kernels hold the GIL, threads only add overhead.
+        warnings.warn("Without numba the kernels run in one thread.", stacklevel=2)
+        n_threads = 1
+    if n_threads <= 1:
+        return step_seats_rows(votes, seats, min_seats, difference)
+
+    # The compiled kernels release the GIL, the parts run in parallel.
+    bounds = np.linspace(0, len(votes), n_threads + 1).astype(np.int64)
+    parts = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        statuses = list(
+            executor.map(
+                lambda part: step_seats_rows(
+                    votes[part], seats[part], min_seats[part], difference[part]
+                ),
+                parts,
+            )
+        )
+
+    if NO_VOTES in statuses:
+        return NO_VOTES
+
+    return max(statuses)
+
+
+def check_status(status):
+    """Raise the error of a failed kernel.
+
+    Input:
+    status (int): output of a kernel
+
+    """
+
+    if status != OK:
+        raise ValueError(MESSAGES[status])
@@ -7,33 +7,94 @@ Calculation follows
 Heft 3. Endgültige Ergebnisse nach Wahlkreisen
 
 """
-import math
+import heapq
+from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 
-
-def partition_of_votes(raw_data, wahlkreise):
-    """Partition the raw data into "Erststimmen" und "Zweitstimmen".
+from src.analysis.functions_coalitions import majority
+from src.analysis.functions_instrumentation import check_iterations
+from src.analysis.functions_instrumentation import count_iterations
+from src.analysis.functions_instrumentation import record_divisor
+from src.analysis.functions_instrumentation import stage
+from src.analysis.functions_kernels import BACKEND
+from src.analysis.functions_kernels import check_status
+from src.analysis.functions_kernels import step_seats
+from src.analysis.functions_mapping import land_codes
+from src.analysis.functions_mapping import sum_by_land_frame
+from src.analysis.functions_mapping import wahlkreis_mapping
+from src.analysis.functions_sparse import direktmandate_sparse_tied
+from src.data_management.functions_cache import cached_call
+from src.data_management.functions_cache import content_hash
+from src.data_management.functions_cache import result_cache
+
+# Sitzkontingente by hash of the population and number of seats, the least
+# recently used entry is evicted first.
+INITIAL_SEATS_CACHE = OrderedDict()
+INITIAL_SEATS_CACHE_SIZE = 32
+INITIAL_SEATS_CACHE_INFO = {"hits": 0, "misses": 0}
+
+# Results of whole elections by hash of the votes, Wahlkreise and Sitzkontingente.
+RESULT_CACHE = result_cache()
+
+# Error of sainte_lague_divisor for a tie between Hoechstzahlen.
+TIE_MESSAGE = "Tie between Hoechstzahlen, the last seat has to be decided by lot."
+
+
+def votes_by_stimme(raw_data, gebiete, stimmen=("Erststimmen", "Zweitstimmen")):
+    """Split the raw data into the votes of each Stimme in one pass.
 
     Input:
     raw_data (DataFrame): cleaned election data
-    wahlkreise (list): list with all Wahlkreise
+    gebiete (list): Gebiete to select, e.g. Wahlkreise, Bundesländer and
+        "Bundesgebiet" at once
+    stimmen (tuple): Stimmen to select
 
     Output:
-    erststimmen (DataFrame): By party the number of Erststimmen in each Wahlkreis
-    zweitimmen (DataFrame): By party the number of Zweitstimmen in each Wahlkreis
+    votes (dict): "votes" Stimme × party × Gebiet (zero for a party without a
+        row of this Stimme), the labels "stimmen", "parteien" (pd.Index) and
+        "gebiete"
 
     """
 
-    column_names = ["Partei"] + wahlkreise
-    erststimmen = (
-        raw_data[raw_data["Stimme"] == "Erststimmen"].loc[:, column_names].copy()
-    )
-    zweitstimmen = (
-        raw_data[raw_data["Stimme"] == "Zweitstimmen"].loc[:, column_names].copy()
+    partei_codes, parteien = pd.factorize(raw_data["Partei"])
+    stimme_codes = pd.Categorical(raw_data["Stimme"], categories=stimmen).codes
+    rows = stimme_codes >= 0
+
+    values = raw_data.loc[:, gebiete].to_numpy()
+    votes = np.zeros((len(stimmen), len(parteien), len(gebiete)), dtype=values.dtype)
+    votes[stimme_codes[rows], partei_codes[rows]] = values[rows]
+
+    return {
+        "votes": votes,
+        "stimmen": list(stimmen),
+        "parteien": pd.Index(parteien, name="Partei"),
+        "gebiete": list(gebiete),
+    }
+
+
+def votes_frame(votes, stimme, gebiete):
+    """Select the votes of one Stimme in some Gebiete from votes_by_stimme.
+
+    Input:
+    votes (dict): output of votes_by_stimme
+    stimme (str): Erststimmen or Zweitstimmen
+    gebiete (list): Gebiete, a subset of votes["gebiete"]
+
+    Output:
+    votes_by_party (DataFrame): votes by party (index) in each Gebiet
+
+    """
+
+    columns = pd.Index(votes["gebiete"]).get_indexer(gebiete)
+    votes_by_party = pd.DataFrame(
+        votes["votes"][votes["stimmen"].index(stimme)][:, columns],
+        index=votes["parteien"],
+        columns=gebiete,
     )
 
-    return erststimmen, zweitstimmen
+    return votes_by_party
 
 
 def direktmandate(votes_by_party):
@@ -79,34 +140,227 @@ def eligible_parties(zweitstimmen_bundesgebiet, direktmandate):
     return eligible_parties
 
 
-def core_sainte_lague(preliminary_divisor, data):
-    """Core of sainte_lague fucntion
+def sainte_lague_report(
+    votes,
+    available_seats,
+    min_seats=None,
+    preliminary_divisor=None,
+    max_iterations=None,
+):
+    """Exact Sainte-Lague procedure (Hoechstzahlverfahren) without any stepping.
+
+    The seats of a party only change when votes / divisor crosses a half-integer,
+    i.e. at the critical divisors votes / (k + 0.5). Starting from the rounded
+    seats at the preliminary divisor, seats are handed out to the highest
+    (or taken away from the lowest) of these Hoechstzahlen until the seat total
+    is met. A Zuteilungsdivisor is then chosen in the middle of the interval
+    that reproduces the allocation.
 
     Input:
-    preliminary_divisor (float): Guess for the divisor
-    data (DateFrame): data processed with divisors (e.g. votes by party)
+    votes (np.ndarray): votes by party, state, etc.
+    available_seats (int): number of seats to be allocated
+    min_seats (np.ndarray): seats every entity gets at least (e.g. Direktmandate),
+        defaults to zero
+    preliminary_divisor (float): Guess for the divisor, defaults to
+        votes.sum() / available_seats
+    max_iterations (int): seats that may be handed out or taken away one by one,
+        defaults to DIVISOR_LIMITS["max_iterations"] of functions_instrumentation
 
     Output:
-    allocated_seats (DataFrame): number of seats by party, state, etc.
-    sum_of_Seats: total number of seats
+    report (dict): "seats" by party, state, etc., the Zuteilungsdivisor
+        "divisor" that yields them (NaN for a tie between Hoechstzahlen),
+        "preliminary_divisor", "iterations" and "converged" (False for a tie)
 
     """
 
-    # Jede Landesliste (jedes Bundesland) erhält so viele Sitze, wie sich nach Teilung der Summe
-    # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben.
-    allocated_seats = data.divide(preliminary_divisor).copy()
+    votes = np.asarray(votes, dtype=float)
+    available_seats = int(available_seats)
+    if min_seats is None:
+        min_seats = np.zeros(votes.shape, dtype=np.int64)
+    else:
+        min_seats = np.asarray(min_seats, dtype=np.int64)
+
+    if preliminary_divisor is None or not 0 < preliminary_divisor < np.inf:
+        preliminary_divisor = votes.sum() / max(available_seats, 1)
+    if not preliminary_divisor > 0:
+        preliminary_divisor = 1.0
+
     # "Zahlenbruchteile unter 0,5 werden auf die darunter liegende ganze Zahl abgerundet,
     #  solche über 0,5 werden auf die darüber liegende ganze Zahl aufgerundet. "
-    allocated_seats = allocated_seats.round(0).astype(int)
+    allocated_seats = np.rint(votes / preliminary_divisor).astype(np.int64)
+    allocated_seats = np.maximum(allocated_seats, min_seats)
+    difference = available_seats - int(allocated_seats.sum())
+    check_iterations(abs(difference), max_iterations)
+    count_iterations(abs(difference))
+
+    if BACKEND["enabled"]:
+        check_status(step_seats(votes, allocated_seats, min_seats, difference))
+
+    # Entfallen zu wenig Sitze, erhält die höchste nächste Höchstzahl einen Sitz.
+    elif difference > 0:
+        candidates = np.flatnonzero(votes > 0)
+        hoechstzahlen = -votes[candidates] / (allocated_seats[candidates] + 0.5)
+        heap = list(zip(hoechstzahlen.tolist(), candidates.tolist()))
+        heapq.heapify(heap)
+        for _ in range(difference):
+            if not heap:
+                raise ValueError("No votes left to allocate the remaining seats.")
+            _, i = heapq.heappop(heap)
+            allocated_seats[i] += 1
+            heapq.heappush(heap, (-votes[i] / (allocated_seats[i] + 0.5), i))
+
+    # Entfallen zu viele Sitze, verliert die niedrigste Höchstzahl ihren Sitz.
+    elif difference < 0:
+        candidates = np.flatnonzero(allocated_seats > min_seats)
+        hoechstzahlen = votes[candidates] / (allocated_seats[candidates] - 0.5)
+        heap = list(zip(hoechstzahlen.tolist(), candidates.tolist()))
+        heapq.heapify(heap)
+        for _ in range(-difference):
+            if not heap:
+                raise ValueError(
+                    "Minimum seats exceed the number of seats to be allocated."
+                )
+            _, i = heapq.heappop(heap)
+            allocated_seats[i] -= 1
+            if allocated_seats[i] > min_seats[i]:
+                heapq.heappush(heap, (votes[i] / (allocated_seats[i] - 0.5), i))
+
+    # Every divisor strictly between the highest Hoechstzahl without a seat and
+    # the lowest Hoechstzahl with a seat reproduces the allocation.
+    above_minimum = allocated_seats > min_seats
+    upper = (votes[above_minimum] / (allocated_seats[above_minimum] - 0.5)).min(
+        initial=np.inf
+    )
+    lower = (votes / (allocated_seats + 0.5)).max(initial=0.0)
+
+    if lower >= upper:
+        divisor = np.nan
+    elif np.isfinite(upper):
+        divisor = (lower + upper) / 2
+    elif lower > 0:
+        divisor = 2 * lower
+    else:
+        divisor = preliminary_divisor
+    record_divisor(1, abs(difference), abs(difference), lower >= upper)
+
+    report = {
+        "seats": allocated_seats,
+        "divisor": divisor,
+        "preliminary_divisor": preliminary_divisor,
+        "iterations": abs(difference),
+        "converged": bool(lower < upper),
+    }
 
-    # Calculate sum of listenplaetze after first iteration
-    sum_of_seats = allocated_seats.sum()
+    return report
 
-    return allocated_seats, sum_of_seats
+
+def sainte_lague_divisor(
+    votes,
+    available_seats,
+    min_seats=None,
+    preliminary_divisor=None,
+    max_iterations=None,
+):
+    """Exact Sainte-Lague procedure, see sainte_lague_report.
+
+    Input:
+    votes (np.ndarray): votes by party, state, etc.
+    available_seats (int): number of seats to be allocated
+    min_seats (np.ndarray): seats every entity gets at least (e.g. Direktmandate),
+        defaults to zero
+    preliminary_divisor (float): Guess for the divisor, defaults to
+        votes.sum() / available_seats
+    max_iterations (int): seats that may be handed out or taken away one by one
+
+    Output:
+    allocated_seats (np.ndarray): seats by party, state, etc.
+    divisor (float): Zuteilungsdivisor that yields allocated_seats
+
+    """
+
+    report = sainte_lague_report(
+        votes, available_seats, min_seats, preliminary_divisor, max_iterations
+    )
+    if not report["converged"]:
+        raise ValueError(TIE_MESSAGE)
+
+    return report["seats"], report["divisor"]
+
+
+def sainte_lague_margins(votes, allocated_seats, min_seats=None):
+    """Votes that are missing for the next seat and votes that can be lost
+    before a seat is lost in a Sainte-Lague allocation.
+
+    A seat changes hands exactly when the Hoechstzahl votes / (seats + 0.5) of
+    an entity exceeds the lowest Hoechstzahl votes / (seats - 0.5) that got a
+    seat. The margins follow in closed form, holding the votes of all other
+    entities and the number of seats fixed.
+
+    Input:
+    votes (np.ndarray): votes by party, state, etc.
+    allocated_seats (np.ndarray): seats from sainte_lague_divisor
+    min_seats (np.ndarray): seats every entity gets at least, defaults to zero
+
+    Output:
+    votes_to_next_seat (np.ndarray): additional votes needed for one more seat,
+        inf if no other entity can lose a seat
+    votes_to_lose_seat (np.ndarray): lost votes after which one seat is lost,
+        inf if the entity only holds its minimum seats
+
+    """
+
+    votes = np.asarray(votes, dtype=float)
+    allocated_seats = np.asarray(allocated_seats, dtype=np.int64)
+    if min_seats is None:
+        min_seats = np.zeros(votes.shape, dtype=np.int64)
+    else:
+        min_seats = np.asarray(min_seats, dtype=np.int64)
+
+    positions = np.arange(len(votes))
+    above_minimum = allocated_seats > min_seats
+    last_hoechstzahl = np.full(votes.shape, np.inf)
+    last_hoechstzahl[above_minimum] = votes[above_minimum] / (
+        allocated_seats[above_minimum] - 0.5
+    )
+    next_hoechstzahl = votes / (allocated_seats + 0.5)
+
+    # Lowest Hoechstzahl with a seat and highest without among all other entities.
+    if len(votes) < 2:
+        inf = np.full(votes.shape, np.inf)
+        return inf, inf
+    order = np.argsort(last_hoechstzahl, kind="stable")
+    lowest = np.where(positions == order[0], order[1], order[0])
+    order = np.argsort(-next_hoechstzahl, kind="stable")
+    highest = np.where(positions == order[0], order[1], order[0])
+
+    # votes / (seats + 0.5) > votes_j / (seats_j - 0.5) in exact arithmetic, ties
+    # are decided by lot so one more vote is needed.
+    denominator = 2 * allocated_seats[lowest] - 1
+    votes_to_next_seat = (
+        np.floor_divide(
+            votes[lowest] * (2 * allocated_seats + 1) - votes * denominator,
+            denominator,
+        )
+        + 1
+    )
+    votes_to_next_seat[~np.isfinite(last_hoechstzahl[lowest])] = np.inf
+
+    # (votes - lost) / (seats - 0.5) < votes_k / (seats_k + 0.5)
+    denominator = 2 * allocated_seats[highest] + 1
+    votes_to_lose_seat = (
+        np.floor_divide(
+            votes * denominator - votes[highest] * (2 * allocated_seats - 1),
+            denominator,
+        )
+        + 1
+    )
+    votes_to_lose_seat[~above_minimum | (votes_to_lose_seat > votes)] = np.inf
+
+    return votes_to_next_seat, votes_to_lose_seat
 
 
 def sainte_lague(preliminary_divisor, data, total_available_seats):
-    """Iterative Sainte-Lague procedure which applies core_sainte_lague
+    """Sainte-Lague procedure which applies sainte_lague_divisor
 
     Input:
     preliminary_divisor (float): Guess for the divisor
@@ -116,31 +370,26 @@ def sainte_lague(preliminary_divisor, data, total_available_seats):
 
     Output:
     allocated_seats (DataFrame): seats by party, state, etc.
+    divisor (float): Zuteilungsdivisor
 
     """
 
-    allocated_seats, sum_of_seats = core_sainte_lague(preliminary_divisor, data)
+    seats, divisor = sainte_lague_divisor(
+        data.to_numpy(), total_available_seats, preliminary_divisor=preliminary_divisor
+    )
+    allocated_seats = pd.Series(seats, index=data.index, name=data.name)
 
-    while sum_of_seats != total_available_seats:
-        if sum_of_seats > total_available_seats:
-            preliminary_divisor = preliminary_divisor + 50
-        elif sum_of_seats < total_available_seats:
-            preliminary_divisor = preliminary_divisor - 50
-        else:
-            pass
+    return allocated_seats, divisor
 
-        allocated_seats, sum_of_seats = core_sainte_lague(preliminary_divisor, data)
-    else:
-        return allocated_seats, preliminary_divisor
 
-
-def sainte_lague_new(preliminary_divisor, data, available_seats):
-    """Iterative Sainte-Lague procedure which applies core_sainte_lague
+def sainte_lague_new(preliminary_divisor, data, available_seats, max_iterations=None):
+    """Sainte-Lague procedure which applies sainte_lague_divisor
 
     Input:
     preliminary_divisor (float): Guess for the divisor
     data (pd.DateFrame): data processed with divisors (e.g. votes by party)
     available_seats (int): number of seats to be allocated
+    max_iterations (int): limit of the iterations, see sainte_lague_report
 
     Output:
     allocated_seats (pd.DataFrame): seats allocated by party, state, etc.
@@ -149,20 +398,13 @@ def sainte_lague_new(preliminary_divisor, data, available_seats):
 
     # Jede Landesliste (jedes Bundesland) erhält so viele Sitze, wie sich nach Teilung der Summe
     # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben.
-    allocated_seats = data.divide(preliminary_divisor).copy()
-    # "Zahlenbruchteile unter 0,5 werden auf die darunter liegende ganze Zahl abgerundet,
-    #  solche über 0,5 werden auf die darüber liegende ganze Zahl aufgerundet. "
-    allocated_seats = allocated_seats.round(0).astype(int)
-
-    # Calculate sum of listenplaetze after first iteration
-    sum_of_seats = allocated_seats.sum()
-
-    if sum_of_seats != available_seats:
-        if sum_of_seats > available_seats:
-            preliminary_divisor = preliminary_divisor + 50
-        elif sum_of_seats < available_seats:
-            preliminary_divisor = preliminary_divisor - 50
-        allocated_seats = sainte_lague_new(preliminary_divisor, data, available_seats)
+    seats, _ = sainte_lague_divisor(
+        data.to_numpy(),
+        available_seats,
+        preliminary_divisor=preliminary_divisor,
+        max_iterations=max_iterations,
+    )
+    allocated_seats = pd.Series(seats, index=data.index, name=data.name)
 
     return allocated_seats
 
@@ -201,14 +443,47 @@ def allocation_seats_after2013(zweitstimmen_by_party, available_seats):
     return allocation_of_seats
 
 
-def sainte_lague_last(preliminary_divisor, data, available_seats, direktmandate):
-    """Iterative Sainte-Lague procedure which applies core_sainte_lague
+def memoized_initial_seats(population, available_seats):
+    """Sitzkontingente of the Bundesländer (allocation_seats_after2013),
+    memoized by the content of the population and the number of seats.
+
+    Input:
+    population (pd.Series): German population by Bundesland
+    available_seats (int): number of seats available
+
+    Output:
+    initial_seats_by_state (pd.Series): seats by Bundesland
+
+    """
+
+    key = (content_hash(population), int(available_seats))
+    if key in INITIAL_SEATS_CACHE:
+        INITIAL_SEATS_CACHE_INFO["hits"] += 1
+        INITIAL_SEATS_CACHE.move_to_end(key)
+    else:
+        INITIAL_SEATS_CACHE_INFO["misses"] += 1
+        INITIAL_SEATS_CACHE[key] = allocation_seats_after2013(
+            population, available_seats
+        )
+        if len(INITIAL_SEATS_CACHE) > INITIAL_SEATS_CACHE_SIZE:
+            INITIAL_SEATS_CACHE.popitem(last=False)
+
+    # Copy such that callers cannot change the cached result.
+    return INITIAL_SEATS_CACHE[key].copy()
+
+
+def sainte_lague_last(
+    preliminary_divisor, data, available_seats, direktmandate, max_iterations=None
+):
+    """Sainte-Lague procedure which applies sainte_lague_divisor where each
+    entity gets at least its Direktmandate
 
     Input:
     preliminary_divisor (float): Guess for the divisor
     data (pd.DateFrame): data processed with divisors (e.g. votes by party)
     available_seats (int): number of seats to be allocated
     direktmandate (pd.DataFrame): number of Direktmandate by Bundesland
+    max_iterations (int): limit of the iterations, see sainte_lague_report
 
     Output:
     allocated_seats (pd.DataFrame): seats by party, state, etc.
@@ -216,28 +491,17 @@ def sainte_lague_last(preliminary_divisor, data, available_seats, direktmandate)
     """
 
     # Jede Landesliste (jedes Bundesland) erhält so viele Sitze, wie sich nach Teilung der Summe
-    # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben.
-    prel_allocated_seats = data.divide(preliminary_divisor).copy()
-
-    # "Zahlenbruchteile unter 0,5 werden auf die darunter liegende ganze Zahl abgerundet,
-    #  solche über 0,5 werden auf die darüber liegende ganze Zahl aufgerundet. "
-    prel_allocated_seats = prel_allocated_seats.round(0).astype(int)
-    allocated_seats = pd.concat([prel_allocated_seats, direktmandate]).max(level=0)
-
-    # Calculate sum of listenplaetze after first iteration
-    sum_of_seats = allocated_seats.sum()
-
-    if sum_of_seats != available_seats:
-        if sum_of_seats > available_seats:
-            preliminary_divisor = preliminary_divisor + 50
-        elif sum_of_seats < available_seats:
-            preliminary_divisor = preliminary_divisor - 50
-        allocated_seats = sainte_lague_last(
-            preliminary_divisor,
-            data,
-            available_seats,
-            direktmandate,
-        )
+    # ihrer erhaltenen Zweitstimmen (der Bevölkerung) durch einen Zuteilungsdivisor ergeben,
+    # mindestens aber die in den Wahlkreisen errungenen Sitze.
+    min_seats = direktmandate.reindex(data.index).fillna(0).to_numpy()
+    seats, _ = sainte_lague_divisor(
+        data.to_numpy(),
+        available_seats,
+        min_seats=min_seats,
+        preliminary_divisor=preliminary_divisor,
+        max_iterations=max_iterations,
+    )
+    allocated_seats = pd.Series(seats, index=data.index)
 
     return allocated_seats
 
@@ -282,144 +546,90 @@ def last_allocation_seats(zweitstimmen_by_party, initial_seats_by_state, direktm
     return allocation_of_seats
 
 
-def bundestagswahl_2013_2017(
-    erststimmen,
-    zweitstimmen_bundesland,
-    zweitstimmen_bundesgebiet,
-    bundesländer_wahlkreise,
-    initial_seats_by_state,
-):
-    """calculaute results for bundestagswahl 2013 and 2017
+def allocation_seats_after2013_margins(zweitstimmen_by_party, available_seats):
+    """Allocation of seats like allocation_seats_after2013 together with the
+    margins to the next seat and to the loss of a seat.
 
     Input:
-    # TODO
+    zweitstimmen_by_party (pd.Series): Zweitstimmen by party
+    available_seats (int): number of seats available
 
     Output:
-    VARIOUS OUTPUTS
-
+    allocation_of_seats (pd.DataFrame): by entity the seats ("seats"), the votes
+        missing for the next seat ("votes_to_next_seat") and the votes that can
+        be lost before a seat is lost ("votes_to_lose_seat")
 
     """
 
-    # * Calculate Direktmandate.
-    direktmandate_wahlkreis = erststimmen.apply(direktmandate)
-
-    direktmandate_bundesland = pd.DataFrame(
-        0, index=erststimmen.index, columns=bundesländer_wahlkreise.keys()
+    votes = zweitstimmen_by_party.to_numpy()
+    seats, _ = sainte_lague_divisor(votes, available_seats)
+    votes_to_next_seat, votes_to_lose_seat = sainte_lague_margins(votes, seats)
+
+    allocation_of_seats = pd.DataFrame(
+        {
+            "seats": seats,
+            "votes_to_next_seat": votes_to_next_seat,
+            "votes_to_lose_seat": votes_to_lose_seat,
+        },
+        index=zweitstimmen_by_party.index,
     )
 
-    for bundesland in bundesländer_wahlkreise.keys():
-        direktmandate_bundesland[bundesland] = direktmandate_wahlkreis[
-            bundesländer_wahlkreise[bundesland]
-        ].sum(axis=1)
-
-    # * STEP 3: Calculate the Mindestsitzzahl for each federal state.
-    # * Calculation of Listenplätze (first round: on Bundesländer level)
-
-    # Determine parties that are eligible.
-
-    eligible = eligible_parties(
-        zweitstimmen_bundesgebiet, direktmandate_bundesland.sum(axis=1)
-    )
-
-    # Keep eligible parties
-    zweitstimmen_bundesland = zweitstimmen_bundesland.loc[eligible]
+    return allocation_of_seats
 
-    listenplätze_bundesland = pd.DataFrame(
-        index=zweitstimmen_bundesland.index, columns=zweitstimmen_bundesland.columns
-    )
 
-    for bundesland in bundesländer_wahlkreise.keys():
-        # Listenplätze
-        # print("Bundesland:", bundesland)
-        listenplätze_bundesland[bundesland] = allocation_seats_after2013(
-            zweitstimmen_bundesland[bundesland], initial_seats_by_state.loc[bundesland]
-        )
+def last_allocation_seats_margins(
+    zweitstimmen_by_party, initial_seats_by_state, direktmandate
+):
+    """Allocation of seats like last_allocation_seats together with the
+    margins to the next seat and to the loss of a seat.
 
-    # * Calculate number of seats before Ausgleichsmandate
-    mindestsitzzahl = pd.DataFrame(
-        index=eligible, columns=bundesländer_wahlkreise.keys()
-    )
+    Input:
+    zweitstimmen_by_party (pd.Series): Zweitstimmen by party
+    initial_seats_by_state (int): number of seats to be allocated
+    direktmandate (pd.Series): number of Direktmandate by Bundesland
 
-    # temp = list(set(direktmandate_bundesland.index.tolist()) - set(eligible))
-    # listenplätze_bundesland.loc[temp] = 0
-    for bundesland in bundesländer_wahlkreise.keys():
-        for partei in eligible:
-            mindestsitzzahl.loc[partei, bundesland] = max(
-                listenplätze_bundesland.loc[partei, bundesland],
-                direktmandate_bundesland.loc[partei, bundesland],
-            )
-    mindestsitzzahl.index.rename("Partei", inplace=True)
-    mindestsitzzahl["sum_sitze"] = mindestsitzzahl.sum(axis=1)
+    Output:
+    allocation_of_seats (pd.DataFrame): by entity the seats ("seats"), the votes
+        missing for the next seat ("votes_to_next_seat") and the votes that can
+        be lost before a seat is lost ("votes_to_lose_seat", inf where the seats
+        are Direktmandate)
 
-    # * Number of Ausgleichsmandate (definite size of Bundestag)
-    zweitstimmen_bundesgebiet_cp = zweitstimmen_bundesgebiet.copy()
-    zweitstimmen_bundesgebiet_cp.columns = ["Zweitstimmen"]
-    # Keep eligible parties
-    zweitstimmen_bundesgebiet_cp = zweitstimmen_bundesgebiet_cp.loc[eligible]
+    """
 
-    bundestag_seats_bef_ausgleichsmdte = zweitstimmen_bundesgebiet_cp.join(
-        mindestsitzzahl
+    votes = zweitstimmen_by_party.to_numpy()
+    min_seats = direktmandate.reindex(zweitstimmen_by_party.index).fillna(0)
+    seats, _ = sainte_lague_divisor(
+        votes, initial_seats_by_state, min_seats=min_seats.to_numpy()
     )
-    bundestag_seats_bef_ausgleichsmdte["divisor"] = (
-        bundestag_seats_bef_ausgleichsmdte["Zweitstimmen"]
-        / bundestag_seats_bef_ausgleichsmdte["sum_sitze"]
+    votes_to_next_seat, votes_to_lose_seat = sainte_lague_margins(
+        votes, seats, min_seats.to_numpy()
     )
-    min_divisor = bundestag_seats_bef_ausgleichsmdte["divisor"].min()
-    bundestag_seats_bef_ausgleichsmdte["seats_unrounded"] = (
-        bundestag_seats_bef_ausgleichsmdte["Zweitstimmen"] / min_divisor
-    )
-    bundestag_seats_bef_ausgleichsmdte[
-        "seats_rounded"
-    ] = bundestag_seats_bef_ausgleichsmdte["seats_unrounded"].round(0)
-
-    # * Redistribution of additional seats to Länder
-
-    zweitstimmen_bundesland_t = zweitstimmen_bundesland.T
 
-    bundestagssitze_bundesland = pd.DataFrame(
-        index=zweitstimmen_bundesland_t.index, columns=zweitstimmen_bundesland_t.columns
+    allocation_of_seats = pd.DataFrame(
+        {
+            "seats": seats,
+            "votes_to_next_seat": votes_to_next_seat,
+            "votes_to_lose_seat": votes_to_lose_seat,
+        },
+        index=zweitstimmen_by_party.index,
     )
 
-    direktmandate_bundesland_t = direktmandate_bundesland.T
-    direktmandate_bundesland_t = direktmandate_bundesland_t[eligible]
+    return allocation_of_seats
 
-    for partei in zweitstimmen_bundesland_t.keys():
-        # print(partei)
-        # Bundestagssitze by Land
-        bundestagssitze_bundesland[partei] = last_allocation_seats(
-            zweitstimmen_bundesland_t[partei],
-            bundestag_seats_bef_ausgleichsmdte.loc[partei, "seats_rounded"],
-            direktmandate_bundesland_t[partei],
-        )
 
-    # * Determine number of Ausgleichs- und Überhangmandate by party and Bundesland
+def possible_coalitions(seats_by_party):
+    """Check which of the usual coalitions have a majority of seats.
 
-    ausgleich_and_überhang = pd.DataFrame(
-        index=zweitstimmen_bundesland_t.index,
-        columns=pd.MultiIndex.from_product(
-            [
-                zweitstimmen_bundesland_t.columns.tolist(),
-                ["Sum", "Überhang", "Ausgleich"],
-            ]
-        ),
-    )
+    coalition_majorities in functions_coalitions checks all coalitions.
 
-    for bundesland in bundestagssitze_bundesland.index.tolist():
-        for partei in zweitstimmen_bundesland_t.columns:
-            ausgleich_and_überhang.loc[
-                bundesland, (partei, "Sum")
-            ] = bundestagssitze_bundesland.loc[bundesland, partei]
-            ausgleich_and_überhang.loc[bundesland, (partei, "Ausgleich")] = (
-                ausgleich_and_überhang.loc[bundesland, (partei, "Sum")]
-                - bundestag_seats_bef_ausgleichsmdte.loc[partei, bundesland]
-            )
-            ausgleich_and_überhang.loc[bundesland, (partei, "Überhang")] = max(
-                0,
-                direktmandate_bundesland.loc[partei, bundesland]
-                - listenplätze_bundesland.loc[partei, bundesland],
-            )
+    Input:
+    seats_by_party (pd.Series): final seats in the Bundestag by party
 
-    # * Possible coalitions
+    Output:
+    possible_coalition (pd.DataFrame): seats, margin and whether the coalition
+        has a majority
+
+    """
 
     coalitions = {
         "groko": [
@@ -451,27 +661,242 @@ def bundestagswahl_2013_2017(
         ],
     }
 
+    # Membership of the parties in the coalitions, parties without seats are
+    # not part of seats_by_party.
+    membership = np.array(
+        [
+            [partei in coalitions[coalition] for partei in seats_by_party.index]
+            for coalition in coalitions.keys()
+        ],
+        dtype=np.int64,
+    )
+    sum_seats = membership @ seats_by_party.to_numpy(dtype=np.int64)
+    margin = sum_seats - majority(seats_by_party.sum())
+
     possible_coalition = pd.DataFrame(
-        coalitions,
+        {
+            "possible coalition": np.where(margin >= 0, "possible", "not possible"),
+            "sum_seats": sum_seats,
+            "margin": margin,
+        },
         index=coalitions.keys(),
-        columns=["possible coalition", "sum_seats", "margin"],
     )
 
-    for posble_coalitions in coalitions.keys():
-        sum_seats_coalition = 0
-        for partei in coalitions[posble_coalitions]:
-            sum_seats_coalition = (
-                sum_seats_coalition
-                + bundestag_seats_bef_ausgleichsmdte.loc[partei, "seats_rounded"]
+    return possible_coalition
+
+
+def bundestagswahl_2013_2017(
+    erststimmen,
+    zweitstimmen_bundesland,
+    zweitstimmen_bundesgebiet,
+    bundesländer_wahlkreise,
+    initial_seats_by_state,
+    mapping=None,
+):
+    """calculaute results for bundestagswahl 2013 and 2017
+
+    Every party with the most Erststimmen of a Wahlkreis wins a Direktmandat,
+    so a tie gives the Wahlkreis to all tied parties, for dense and sparse
+    Erststimmen alike (the batch engines of functions_law_arrays give it to the
+    first of them).
+
+    Input:
+    erststimmen (DataFrame or dict): Erststimmen by party and Wahlkreis, or the
+        sparse Erststimmen of functions_sparse of one election with the labels
+        "parteien" and "wahlkreise"
+    zweitstimmen_bundesland (DataFrame): Zweitstimmen by party and Bundesland
+    zweitstimmen_bundesgebiet (DataFrame): Zweitstimmen by party in one column
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list with all
+        of the Wahlkreise in this Bundesland
+    initial_seats_by_state (Series): Sitzkontingent of each Bundesland
+    mapping (dict): output of wahlkreis_mapping(bundesländer_wahlkreise) to reuse
+        across calls, compiled if None
+
+    Output:
+    bundestagssitze_bundesland (DataFrame): seats by Bundesland and eligible
+        party
+    ausgleich_and_überhang (DataFrame): seats ("Sum"), Überhang- and
+        Ausgleichsmandate by Bundesland and eligible party
+    possible_coalition (DataFrame): seats and majority of each coalition
+
+    """
+
+    # * Calculate Direktmandate.
+    with stage("direktmandate"):
+        if mapping is None:
+            mapping = wahlkreis_mapping(bundesländer_wahlkreise)
+        if isinstance(erststimmen, dict):
+            if erststimmen["shape"][0] != 1:
+                raise ValueError(
+                    f"The sparse Erststimmen hold {erststimmen['shape'][0]} "
+                    "scenarios, bundestagswahl_2013_2017 evaluates one election. "
+                    "Use the engines of functions_reforms for many scenarios."
+                )
+            if "parteien" not in erststimmen or "wahlkreise" not in erststimmen:
+                raise ValueError(
+                    "The sparse Erststimmen need the labels 'parteien' and "
+                    "'wahlkreise'."
+                )
+            direktmandate_bundesland = pd.DataFrame(
+                direktmandate_sparse_tied(
+                    erststimmen,
+                    land_codes(mapping, erststimmen["wahlkreise"]),
+                    mapping["n_länder"],
+                )[0],
+                index=erststimmen["parteien"],
+                columns=mapping["bundesländer"],
+            )
+        else:
+            direktmandate_bundesland = sum_by_land_frame(
+                erststimmen.apply(direktmandate), mapping
+            )
+
+    # * STEP 3: Calculate the Mindestsitzzahl for each federal state.
+    # * Calculation of Listenplätze (first round: on Bundesländer level)
+
+    # Determine parties that are eligible.
+    with stage("eligible_parties"):
+        eligible = eligible_parties(
+            zweitstimmen_bundesgebiet, direktmandate_bundesland.sum(axis=1)
+        )
+
+        # Keep eligible parties
+        zweitstimmen_bundesland = zweitstimmen_bundesland.loc[eligible]
+
+    with stage("listenplätze"):
+        listenplätze_bundesland = pd.DataFrame(
+            index=zweitstimmen_bundesland.index, columns=zweitstimmen_bundesland.columns
+        )
+
+        for bundesland in bundesländer_wahlkreise.keys():
+            # Listenplätze
+            # print("Bundesland:", bundesland)
+            listenplätze_bundesland[bundesland] = allocation_seats_after2013(
+                zweitstimmen_bundesland[bundesland],
+                initial_seats_by_state.loc[bundesland],
             )
-        possible_coalition.loc[posble_coalitions, "sum_seats"] = sum_seats_coalition
 
-    necc_votes_maj = math.ceil(
-        bundestag_seats_bef_ausgleichsmdte["seats_rounded"].sum() / 2
-    )
-    possible_coalition["margin"] = possible_coalition["sum_seats"] - necc_votes_maj
-    possible_coalition["possible coalition"] = possible_coalition["margin"].apply(
-        lambda x: "possible" if x >= 0 else "not possible"
-    )
+    # * Calculate number of seats before Ausgleichsmandate
+    with stage("mindestsitzzahl"):
+        # The higher of Listenplätze and Direktmandate of each party and Bundesland.
+        bundesländer = mapping["bundesländer"]
+        mindestsitzzahl = pd.DataFrame(
+            np.maximum(
+                listenplätze_bundesland.loc[eligible, bundesländer].to_numpy(
+                    dtype=np.int64
+                ),
+                direktmandate_bundesland.loc[eligible, bundesländer].to_numpy(
+                    dtype=np.int64
+                ),
+            ),
+            index=pd.Index(eligible, name="Partei"),
+            columns=bundesländer,
+        )
+        mindestsitzzahl["sum_sitze"] = mindestsitzzahl.sum(axis=1)
+
+    # * Number of Ausgleichsmandate (definite size of Bundestag)
+    with stage("divisor"):
+        zweitstimmen_bundesgebiet_cp = zweitstimmen_bundesgebiet.copy()
+        zweitstimmen_bundesgebiet_cp.columns = ["Zweitstimmen"]
+        # Keep eligible parties
+        zweitstimmen_bundesgebiet_cp = zweitstimmen_bundesgebiet_cp.loc[eligible]
+
+        bundestag_seats_bef_ausgleichsmdte = zweitstimmen_bundesgebiet_cp.join(
+            mindestsitzzahl
+        )
+        bundestag_seats_bef_ausgleichsmdte["divisor"] = (
+            bundestag_seats_bef_ausgleichsmdte["Zweitstimmen"]
+            / bundestag_seats_bef_ausgleichsmdte["sum_sitze"]
+        )
+        min_divisor = bundestag_seats_bef_ausgleichsmdte["divisor"].min()
+        bundestag_seats_bef_ausgleichsmdte["seats_unrounded"] = (
+            bundestag_seats_bef_ausgleichsmdte["Zweitstimmen"] / min_divisor
+        )
+        bundestag_seats_bef_ausgleichsmdte[
+            "seats_rounded"
+        ] = bundestag_seats_bef_ausgleichsmdte["seats_unrounded"].round(0)
+
+    # * Redistribution of additional seats to Länder
+    with stage("bundestagssitze"):
+        zweitstimmen_bundesland_t = zweitstimmen_bundesland.T
+
+        bundestagssitze_bundesland = pd.DataFrame(
+            index=zweitstimmen_bundesland_t.index,
+            columns=zweitstimmen_bundesland_t.columns,
+        )
+
+        direktmandate_bundesland_t = direktmandate_bundesland.T
+        direktmandate_bundesland_t = direktmandate_bundesland_t[eligible]
+
+        for partei in zweitstimmen_bundesland_t.keys():
+            # print(partei)
+            # Bundestagssitze by Land
+            bundestagssitze_bundesland[partei] = last_allocation_seats(
+                zweitstimmen_bundesland_t[partei],
+                bundestag_seats_bef_ausgleichsmdte.loc[partei, "seats_rounded"],
+                direktmandate_bundesland_t[partei],
+            )
+
+    # * Determine number of Ausgleichs- und Überhangmandate by party and Bundesland
+    with stage("ausgleich"):
+        ausgleich_and_überhang = pd.DataFrame(
+            index=zweitstimmen_bundesland_t.index,
+            columns=pd.MultiIndex.from_product(
+                [
+                    zweitstimmen_bundesland_t.columns.tolist(),
+                    ["Sum", "Überhang", "Ausgleich"],
+                ]
+            ),
+        )
+
+        for bundesland in bundestagssitze_bundesland.index.tolist():
+            for partei in zweitstimmen_bundesland_t.columns:
+                ausgleich_and_überhang.loc[
+                    bundesland, (partei, "Sum")
+                ] = bundestagssitze_bundesland.loc[bundesland, partei]
+                ausgleich_and_überhang.loc[bundesland, (partei, "Ausgleich")] = (
+                    ausgleich_and_überhang.loc[bundesland, (partei, "Sum")]
+                    - bundestag_seats_bef_ausgleichsmdte.loc[partei, bundesland]
+                )
+                ausgleich_and_überhang.loc[bundesland, (partei, "Überhang")] = max(
+                    0,
+                    direktmandate_bundesland.loc[partei, bundesland]
+                    - listenplätze_bundesland.loc[partei, bundesland],
+                )
+
+    # * Possible coalitions
+    with stage("coalitions"):
+        possible_coalition = possible_coalitions(bundestagssitze_bundesland.sum())
 
     return bundestagssitze_bundesland, ausgleich_and_überhang, possible_coalition
+
+
+def cached_bundestagswahl_2013_2017(
+    erststimmen,
+    zweitstimmen_bundesland,
+    zweitstimmen_bundesgebiet,
+    bundesländer_wahlkreise,
+    initial_seats_by_state,
+    cache=RESULT_CACHE,
+):
+    """bundestagswahl_2013_2017 through a result cache, repeated inputs are
+    answered from memory or from the files under bld/cache/results.
+
+    Input:
+    same as bundestagswahl_2013_2017
+    cache (dict): output of result_cache
+
+    Output:
+    same as bundestagswahl_2013_2017
+
+    """
+
+    return cached_call(
+        cache,
+        bundestagswahl_2013_2017,
+        erststimmen,
+        zweitstimmen_bundesland,
+        zweitstimmen_bundesgebiet,
+        bundesländer_wahlkreise,
+        initial_seats_by_state,
+    )
@@ -0,0 +1,645 @@
+"""Array implementation of the seat allocation for the Bundestagswahl 2013 and 2017
+Bundeswahlgesetz §6
+
+Same procedure as bundestagswahl_2013_2017 in functions_law, but the whole
+computation works on dense NumPy arrays indexed parties × Bundesländer ×
+Wahlkreise. Labels are only attached when converting from and to the pandas
+objects used in functions_law.
+
+"""
+import numpy as np
+import pandas as pd
+
+from src.analysis.functions_instrumentation import check_iterations
+from src.analysis.functions_instrumentation import count_iterations
+from src.analysis.functions_instrumentation import record_divisor
+from src.analysis.functions_instrumentation import stage
+from src.analysis.functions_kernels import BACKEND
+from src.analysis.functions_kernels import check_status
+from src.analysis.functions_kernels import step_seats_batch
+from src.analysis.functions_law import possible_coalitions
+from src.analysis.functions_law import sainte_lague_divisor
+from src.analysis.functions_mapping import land_mapping
+from src.analysis.functions_mapping import sum_by_land
+from src.analysis.functions_mapping import wahlkreis_mapping
+from src.analysis.functions_sparse import direktmandate_sparse
+
+
+def election_arrays(
+    erststimmen,
+    zweitstimmen_bundesland,
+    zweitstimmen_bundesgebiet,
+    bundesländer_wahlkreise,
+    initial_seats_by_state,
+):
+    """Convert the input of bundestagswahl_2013_2017 into dense arrays.
+
+    Input:
+    erststimmen (pd.DataFrame): Erststimmen by party (row) and Wahlkreis (column)
+    zweitstimmen_bundesland (pd.DataFrame): Zweitstimmen by party and Bundesland
+    zweitstimmen_bundesgebiet (pd.DataFrame): Zweitstimmen by party in Germany
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list
+        with all of the Wahlkreise in this Bundesland
+    initial_seats_by_state (pd.Series): Sitzkontingent of each Bundesland
+
+    Output:
+    arrays (dict): labels of all axes ("parteien", "bundesländer", "wahlkreise")
+        and the votes and seats as arrays ("erststimmen" parties × Wahlkreise,
+        "zweitstimmen_bundesland" parties × Bundesländer,
+        "zweitstimmen_bundesgebiet" parties, "wahlkreis_land" Bundesland code of
+        each Wahlkreis, "initial_seats" Bundesländer)
+
+    """
+
+    parteien = erststimmen.index.tolist()
+    bundesländer = zweitstimmen_bundesland.columns.tolist()
+    mapping = wahlkreis_mapping(bundesländer_wahlkreise, bundesländer)
+    wahlkreise = mapping["wahlkreise"]
+
+    arrays = {
+        "parteien": parteien,
+        "bundesländer": bundesländer,
+        "wahlkreise": wahlkreise,
+        "erststimmen": erststimmen[wahlkreise].to_numpy(dtype=np.float64),
+        "zweitstimmen_bundesland": zweitstimmen_bundesland.reindex(parteien)
+        .fillna(0)
+        .to_numpy(dtype=np.float64),
+        "zweitstimmen_bundesgebiet": zweitstimmen_bundesgebiet.iloc[:, 0]
+        .reindex(parteien)
+        .fillna(0)
+        .to_numpy(dtype=np.float64),
+        "wahlkreis_land": mapping["wahlkreis_land"],
+        "initial_seats": initial_seats_by_state.reindex(bundesländer).to_numpy(
+            dtype=np.int64
+        ),
+    }
+
+    return arrays
+
+
+def direktmandate_arrays(erststimmen, wahlkreis_land, n_länder):
+    """Determine the Direktmandate in each Wahlkreis and sum them by Bundesland.
+
+    Input:
+    erststimmen (np.ndarray): Erststimmen by party and Wahlkreis
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    direktmandate_wahlkreis (np.ndarray): 1 for the party that wins the Wahlkreis
+    direktmandate_bundesland (np.ndarray): Direktmandate by party and Bundesland
+
+    """
+
+    direktmandate_wahlkreis = (erststimmen == erststimmen.max(axis=0)).astype(np.int64)
+    direktmandate_bundesland = sum_by_land(
+        direktmandate_wahlkreis, land_mapping(wahlkreis_land, n_länder)
+    )
+
+    return direktmandate_wahlkreis, direktmandate_bundesland
+
+
+def eligible_parties_arrays(zweitstimmen_bundesgebiet, direktmandate):
+    """Determine which parties reach the Bundestag.
+
+    Parties with more than three Direktmandate come first, followed by the
+    parties that pass the 5% threshold, like in eligible_parties.
+
+    Input:
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen by party in Germany
+    direktmandate (np.ndarray): number of Direktmandate by party
+
+    Output:
+    eligible (np.ndarray): positions of the eligible parties
+
+    """
+
+    eligible_direktmandate = direktmandate > 3
+    eligible_huerde = zweitstimmen_bundesgebiet / zweitstimmen_bundesgebiet.sum() > 0.05
+
+    eligible = np.concatenate(
+        [
+            np.flatnonzero(eligible_direktmandate),
+            np.flatnonzero(eligible_huerde & ~eligible_direktmandate),
+        ]
+    )
+
+    return eligible
+
+
+def listenplätze_arrays(zweitstimmen_eligible, initial_seats):
+    """Allocate the Sitzkontingent of each Bundesland to the eligible parties.
+
+    Input:
+    zweitstimmen_eligible (np.ndarray): Zweitstimmen by eligible party and
+        Bundesland
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland
+
+    Output:
+    listenplätze (np.ndarray): seats by eligible party and Bundesland
+
+    """
+
+    listenplätze = np.zeros(zweitstimmen_eligible.shape, dtype=np.int64)
+    for land in range(zweitstimmen_eligible.shape[1]):
+        listenplätze[:, land], _ = sainte_lague_divisor(
+            zweitstimmen_eligible[:, land], initial_seats[land]
+        )
+
+    return listenplätze
+
+
+def seats_rounded_arrays(zweitstimmen_bundesgebiet_eligible, mindestsitzzahl):
+    """Determine the seats of each party in the Bundestag (definite size of the
+    Bundestag including Ausgleichsmandate).
+
+    Input:
+    zweitstimmen_bundesgebiet_eligible (np.ndarray): Zweitstimmen by eligible party
+    mindestsitzzahl (np.ndarray): Mindestsitzzahl by eligible party and Bundesland
+
+    Output:
+    seats_rounded (np.ndarray): seats by eligible party
+
+    """
+
+    with np.errstate(divide="ignore"):
+        min_divisor = (
+            zweitstimmen_bundesgebiet_eligible / mindestsitzzahl.sum(axis=1)
+        ).min()
+    seats_rounded = np.rint(zweitstimmen_bundesgebiet_eligible / min_divisor)
+
+    return seats_rounded
+
+
+def bundestagssitze_arrays(
+    zweitstimmen_eligible, seats_rounded, direktmandate_eligible
+):
+    """Distribute the seats of each party to its Landeslisten.
+
+    Input:
+    zweitstimmen_eligible (np.ndarray): Zweitstimmen by eligible party and
+        Bundesland
+    seats_rounded (np.ndarray): seats by eligible party
+    direktmandate_eligible (np.ndarray): Direktmandate by eligible party and
+        Bundesland
+
+    Output:
+    bundestagssitze (np.ndarray): seats by eligible party and Bundesland
+
+    """
+
+    bundestagssitze = np.zeros(zweitstimmen_eligible.shape, dtype=np.int64)
+    for partei in range(len(seats_rounded)):
+        bundestagssitze[partei], _ = sainte_lague_divisor(
+            zweitstimmen_eligible[partei],
+            seats_rounded[partei],
+            min_seats=direktmandate_eligible[partei],
+        )
+
+    return bundestagssitze
+
+
+def bundestagswahl_2013_2017_core(
+    erststimmen,
+    zweitstimmen_bundesland,
+    zweitstimmen_bundesgebiet,
+    wahlkreis_land,
+    initial_seats,
+):
+    """Calculate the seats of the Bundestag 2013 and 2017 on arrays.
+
+    Input:
+    erststimmen (np.ndarray): Erststimmen by party and Wahlkreis
+    zweitstimmen_bundesland (np.ndarray): Zweitstimmen by party and Bundesland
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen by party in Germany
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland
+
+    Output:
+    results (dict): "eligible" positions of the eligible parties, all other
+        entries are indexed eligible parties × Bundesländer ("direktmandate",
+        "listenplätze", "mindestsitzzahl", "bundestagssitze", "überhang",
+        "ausgleich") or eligible parties ("seats_rounded")
+
+    """
+
+    n_länder = zweitstimmen_bundesland.shape[1]
+
+    # * Calculate Direktmandate.
+    _, direktmandate_bundesland = direktmandate_arrays(
+        erststimmen, wahlkreis_land, n_länder
+    )
+
+    # * Determine parties that are eligible.
+    eligible = eligible_parties_arrays(
+        zweitstimmen_bundesgebiet, direktmandate_bundesland.sum(axis=1)
+    )
+    zweitstimmen_eligible = zweitstimmen_bundesland[eligible]
+    direktmandate_eligible = direktmandate_bundesland[eligible]
+
+    # * Calculation of Listenplätze (first round: on Bundesländer level)
+    listenplätze = listenplätze_arrays(zweitstimmen_eligible, initial_seats)
+
+    # * Calculate number of seats before Ausgleichsmandate
+    mindestsitzzahl = np.maximum(listenplätze, direktmandate_eligible)
+
+    # * Number of Ausgleichsmandate (definite size of Bundestag)
+    seats_rounded = seats_rounded_arrays(
+        zweitstimmen_bundesgebiet[eligible], mindestsitzzahl
+    )
+
+    # * Redistribution of additional seats to Länder
+    bundestagssitze = bundestagssitze_arrays(
+        zweitstimmen_eligible, seats_rounded, direktmandate_eligible
+    )
+
+    # * Determine number of Ausgleichs- und Überhangmandate by party and Bundesland
+    results = {
+        "eligible": eligible,
+        "direktmandate": direktmandate_eligible,
+        "listenplätze": listenplätze,
+        "mindestsitzzahl": mindestsitzzahl,
+        "seats_rounded": seats_rounded,
+        "bundestagssitze": bundestagssitze,
+        "überhang": np.maximum(0, direktmandate_eligible - listenplätze),
+        "ausgleich": bundestagssitze - mindestsitzzahl,
+    }
+
+    return results
+
+
+def bundestagswahl_2013_2017_arrays(
+    erststimmen,
+    zweitstimmen_bundesland,
+    zweitstimmen_bundesgebiet,
+    bundesländer_wahlkreise,
+    initial_seats_by_state,
+):
+    """Calculate results for bundestagswahl 2013 and 2017 on arrays.
+
+    Takes the same input and returns the same output as bundestagswahl_2013_2017
+    in functions_law.
+
+    Input:
+    erststimmen (pd.DataFrame): Erststimmen by party (row) and Wahlkreis (column)
+    zweitstimmen_bundesland (pd.DataFrame): Zweitstimmen by party and Bundesland
+    zweitstimmen_bundesgebiet (pd.DataFrame): Zweitstimmen by party in Germany
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list
+        with all of the Wahlkreise in this Bundesland
+    initial_seats_by_state (pd.Series): Sitzkontingent of each Bundesland
+
+    Output:
+    bundestagssitze_bundesland (pd.DataFrame): seats by Bundesland and party
+    ausgleich_and_überhang (pd.DataFrame): seats, Überhang- and Ausgleichsmandate
+        by Bundesland and party
+    possible_coalition (pd.DataFrame): majorities of the usual coalitions
+
+    """
+
+    arrays = election_arrays(
+        erststimmen,
+        zweitstimmen_bundesland,
+        zweitstimmen_bundesgebiet,
+        bundesländer_wahlkreise,
+        initial_seats_by_state,
+    )
+    results = bundestagswahl_2013_2017_core(
+        arrays["erststimmen"],
+        arrays["zweitstimmen_bundesland"],
+        arrays["zweitstimmen_bundesgebiet"],
+        arrays["wahlkreis_land"],
+        arrays["initial_seats"],
+    )
+
+    return label_results(results, arrays)
+
+
+def label_results(results, arrays):
+    """Attach labels to the results of bundestagswahl_2013_2017_core.
+
+    Input:
+    results (dict): output of bundestagswahl_2013_2017_core
+    arrays (dict): output of election_arrays
+
+    Output:
+    bundestagssitze_bundesland (pd.DataFrame): seats by Bundesland and party
+    ausgleich_and_überhang (pd.DataFrame): seats, Überhang- and Ausgleichsmandate
+        by Bundesland and party
+    possible_coalition (pd.DataFrame): majorities of the usual coalitions
+
+    """
+
+    eligible = [arrays["parteien"][partei] for partei in results["eligible"]]
+    bundesländer = arrays["bundesländer"]
+
+    bundestagssitze_bundesland = pd.DataFrame(
+        results["bundestagssitze"].T,
+        index=bundesländer,
+        columns=pd.Index(eligible, name="Partei"),
+    )
+
+    ausgleich_and_überhang = pd.DataFrame(
+        np.stack(
+            [results["bundestagssitze"], results["überhang"], results["ausgleich"]],
+            axis=-1,
+        )
+        .transpose(1, 0, 2)
+        .reshape(len(bundesländer), -1),
+        index=bundesländer,
+        columns=pd.MultiIndex.from_product(
+            [eligible, ["Sum", "Überhang", "Ausgleich"]]
+        ),
+    )
+
+    possible_coalition = possible_coalitions(
+        pd.Series(results["bundestagssitze"].sum(axis=1), index=eligible)
+    )
+
+    return bundestagssitze_bundesland, ausgleich_and_überhang, possible_coalition
+
+
+def sainte_lague_batch_report(
+    votes, available_seats, min_seats=None, max_iterations=None
+):
+    """Sainte-Lague procedure for many allocations at once.
+
+    Every allocation along the leading axes is solved in parallel: all rows start
+    from the rounded seats at their preliminary divisor and the rows that still
+    miss their seat total get (or lose) one seat per pass at their highest
+    (lowest) Hoechstzahl, like in sainte_lague_divisor.
+
+    Input:
+    votes (np.ndarray): votes with the entities (e.g. parties) on the last axis
+    available_seats (np.ndarray): number of seats to be allocated in each row
+    min_seats (np.ndarray): seats every entity gets at least, defaults to zero
+    max_iterations (int): seats that may be handed out or taken away one by one
+        in a row, defaults to DIVISOR_LIMITS["max_iterations"] of
+        functions_instrumentation
+
+    Output:
+    report (dict): "seats" with the same shape as votes and by row the
+        Zuteilungsdivisor "divisor" (NaN where a tie between Hoechstzahlen has
+        to be decided by lot), "iterations" and "converged" (False for a tie)
+
+    """
+
+    votes = np.asarray(votes, dtype=np.float64)
+    batch_shape = votes.shape[:-1]
+    n_entities = votes.shape[-1]
+    votes = votes.reshape(-1, n_entities)
+    available_seats = np.broadcast_to(available_seats, batch_shape).reshape(-1)
+    available_seats = available_seats.astype(np.int64)
+    if min_seats is None:
+        min_seats = np.zeros(votes.shape, dtype=np.int64)
+    else:
+        min_seats = np.broadcast_to(min_seats, batch_shape + (n_entities,))
+        min_seats = min_seats.reshape(-1, n_entities).astype(np.int64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        preliminary_divisor = votes.sum(axis=1) / available_seats
+    preliminary_divisor[
+        ~((preliminary_divisor > 0) & np.isfinite(preliminary_divisor))
+    ] = 1.0
+
+    allocated_seats = np.rint(votes / preliminary_divisor[:, None]).astype(np.int64)
+    allocated_seats = np.maximum(allocated_seats, min_seats)
+    difference = available_seats - allocated_seats.sum(axis=1)
+    iterations = np.abs(difference)
+    check_iterations(iterations.max(initial=0), max_iterations)
+
+    if BACKEND["enabled"]:
+        count_iterations(difference.max(initial=0) - difference.min(initial=0))
+        check_status(step_seats_batch(votes, allocated_seats, min_seats, difference))
+    else:
+        # Entfallen zu wenig Sitze, erhält die höchste nächste Höchstzahl einen Sitz.
+        rows = np.flatnonzero(difference > 0)
+        while len(rows) > 0:
+            hoechstzahlen = votes[rows] / (allocated_seats[rows] + 0.5)
+            winner = hoechstzahlen.argmax(axis=1)
+            if (hoechstzahlen[np.arange(len(rows)), winner] <= 0).any():
+                raise ValueError("No votes left to allocate the remaining seats.")
+            allocated_seats[rows, winner] += 1
+            difference[rows] -= 1
+            rows = rows[difference[rows] > 0]
+            count_iterations(1)
+
+        # Entfallen zu viele Sitze, verliert die niedrigste Höchstzahl ihren Sitz.
+        rows = np.flatnonzero(difference < 0)
+        while len(rows) > 0:
+            with np.errstate(divide="ignore"):
+                hoechstzahlen = np.where(
+                    allocated_seats[rows] > min_seats[rows],
+                    votes[rows] / (allocated_seats[rows] - 0.5),
+                    np.inf,
+                )
+            loser = hoechstzahlen.argmin(axis=1)
+            if np.isinf(hoechstzahlen[np.arange(len(rows)), loser]).any():
+                raise ValueError(
+                    "Minimum seats exceed the number of seats to be allocated."
+                )
+            allocated_seats[rows, loser] -= 1
+            difference[rows] += 1
+            rows = rows[difference[rows] < 0]
+            count_iterations(1)
+
+    # Every divisor strictly between the highest Hoechstzahl without a seat and
+    # the lowest Hoechstzahl with a seat reproduces the allocation.
+    with np.errstate(divide="ignore"):
+        upper = np.where(
+            allocated_seats > min_seats, votes / (allocated_seats - 0.5), np.inf
+        ).min(axis=1)
+    lower = (votes / (allocated_seats + 0.5)).max(axis=1)
+    divisor = np.where(
+        np.isfinite(upper),
+        (lower + upper) / 2,
+        np.where(lower > 0, 2 * lower, preliminary_divisor),
+    )
+    converged = lower < upper
+    divisor[~converged] = np.nan
+    record_divisor(
+        len(votes), iterations.sum(), iterations.max(initial=0), (~converged).sum()
+    )
+
+    report = {
+        "seats": allocated_seats.reshape(batch_shape + (n_entities,)),
+        "divisor": divisor.reshape(batch_shape),
+        "iterations": iterations.reshape(batch_shape),
+        "converged": converged.reshape(batch_shape),
+    }
+
+    return report
+
+
+def sainte_lague_batch(votes, available_seats, min_seats=None, max_iterations=None):
+    """Sainte-Lague procedure for many allocations at once, see
+    sainte_lague_batch_report.
+
+    Input:
+    votes (np.ndarray): votes with the entities (e.g. parties) on the last axis
+    available_seats (np.ndarray): number of seats to be allocated in each row
+    min_seats (np.ndarray): seats every entity gets at least, defaults to zero
+    max_iterations (int): seats that may be handed out or taken away one by one
+        in a row
+
+    Output:
+    allocated_seats (np.ndarray): seats with the same shape as votes
+    divisor (np.ndarray): Zuteilungsdivisor of each row, NaN where a tie between
+        Hoechstzahlen has to be decided by lot
+
+    """
+
+    report = sainte_lague_batch_report(
+        votes, available_seats, min_seats, max_iterations
+    )
+
+    return report["seats"], report["divisor"]
+
+
+def direktmandate_batch(erststimmen, wahlkreis_land, n_länder):
+    """Determine the winner of each Wahlkreis and count the Direktmandate by
+    Bundesland for many scenarios at once.
+
+    A tie in a Wahlkreis goes to the first of the tied parties.
+
+    Input:
+    erststimmen (np.ndarray): Erststimmen, scenarios × parties × Wahlkreise, or
+        the sparse Erststimmen of functions_sparse
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    winner (np.ndarray): position of the winning party, scenarios × Wahlkreise
+    direktmandate (np.ndarray): Direktmandate, scenarios × parties × Bundesländer
+
+    """
+
+    if isinstance(erststimmen, dict):
+        return direktmandate_sparse(erststimmen, wahlkreis_land, n_länder)
+
+    n_scenarios, n_parteien, _ = erststimmen.shape
+    winner = erststimmen.argmax(axis=1)
+    direktmandate = np.bincount(
+        (
+            (np.arange(n_scenarios)[:, None] * n_parteien + winner) * n_länder
+            + wahlkreis_land
+        ).ravel(),
+        minlength=n_scenarios * n_parteien * n_länder,
+    ).reshape(n_scenarios, n_parteien, n_länder)
+
+    return winner, direktmandate
+
+
+def eligible_batch(zweitstimmen_bundesgebiet, direktmandate, grundmandate=3):
+    """Determine which parties reach the Bundestag for many scenarios at once.
+
+    Input:
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen, scenarios × parties
+    direktmandate (np.ndarray): number of Direktmandate, scenarios × parties
+    grundmandate (int): parties with more Direktmandate than this are eligible
+        below the 5% threshold, None disables the Grundmandatsklausel
+
+    Output:
+    eligible (np.ndarray): scenarios × parties
+
+    """
+
+    share = zweitstimmen_bundesgebiet / zweitstimmen_bundesgebiet.sum(
+        axis=1, keepdims=True
+    )
+    eligible = share > 0.05
+    if grundmandate is not None:
+        eligible = eligible | (direktmandate > grundmandate)
+
+    return eligible
+
+
+def bundestagswahl_2013_2017_batch(
+    erststimmen,
+    zweitstimmen_bundesland,
+    wahlkreis_land,
+    initial_seats,
+    zweitstimmen_bundesgebiet=None,
+):
+    """Calculate the seats of the Bundestag 2013 and 2017 for many scenarios at once.
+
+    All steps are broadcast over the leading scenario axis. Contrary to
+    bundestagswahl_2013_2017 a tie in a Wahlkreis goes to the first of the tied
+    parties instead of giving all of them a Direktmandat.
+
+    Input:
+    erststimmen (np.ndarray): Erststimmen, scenarios × parties × Wahlkreise, or
+        the sparse Erststimmen of functions_sparse
+    zweitstimmen_bundesland (np.ndarray): Zweitstimmen,
+        scenarios × parties × Bundesländer
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen, scenarios × parties,
+        defaults to the sum over the Bundesländer
+
+    Output:
+    results (dict): "eligible" scenarios × parties, "seats_rounded" scenarios ×
+        parties and "direktmandate", "listenplätze", "mindestsitzzahl",
+        "bundestagssitze", "überhang", "ausgleich" scenarios × parties ×
+        Bundesländer, all parties that are not eligible have zero seats
+
+    """
+
+    if not isinstance(erststimmen, dict):
+        erststimmen = np.asarray(erststimmen, dtype=np.float64)
+    zweitstimmen_bundesland = np.asarray(zweitstimmen_bundesland, dtype=np.float64)
+    n_länder = zweitstimmen_bundesland.shape[2]
+    if zweitstimmen_bundesgebiet is None:
+        zweitstimmen_bundesgebiet = zweitstimmen_bundesland.sum(axis=2)
+
+    # * Calculate Direktmandate.
+    with stage("direktmandate"):
+        _, direktmandate = direktmandate_batch(erststimmen, wahlkreis_land, n_länder)
+
+    # * Determine parties that are eligible.
+    with stage("eligible_parties"):
+        eligible = eligible_batch(zweitstimmen_bundesgebiet, direktmandate.sum(axis=2))
+        zweitstimmen_eligible = np.where(
+            eligible[:, :, None], zweitstimmen_bundesland, 0
+        )
+        direktmandate = np.where(eligible[:, :, None], direktmandate, 0)
+
+    # * Calculation of Listenplätze (first round: on Bundesländer level)
+    with stage("listenplätze"):
+        listenplätze, _ = sainte_lague_batch(
+            zweitstimmen_eligible.transpose(0, 2, 1), initial_seats
+        )
+        listenplätze = listenplätze.transpose(0, 2, 1)
+
+    # * Calculate number of seats before Ausgleichsmandate
+    with stage("mindestsitzzahl"):
+        mindestsitzzahl = np.maximum(listenplätze, direktmandate)
+
+    # * Number of Ausgleichsmandate (definite size of Bundestag)
+    with stage("divisor"):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            divisor = zweitstimmen_bundesgebiet / mindestsitzzahl.sum(axis=2)
+        min_divisor = np.where(eligible, divisor, np.inf).min(axis=1, keepdims=True)
+        seats_rounded = np.where(
+            eligible, np.rint(zweitstimmen_bundesgebiet / min_divisor), 0
+        ).astype(np.int64)
+
+    # * Redistribution of additional seats to Länder
+    with stage("bundestagssitze"):
+        bundestagssitze, _ = sainte_lague_batch(
+            zweitstimmen_eligible, seats_rounded, min_seats=direktmandate
+        )
+
+    # * Determine number of Ausgleichs- und Überhangmandate by party and Bundesland
+    with stage("ausgleich"):
+        results = {
+            "eligible": eligible,
+            "direktmandate": direktmandate,
+            "listenplätze": listenplätze,
+            "mindestsitzzahl": mindestsitzzahl,
+            "seats_rounded": seats_rounded,
+            "bundestagssitze": bundestagssitze,
+            "überhang": np.maximum(0, direktmandate - listenplätze),
+            "ausgleich": bundestagssitze - mindestsitzzahl,
+        }
+
+    return results
@@ -0,0 +1,153 @@
+"""Compiled assignment of the Wahlkreise to the Bundesländer.
+
+The mapping is built once from bundesländer_wahlkreise (or from the Bundesland
+code of each Wahlkreis) and holds the code of each Wahlkreis, the order that
+sorts the Wahlkreise by Bundesland and the offsets of the Bundesländer in this
+order (CSR). Every sum from Wahlkreise to Bundesländer is then one
+np.add.reduceat call, for a single election as well as for a batch of
+scenarios.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+def land_mapping(wahlkreis_land, n_länder):
+    """Compile the Bundesland code of each Wahlkreis.
+
+    Input:
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    mapping (dict): "wahlkreis_land", "n_länder", "order" of the Wahlkreise by
+        Bundesland, "offsets" of the Bundesländer in this order (n_länder + 1),
+        "counts" of the Wahlkreise by Bundesland and "sorted" (the Wahlkreise
+        already come by Bundesland)
+
+    """
+
+    wahlkreis_land = np.asarray(wahlkreis_land, dtype=np.int64)
+    order = np.argsort(wahlkreis_land, kind="stable")
+    counts = np.bincount(wahlkreis_land, minlength=n_länder)
+    offsets = np.zeros(n_länder + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    mapping = {
+        "wahlkreis_land": wahlkreis_land,
+        "n_länder": n_länder,
+        "order": order,
+        "offsets": offsets,
+        "counts": counts,
+        "sorted": bool((order == np.arange(len(order))).all()),
+    }
+
+    return mapping
+
+
+def wahlkreis_mapping(bundesländer_wahlkreise, bundesländer=None):
+    """Compile bundesländer_wahlkreise.
+
+    Input:
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list
+        with all of the Wahlkreise in this Bundesland
+    bundesländer (list): order of the Bundesländer codes, defaults to the order
+        of bundesländer_wahlkreise
+
+    Output:
+    mapping (dict): output of land_mapping with the labels "bundesländer" and
+        "wahlkreise" (all Wahlkreise in the order of bundesländer_wahlkreise)
+
+    """
+
+    if bundesländer is None:
+        bundesländer = list(bundesländer_wahlkreise.keys())
+    code = {bundesland: position for position, bundesland in enumerate(bundesländer)}
+
+    wahlkreise = [
+        wahlkreis
+        for bundesland in bundesländer_wahlkreise
+        for wahlkreis in bundesländer_wahlkreise[bundesland]
+    ]
+    wahlkreis_land = np.repeat(
+        [code[bundesland] for bundesland in bundesländer_wahlkreise],
+        [len(wahlkreise) for wahlkreise in bundesländer_wahlkreise.values()],
+    )
+
+    mapping = land_mapping(wahlkreis_land, len(bundesländer))
+    mapping["bundesländer"] = list(bundesländer)
+    mapping["wahlkreise"] = wahlkreise
+
+    return mapping
+
+
+def land_codes(mapping, wahlkreise):
+    """Look up the Bundesland code of some Wahlkreise.
+
+    Input:
+    mapping (dict): output of wahlkreis_mapping
+    wahlkreise (list): Wahlkreise in any order
+
+    Output:
+    wahlkreis_land (np.ndarray): Bundesland code of each of the Wahlkreise
+
+    """
+
+    position = pd.Index(mapping["wahlkreise"]).get_indexer(wahlkreise)
+    if (position < 0).any():
+        raise ValueError(
+            f"Unknown Wahlkreis {list(np.asarray(wahlkreise)[position < 0])[:3]}."
+        )
+
+    return mapping["wahlkreis_land"][position]
+
+
+def sum_by_land(values, mapping):
+    """Sum values by Bundesland.
+
+    Input:
+    values (np.ndarray): values with the Wahlkreise on the last axis, in the
+        order of mapping["wahlkreis_land"]
+    mapping (dict): output of land_mapping or wahlkreis_mapping
+
+    Output:
+    sums (np.ndarray): same shape as values with the Bundesländer on the last
+        axis, same dtype
+
+    """
+
+    values = np.asarray(values)
+    if not mapping["sorted"]:
+        values = values[..., mapping["order"]]
+
+    filled = mapping["counts"] > 0
+    sums = np.zeros(values.shape[:-1] + (mapping["n_länder"],), dtype=values.dtype)
+    if filled.any():
+        # Bundesländer without Wahlkreise have no segment, so the segments of the
+        # others follow each other without gaps.
+        sums[..., filled] = np.add.reduceat(
+            values, mapping["offsets"][:-1][filled], axis=-1
+        )
+
+    return sums
+
+
+def sum_by_land_frame(data, mapping):
+    """Sum the columns of the Wahlkreise by Bundesland.
+
+    Input:
+    data (pd.DataFrame): values by row (e.g. party) and Wahlkreis (column)
+    mapping (dict): output of wahlkreis_mapping
+
+    Output:
+    sums (pd.DataFrame): values by row and Bundesland
+
+    """
+
+    sums = pd.DataFrame(
+        sum_by_land(data[mapping["wahlkreise"]].to_numpy(), mapping),
+        index=data.index,
+        columns=mapping["bundesländer"],
+    )
+
+    return sums
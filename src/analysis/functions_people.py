@@ -1,14 +1,17 @@
 """ Implementation of allocation of seats for each Landesliste. 
 """
+import numpy as np
+import pandas as pd
+
 
 def prepare_lists(listen_by_party_and_bundesland):
-    """ This function quickly prepares the dictionary by including
+    """This function quickly prepares the dictionary by including
     in each dataframe a column Sitz_Bundestag.
 
     Input:
     listen_by_party_and_bundesland (dict): contains for each Bundesland
         a dictionary containing parties with their lists
-    
+
     Output:
     listen_by_party_and_bundesland (dict): same as input only that
         a column Sitz_Bundestag is added
@@ -17,12 +20,14 @@ def prepare_lists(listen_by_party_and_bundesland):
     for bundesland in listen_by_party_and_bundesland.keys():
         for partei in listen_by_party_and_bundesland[bundesland].keys():
             listen_by_party_and_bundesland[bundesland][partei]["Sitz_Bundestag"] = 0
-    
+
     return listen_by_party_and_bundesland
 
 
-def mark_direktmandate(listen_by_party_and_bundesland, bundesländer_wahlkreise, direktmandate):
-    """ This function marks the people who have won a Direktmandat by 
+def mark_direktmandate(
+    listen_by_party_and_bundesland, bundesländer_wahlkreise, direktmandate, index=None
+):
+    """This function marks the people who have won a Direktmandat by
     putting a 1 into the column Sitz_Bundestag.
 
     Input:
@@ -32,6 +37,7 @@ def mark_direktmandate(listen_by_party_and_bundesland, bundesländer_wahlkreise,
     bundesländer_wahlkreise (dict): contains the for each Bundesland a list
         with all of the Wahlkreise in this Bundesland
     direktmandate (pd.DataFrame): indicates which party one in each Wahlkreis
+    index (dict): output of direktkandidaten_index, built from the lists if None
 
     Output:
     listen_by_party_and_bundesland (dict): same as input only that
@@ -39,18 +45,31 @@ def mark_direktmandate(listen_by_party_and_bundesland, bundesländer_wahlkreise,
 
     """
 
-    for bundesland in bundesländer_wahlkreise.keys():
-        parteilisten = listen_by_party_and_bundesland[bundesland].copy()
-        for wahlkreis in bundesländer_wahlkreise[bundesland]:
-            won_by_party = direktmandate[direktmandate[wahlkreis] == 1].index[0]
-            parteilisten[won_by_party].loc[parteilisten[won_by_party]["Wahlkreis_Bez"] == wahlkreis, "Sitz_Bundestag"] = 1
-        listen_by_party_and_bundesland[bundesland] = parteilisten
+    if index is None:
+        index = direktkandidaten_index(listen_by_party_and_bundesland)
+
+    wahlkreise = [
+        wahlkreis
+        for bundesland in bundesländer_wahlkreise.keys()
+        for wahlkreis in bundesländer_wahlkreise[bundesland]
+    ]
+    rows = direktmandat_rows(index, direktmandate[wahlkreise])
+    gruppe = index["gruppe"][rows]
+
+    for code in np.unique(gruppe):
+        bundesland, partei = index["gruppen"][code]
+        if partei not in listen_by_party_and_bundesland[bundesland]:
+            continue
+        liste = listen_by_party_and_bundesland[bundesland][partei]
+        sitz = liste["Sitz_Bundestag"].to_numpy().copy()
+        sitz[index["position"][rows[gruppe == code]]] = 1
+        liste["Sitz_Bundestag"] = sitz
 
     return listen_by_party_and_bundesland
 
 
 def keep_eligible_parties(listen_by_party_and_bundesland, eligible_parties):
-    """ This function shrinks the dictionary listen_by_party_and_bundesland
+    """This function shrinks the dictionary listen_by_party_and_bundesland
     to the eligible parties.
 
     Input:
@@ -75,20 +94,20 @@ def keep_eligible_parties(listen_by_party_and_bundesland, eligible_parties):
         listen_by_party_and_bundesland[bundesland] = parteilisten
 
     return listen_by_party_and_bundesland
-  
+
 
 def allocate_listenplaetze(
-listen_by_party_and_bundesland, 
-bundesländer,
-eligible_parties,
-available_list_seats,
+    listen_by_party_and_bundesland,
+    bundesländer,
+    eligible_parties,
+    available_list_seats,
 ):
-    """ This function shrinks the dictionary listen_by_party_and_bundesland
-    to the eligible parties.
+    """This function marks the list candidates who get a seat. In each list the
+    first candidates without Direktmandat get the available list seats.
 
     Input:
     listen_by_party_and_bundesland (dict): contains for each Bundesland
-        a dictionary containing the eligible parties with their lists 
+        a dictionary containing the eligible parties with their lists
         and a column Sitz_Bundestag which is already marked for Direktmandate
     bundesländer (list): contains all Bundesländer
     eligible_parties (list): all parties eligible for the Bundestag
@@ -97,38 +116,64 @@ available_list_seats,
 
     Output:
     listen_by_party_and_bundesland (dict): same as input but now with Sitz_Bundestag
-        marked also for the list candidates 
+        marked also for the list candidates
 
     """
 
-    for bundesland in bundesländer:
-        parteilisten = listen_by_party_and_bundesland[bundesland].copy()
-        for partei in eligible_parties:
-            if available_list_seats.loc[partei, bundesland] > 0:
-                to_replace = parteilisten[partei].loc[parteilisten[partei]["Sitz_Bundestag"] == 0].copy()
-                to_replace["Sitz_Bundestag"].iloc[:(available_list_seats.loc[partei, bundesland])] = 1
-                parteilisten[partei].loc[parteilisten[partei]["Sitz_Bundestag"] == 0] = to_replace
-            else:
-                pass
-        listen_by_party_and_bundesland[bundesland] = parteilisten
+    gruppen = [
+        (bundesland, partei)
+        for bundesland in bundesländer
+        for partei in eligible_parties
+        if partei in listen_by_party_and_bundesland[bundesland]
+    ]
+    listen = [
+        listen_by_party_and_bundesland[bundesland][partei]
+        for bundesland, partei in gruppen
+    ]
+    sizes = [len(liste) for liste in listen]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    quota = available_list_seats.stack().reindex(
+        pd.MultiIndex.from_tuples(gruppen).swaplevel()
+    )
+    quota = quota.fillna(0).to_numpy(dtype=np.int64)
+
+    # * Tag all candidates in one pass: the i-th candidate without seat of a
+    # * list gets a seat if i is less than the quota of the list.
+    bewerber = pd.DataFrame(
+        {
+            "gruppe": np.repeat(np.arange(len(gruppen)), sizes),
+            "Sitz_Bundestag": np.concatenate(
+                [liste["Sitz_Bundestag"].to_numpy() for liste in listen]
+            ),
+        }
+    )
+    ohne_sitz = bewerber[bewerber["Sitz_Bundestag"] == 0]
+    rang = ohne_sitz.groupby("gruppe").cumcount().to_numpy()
+    gewählt = ohne_sitz.index[rang < quota[ohne_sitz["gruppe"].to_numpy()]]
+    bewerber.loc[gewählt, "Sitz_Bundestag"] = 1
+
+    sitz = bewerber["Sitz_Bundestag"].to_numpy()
+    for gruppe, liste in enumerate(listen):
+        liste["Sitz_Bundestag"] = sitz[offsets[gruppe] : offsets[gruppe + 1]]
 
     return listen_by_party_and_bundesland
 
 
 def tag_bundestagsabgeordnete(
-listen_by_party_and_bundesland,
-bundesländer_wahlkreise,
-direktmandate,
-eligible_parties,
-bundesländer,
-available_list_seats,
+    listen_by_party_and_bundesland,
+    bundesländer_wahlkreise,
+    direktmandate,
+    eligible_parties,
+    bundesländer,
+    available_list_seats,
 ):
-    """ This function tags all people who have eventually become
+    """This function tags all people who have eventually become
     a member of the Bundestag.
 
     Input:
     listen_by_party_and_bundesland (dict): contains for each Bundesland
-        a dictionary containing the eligible parties with their lists 
+        a dictionary containing the eligible parties with their lists
         and a column Sitz_Bundestag which is already marked for Direktmandate
     bundesländer_wahlkreise (dict): contains the for each Bundesland a list
         with all of the Wahlkreise in this Bundesland
@@ -140,12 +185,12 @@ available_list_seats,
 
     Output:
     listen_by_party_and_bundesland (dict): same as input but now with Sitz_Bundestag
-        marked also for the list candidates 
+        marked also for the list candidates
 
     """
 
     listen_by_party_and_bundesland = keep_eligible_parties(
-        listen_by_party_and_bundesland, 
+        listen_by_party_and_bundesland,
         eligible_parties,
     )
 
@@ -165,4 +210,276 @@ available_list_seats,
     )
 
     return listen_by_party_and_bundesland
-  
\ No newline at end of file
+
+
+def candidate_table(listen_by_party_and_bundesland):
+    """Store all Bewerber in one table with the lists as contiguous groups.
+
+    The rows of each list (Bundesland, party) are consecutive and sorted by
+    Liste_Platz as in listen_by_party_and_bundesland, hence the candidates of
+    group g are the rows offsets[g] to offsets[g + 1].
+
+    Input:
+    listen_by_party_and_bundesland (dict): contains for each Bundesland
+        a dictionary containing parties with their lists
+
+    Output:
+    table (dict): "bewerber" (pd.DataFrame) all candidates with the additional
+        columns Bundesland and Partei, "gruppen" (pd.MultiIndex) the lists,
+        "offsets" (np.ndarray) first row of each list, "gruppe" (np.ndarray) list
+        of each row and "direktkandidaten" the index of the candidates by
+        Wahlkreis and party (output of direktkandidaten)
+
+    """
+
+    gruppen = [
+        (bundesland, partei)
+        for bundesland in listen_by_party_and_bundesland.keys()
+        for partei in listen_by_party_and_bundesland[bundesland].keys()
+    ]
+    listen = [
+        listen_by_party_and_bundesland[bundesland][partei]
+        for bundesland, partei in gruppen
+    ]
+    sizes = np.array([len(liste) for liste in listen], dtype=np.int64)
+
+    bewerber = pd.concat(listen, ignore_index=True)
+    gruppe = np.repeat(np.arange(len(gruppen)), sizes)
+    gruppen = pd.MultiIndex.from_tuples(gruppen, names=["Bundesland", "Partei"])
+    bewerber["Bundesland"] = gruppen.get_level_values(0)[gruppe]
+    bewerber["Partei"] = gruppen.get_level_values(1)[gruppe]
+
+    table = {
+        "bewerber": bewerber,
+        "gruppen": gruppen,
+        "offsets": np.concatenate([[0], np.cumsum(sizes)]),
+        "gruppe": gruppe,
+        "direktkandidaten": direktkandidaten(
+            bewerber["Wahlkreis_Bez"], bewerber["Partei"]
+        ),
+    }
+
+    return table
+
+
+def group_quota(table, seats):
+    """Look up a number for each list of the candidate table.
+
+    Input:
+    table (dict): output of candidate_table
+    seats (pd.DataFrame): number for each party (row) and Bundesland (column)
+
+    Output:
+    quota (np.ndarray): number of each list, 0 if party or Bundesland is
+        missing in seats
+
+    """
+
+    seats = seats.stack()
+    quota = seats.reindex(table["gruppen"].swaplevel()).fillna(0)
+
+    return quota.to_numpy(dtype=np.int64)
+
+
+def direktkandidaten(wahlkreise_bez, parteien_bez):
+    """Build the index of the candidates by Wahlkreis and party.
+
+    Input:
+    wahlkreise_bez (pd.Series): Wahlkreis of each candidate, missing for
+        candidates only on a list
+    parteien_bez (pd.Series): party of each candidate
+
+    Output:
+    index (dict): "wahlkreise" and "parteien" (pd.Index) the labels and "rows"
+        (np.ndarray) parties × Wahlkreise the position of the candidate in the
+        input, -1 if the party has no candidate in the Wahlkreis
+
+    """
+
+    wahlkreis_codes, wahlkreise = pd.factorize(wahlkreise_bez)
+    partei_codes, parteien = pd.factorize(parteien_bez)
+
+    direct = np.flatnonzero(wahlkreis_codes >= 0)
+    rows = np.full((len(parteien), len(wahlkreise)), -1, dtype=np.int64)
+    rows[partei_codes[direct], wahlkreis_codes[direct]] = direct
+
+    index = {
+        "wahlkreise": pd.Index(wahlkreise),
+        "parteien": pd.Index(parteien),
+        "rows": rows,
+    }
+
+    return index
+
+
+def direktkandidaten_index(listen_by_party_and_bundesland):
+    """Build the index of the candidates by Wahlkreis and party for the lists.
+
+    Input:
+    listen_by_party_and_bundesland (dict): contains for each Bundesland
+        a dictionary containing parties with their lists
+
+    Output:
+    index (dict): output of direktkandidaten with the rows referring to the
+        lists, "gruppen" (list) Bundesland and party of each list, "gruppe" and
+        "position" (np.ndarray) list and position in the list of each row
+
+    """
+
+    gruppen = [
+        (bundesland, partei)
+        for bundesland in listen_by_party_and_bundesland.keys()
+        for partei in listen_by_party_and_bundesland[bundesland].keys()
+    ]
+    wahlkreise_bez = [
+        listen_by_party_and_bundesland[bundesland][partei]["Wahlkreis_Bez"]
+        for bundesland, partei in gruppen
+    ]
+    sizes = [len(wahlkreis_bez) for wahlkreis_bez in wahlkreise_bez]
+    gruppe = np.repeat(np.arange(len(gruppen)), sizes)
+
+    index = direktkandidaten(
+        np.concatenate([wahlkreis_bez.to_numpy() for wahlkreis_bez in wahlkreise_bez]),
+        np.array([partei for _, partei in gruppen], dtype=object)[gruppe],
+    )
+    index["gruppen"] = gruppen
+    index["gruppe"] = gruppe
+    index["position"] = np.concatenate([np.arange(size) for size in sizes])
+
+    return index
+
+
+def direktmandat_rows(index, direktmandate):
+    """Find the candidates who have won a Direktmandat.
+
+    Input:
+    index (dict): output of direktkandidaten
+    direktmandate (pd.DataFrame): indicates which party won in each Wahlkreis,
+        columns that are no Wahlkreis of the index are ignored
+
+    Output:
+    rows (np.ndarray): rows of the winners in the index
+
+    """
+
+    # All parties with the most Erststimmen in each Wahlkreis, so a tie marks
+    # every tied candidate like direktmandate does.
+    values = direktmandate.to_numpy()
+    winner, column = np.nonzero(values == values.max(axis=0))
+    partei = index["parteien"].get_indexer(direktmandate.index)[winner]
+    wahlkreis = index["wahlkreise"].get_indexer(direktmandate.columns)[column]
+
+    found = (partei >= 0) & (wahlkreis >= 0)
+    rows = index["rows"][partei[found], wahlkreis[found]]
+
+    return rows[rows >= 0]
+
+
+def mark_direktmandate_table(table, direktmandate, eligible_parties):
+    """Mark the candidates who have won a Direktmandat.
+
+    Input:
+    table (dict): output of candidate_table
+    direktmandate (pd.DataFrame): indicates which party won in each Wahlkreis
+    eligible_parties (list): all parties eligible for the Bundestag
+
+    Output:
+    sitz (np.ndarray): 1 for the winners of the Wahlkreise, else 0
+
+    """
+
+    rows = direktmandat_rows(table["direktkandidaten"], direktmandate)
+    rows = rows[table["bewerber"]["Partei"].iloc[rows].isin(eligible_parties)]
+
+    sitz = np.zeros(len(table["bewerber"]), dtype=np.int64)
+    sitz[rows] = 1
+
+    return sitz
+
+
+def allocate_listenplaetze_table(table, sitz, eligible_parties, available_list_seats):
+    """Fill the list seats of each list with the first candidates without seat.
+
+    Input:
+    table (dict): output of candidate_table
+    sitz (np.ndarray): 1 for candidates with a Direktmandat, else 0
+    eligible_parties (list): all parties eligible for the Bundestag
+    available_list_seats (pd.DataFrame): contains for each Bundesland (column)
+        the number of available list seats for each party (row)
+
+    Output:
+    sitz (np.ndarray): 1 for all candidates with a seat in the Bundestag
+
+    """
+
+    gruppe = table["gruppe"]
+    quota = group_quota(table, available_list_seats)
+    quota[~table["gruppen"].get_level_values(1).isin(eligible_parties)] = 0
+
+    # Position of each candidate among the candidates without seat of its list.
+    without_seat = sitz == 0
+    count = np.cumsum(without_seat)
+    before_group = np.concatenate([[0], count])[table["offsets"][:-1]]
+    rank = count - before_group[gruppe]
+
+    sitz = sitz.copy()
+    sitz[without_seat & (rank <= quota[gruppe])] = 1
+
+    return sitz
+
+
+def tag_bundestagsabgeordnete_table(
+    table, direktmandate, eligible_parties, available_list_seats
+):
+    """Tag all people who have eventually become a member of the Bundestag,
+    working on the candidate table.
+
+    Input:
+    table (dict): output of candidate_table
+    direktmandate (pd.DataFrame): indicates which party won in each Wahlkreis
+    eligible_parties (list): all parties eligible for the Bundestag
+    available_list_seats (pd.DataFrame): contains for each Bundesland (column)
+        the number of available list seats for each party (row)
+
+    Output:
+    sitz (np.ndarray): 1 for all candidates with a seat in the Bundestag, in
+        the order of table["bewerber"]
+
+    """
+
+    sitz = mark_direktmandate_table(table, direktmandate, eligible_parties)
+    sitz = allocate_listenplaetze_table(
+        table, sitz, eligible_parties, available_list_seats
+    )
+
+    return sitz
+
+
+def lists_from_table(table, sitz, eligible_parties):
+    """Split the candidate table into the lists of the eligible parties.
+
+    Input:
+    table (dict): output of candidate_table
+    sitz (np.ndarray): seat of each candidate
+    eligible_parties (list): all parties eligible for the Bundestag
+
+    Output:
+    listen_by_party_and_bundesland (dict): contains for each Bundesland
+        a dictionary containing the eligible parties with their lists and
+        the column Sitz_Bundestag, as tag_bundestagsabgeordnete
+
+    """
+
+    bewerber = table["bewerber"].drop(columns=["Bundesland", "Partei"])
+    bewerber["Sitz_Bundestag"] = sitz
+    offsets = table["offsets"]
+
+    listen_by_party_and_bundesland = {}
+    for gruppe, (bundesland, partei) in enumerate(table["gruppen"]):
+        listen = listen_by_party_and_bundesland.setdefault(bundesland, {})
+        if partei in eligible_parties:
+            listen[partei] = bewerber.iloc[
+                offsets[gruppe] : offsets[gruppe + 1]
+            ].reset_index(drop=True)
+
+    return listen_by_party_and_bundesland
@@ -0,0 +1,341 @@
+"""Seat allocation under the Bundeswahlgesetz 2013/2017 and its reforms of 2020
+and 2023 for many scenarios at once.
+
+Every law is an engine made of two functions: prepare derives everything that
+does not depend on the votes (the Bundesland of each Wahlkreis, the
+Sitzkontingente, the size of the Bundestag) once, compute evaluates scenarios ×
+parties × Wahlkreise arrays of votes against this state. All engines share the
+Sainte-Lague procedure sainte_lague_batch and the Direktmandate of
+direktmandate_batch in functions_law_arrays.
+
+The 2020 reform reduces the number of Wahlkreise to 280 from the election 2025
+on. The engines take the Wahlkreise from wahlkreis_land, so a division into 280
+Wahlkreise is evaluated by passing its votes and Bundesland codes.
+
+"""
+import numpy as np
+
+from src.analysis.functions_law_arrays import bundestagswahl_2013_2017_batch
+from src.analysis.functions_law_arrays import direktmandate_batch
+from src.analysis.functions_law_arrays import eligible_batch
+from src.analysis.functions_law_arrays import sainte_lague_batch
+from src.analysis.functions_sparse import row_reductions
+
+
+def prepare_2013_2017(wahlkreis_land, n_länder, initial_seats):
+    """Prepare the evaluation of the Bundeswahlgesetz 2013/2017.
+
+    Input:
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland
+
+    Output:
+    state (dict): "wahlkreis_land", "n_länder" and "initial_seats"
+
+    """
+
+    state = {
+        "wahlkreis_land": np.asarray(wahlkreis_land, dtype=np.int64),
+        "n_länder": n_länder,
+        "initial_seats": np.asarray(initial_seats, dtype=np.int64),
+    }
+
+    return state
+
+
+def compute_2013_2017(
+    state, erststimmen, zweitstimmen_bundesland, zweitstimmen_bundesgebiet=None
+):
+    """Calculate the seats under the Bundeswahlgesetz 2013/2017.
+
+    Input:
+    state (dict): output of prepare_2013_2017
+    erststimmen (np.ndarray): Erststimmen, scenarios × parties × Wahlkreise, or
+        the sparse Erststimmen of functions_sparse
+    zweitstimmen_bundesland (np.ndarray): Zweitstimmen,
+        scenarios × parties × Bundesländer
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen, scenarios × parties,
+        defaults to the sum over the Bundesländer
+
+    Output:
+    results (dict): output of bundestagswahl_2013_2017_batch
+
+    """
+
+    return bundestagswahl_2013_2017_batch(
+        erststimmen,
+        zweitstimmen_bundesland,
+        state["wahlkreis_land"],
+        state["initial_seats"],
+        zweitstimmen_bundesgebiet,
+    )
+
+
+def prepare_2020(wahlkreis_land, n_länder, initial_seats, unausgeglichen=3):
+    """Prepare the evaluation of the Bundeswahlgesetz 2020.
+
+    Input:
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland
+    unausgeglichen (int): number of Überhangmandate left without Ausgleich
+
+    Output:
+    state (dict): "wahlkreis_land", "n_länder", "initial_seats" and
+        "unausgeglichen"
+
+    """
+
+    state = prepare_2013_2017(wahlkreis_land, n_länder, initial_seats)
+    state["unausgeglichen"] = unausgeglichen
+
+    return state
+
+
+def compute_2020(
+    state, erststimmen, zweitstimmen_bundesland, zweitstimmen_bundesgebiet=None
+):
+    """Calculate the seats under the Bundeswahlgesetz 2020.
+
+    The Mindestsitzzahl of a party in a Bundesland is the higher of its
+    Direktmandate and the rounded up mean of its Direktmandate and the seats of
+    the first allocation to the Sitzkontingent. The Bundestag is enlarged until
+    every party gets its Mindestsitzzahl, except for up to three Überhangmandate
+    which are left without Ausgleich. The seats of each party are then allocated
+    to its Landeslisten, each of them gets at least its Direktmandate.
+
+    Input:
+    state (dict): output of prepare_2020
+    erststimmen (np.ndarray): Erststimmen, scenarios × parties × Wahlkreise, or
+        the sparse Erststimmen of functions_sparse
+    zweitstimmen_bundesland (np.ndarray): Zweitstimmen,
+        scenarios × parties × Bundesländer
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen, scenarios × parties,
+        defaults to the sum over the Bundesländer
+
+    Output:
+    results (dict): "eligible", "seats_rounded" and "unausgeglichen" scenarios ×
+        parties and "direktmandate", "listenplätze", "mindestsitzzahl",
+        "bundestagssitze", "überhang" scenarios × parties × Bundesländer, all
+        parties that are not eligible have zero seats
+
+    """
+
+    if not isinstance(erststimmen, dict):
+        erststimmen = np.asarray(erststimmen, dtype=np.float64)
+    zweitstimmen_bundesland = np.asarray(zweitstimmen_bundesland, dtype=np.float64)
+    if zweitstimmen_bundesgebiet is None:
+        zweitstimmen_bundesgebiet = zweitstimmen_bundesland.sum(axis=2)
+
+    # * Calculate Direktmandate.
+    _, direktmandate = direktmandate_batch(
+        erststimmen, state["wahlkreis_land"], state["n_länder"]
+    )
+
+    # * Determine parties that are eligible.
+    eligible = eligible_batch(zweitstimmen_bundesgebiet, direktmandate.sum(axis=2))
+    zweitstimmen_eligible = np.where(eligible[:, :, None], zweitstimmen_bundesland, 0)
+    zweitstimmen_bundesgebiet = np.where(eligible, zweitstimmen_bundesgebiet, 0)
+    direktmandate = np.where(eligible[:, :, None], direktmandate, 0)
+
+    # * Calculation of Listenplätze (first round: on Bundesländer level)
+    listenplätze, _ = sainte_lague_batch(
+        zweitstimmen_eligible.transpose(0, 2, 1), state["initial_seats"]
+    )
+    listenplätze = listenplätze.transpose(0, 2, 1)
+
+    # * Mindestsitzzahl: aufgerundeter Mittelwert, mindestens die Direktmandate.
+    mindestsitzzahl = np.maximum(direktmandate, (direktmandate + listenplätze + 1) // 2)
+    mindestsitze = mindestsitzzahl.sum(axis=2)
+
+    # * Size of the Bundestag
+    seats = size_with_unausgeglichen(
+        zweitstimmen_bundesgebiet,
+        mindestsitze,
+        state["initial_seats"].sum(),
+        state["unausgeglichen"],
+    )
+    seats_rounded = np.maximum(seats, mindestsitze)
+
+    # * Redistribution of the seats of each party to its Landeslisten
+    bundestagssitze, _ = sainte_lague_batch(
+        zweitstimmen_eligible, seats_rounded, min_seats=direktmandate
+    )
+
+    results = {
+        "eligible": eligible,
+        "direktmandate": direktmandate,
+        "listenplätze": listenplätze,
+        "mindestsitzzahl": mindestsitzzahl,
+        "seats_rounded": seats_rounded,
+        "unausgeglichen": seats_rounded - seats,
+        "bundestagssitze": bundestagssitze,
+        "überhang": np.maximum(0, direktmandate - listenplätze),
+    }
+
+    return results
+
+
+def size_with_unausgeglichen(zweitstimmen, mindestsitze, min_size, unausgeglichen):
+    """Find the smallest Bundestag in which the parties miss at most a given
+    number of seats of their Mindestsitzzahl.
+
+    Divisor methods are house monotone, so the missing seats do not increase
+    with the size and the size is found by bisection of all scenarios at once.
+    The upper bound is the size at which every party gets its Mindestsitzzahl.
+
+    Input:
+    zweitstimmen (np.ndarray): Zweitstimmen, scenarios × parties, zero for the
+        parties that are not eligible
+    mindestsitze (np.ndarray): Mindestsitzzahl, scenarios × parties
+    min_size (int): size of the Bundestag without Überhangmandate
+    unausgeglichen (int): number of seats the parties may miss in total
+
+    Output:
+    seats (np.ndarray): seats by party at the smallest size, scenarios × parties
+
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        divisor = np.where(
+            (mindestsitze > 0) & (zweitstimmen > 0), zweitstimmen / mindestsitze, np.inf
+        )
+    upper = np.rint(zweitstimmen / divisor.min(axis=1, keepdims=True)).sum(axis=1)
+    lower = np.full(len(zweitstimmen), min_size, dtype=np.int64)
+    upper = np.maximum(upper.astype(np.int64), lower)
+
+    while (lower < upper).any():
+        middle = (lower + upper) // 2
+        seats, _ = sainte_lague_batch(zweitstimmen, middle)
+        enough = np.maximum(0, mindestsitze - seats).sum(axis=1) <= unausgeglichen
+        upper = np.where(enough, middle, upper)
+        lower = np.where(enough, lower, middle + 1)
+
+    seats, _ = sainte_lague_batch(zweitstimmen, upper)
+
+    return seats
+
+
+def prepare_2023(wahlkreis_land, n_länder, initial_seats=None, size=630):
+    """Prepare the evaluation of the Bundeswahlgesetz 2023.
+
+    Input:
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+    initial_seats (np.ndarray): not used, the law has no Sitzkontingente
+    size (int): fixed size of the Bundestag
+
+    Output:
+    state (dict): "wahlkreis_land", "n_länder" and "size"
+
+    """
+
+    state = {
+        "wahlkreis_land": np.asarray(wahlkreis_land, dtype=np.int64),
+        "n_länder": n_länder,
+        "size": size,
+    }
+
+    return state
+
+
+def compute_2023(
+    state, erststimmen, zweitstimmen_bundesland, zweitstimmen_bundesgebiet=None
+):
+    """Calculate the seats under the Bundeswahlgesetz 2023 (Zweitstimmendeckung).
+
+    The fixed number of seats is allocated to the parties by their Zweitstimmen
+    and the seats of each party to its Landeslisten. In each Bundesland the
+    Wahlkreis winners of a party get a seat in the order of their share of the
+    Erststimmen as long as the seats of the Landesliste cover them, the other
+    Wahlkreise stay without Direktmandat. The Grundmandatsklausel is kept as
+    ordered by the Bundesverfassungsgericht in 2024.
+
+    Input:
+    state (dict): output of prepare_2023
+    erststimmen (np.ndarray): Erststimmen, scenarios × parties × Wahlkreise, or
+        the sparse Erststimmen of functions_sparse
+    zweitstimmen_bundesland (np.ndarray): Zweitstimmen,
+        scenarios × parties × Bundesländer
+    zweitstimmen_bundesgebiet (np.ndarray): Zweitstimmen, scenarios × parties,
+        defaults to the sum over the Bundesländer
+
+    Output:
+    results (dict): "eligible" and "seats_rounded" scenarios × parties,
+        "gedeckt" scenarios × Wahlkreise (True where the winner gets the seat) and
+        "direktmandate", "wahlkreissitze", "unbesetzt", "bundestagssitze",
+        "überhang", "ausgleich" scenarios × parties × Bundesländer, all parties
+        that are not eligible have zero seats
+
+    """
+
+    if not isinstance(erststimmen, dict):
+        erststimmen = np.asarray(erststimmen, dtype=np.float64)
+    zweitstimmen_bundesland = np.asarray(zweitstimmen_bundesland, dtype=np.float64)
+    if zweitstimmen_bundesgebiet is None:
+        zweitstimmen_bundesgebiet = zweitstimmen_bundesland.sum(axis=2)
+    n_scenarios, n_parteien, _ = zweitstimmen_bundesland.shape
+    n_länder = state["n_länder"]
+
+    # * Calculate Direktmandate.
+    winner, direktmandate = direktmandate_batch(
+        erststimmen, state["wahlkreis_land"], n_länder
+    )
+
+    # * Determine parties that are eligible.
+    eligible = eligible_batch(zweitstimmen_bundesgebiet, direktmandate.sum(axis=2))
+    zweitstimmen_eligible = np.where(eligible[:, :, None], zweitstimmen_bundesland, 0)
+    direktmandate = np.where(eligible[:, :, None], direktmandate, 0)
+
+    # * Oberverteilung and Unterverteilung of the fixed number of seats
+    seats_rounded, _ = sainte_lague_batch(
+        np.where(eligible, zweitstimmen_bundesgebiet, 0), state["size"]
+    )
+    bundestagssitze, _ = sainte_lague_batch(zweitstimmen_eligible, seats_rounded)
+
+    # * Zweitstimmendeckung: rank the winners of each Landesliste by their share.
+    if isinstance(erststimmen, dict):
+        _, maximum, total = row_reductions(erststimmen)
+    else:
+        maximum, total = erststimmen.max(axis=1), erststimmen.sum(axis=1)
+    with np.errstate(invalid="ignore"):
+        share = np.nan_to_num(maximum / total)
+    liste = (
+        (np.arange(n_scenarios)[:, None] * n_parteien + winner) * n_länder
+        + state["wahlkreis_land"]
+    ).ravel()
+    order = np.lexsort((-share.ravel(), liste))
+    first = np.searchsorted(liste[order], liste[order])
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - first
+    gedeckt = (rank < bundestagssitze.ravel()[liste]).reshape(n_scenarios, -1)
+
+    wahlkreissitze = np.bincount(
+        liste[gedeckt.ravel()], minlength=n_scenarios * n_parteien * n_länder
+    ).reshape(n_scenarios, n_parteien, n_länder)
+
+    results = {
+        "eligible": eligible,
+        "direktmandate": direktmandate,
+        "wahlkreissitze": wahlkreissitze,
+        "unbesetzt": direktmandate - wahlkreissitze,
+        "gedeckt": gedeckt,
+        "seats_rounded": seats_rounded,
+        "bundestagssitze": bundestagssitze,
+        "überhang": np.zeros_like(bundestagssitze),
+        "ausgleich": np.zeros_like(bundestagssitze),
+    }
+
+    return results
+
+
+# Laws by name, every engine consists of prepare(wahlkreis_land, n_länder,
+# initial_seats) returning a state and compute(state, erststimmen,
+# zweitstimmen_bundesland, zweitstimmen_bundesgebiet=None) returning at least
+# "eligible", "seats_rounded", "direktmandate", "bundestagssitze" and "überhang".
+ENGINES = {
+    "2013_2017": {"prepare": prepare_2013_2017, "compute": compute_2013_2017},
+    "2020": {"prepare": prepare_2020, "compute": compute_2020},
+    "2023": {"prepare": prepare_2023, "compute": compute_2023},
+}
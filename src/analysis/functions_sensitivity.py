@@ -0,0 +1,419 @@
+"""Sensitivity of the seat allocation for the Bundestagswahl 2013 and 2017 to
+changes in single Wahlkreise.
+
+A baseline state caches all intermediate results of bundestagswahl_2013_2017_core.
+A change of the Erststimmen in one Wahlkreis only affects the Direktmandat of this
+Wahlkreis, the Direktmandate and Mindestsitzzahl of its Bundesland and the
+national divisor step. The first-stage allocation of the Landeslisten only
+depends on the Zweitstimmen and is reused unless the set of eligible parties
+changes.
+
+"""
+import numpy as np
+import pandas as pd
+
+from src.analysis.functions_law import TIE_MESSAGE
+from src.analysis.functions_law import sainte_lague_divisor
+from src.analysis.functions_law_arrays import bundestagswahl_2013_2017_core
+from src.analysis.functions_law_arrays import direktmandate_arrays
+from src.analysis.functions_law_arrays import eligible_parties_arrays
+from src.analysis.functions_law_arrays import seats_rounded_arrays
+
+
+def baseline_state(arrays):
+    """Calculate the baseline results and cache all intermediate results.
+
+    Input:
+    arrays (dict): output of election_arrays
+
+    Output:
+    state (dict): input arrays and labels of arrays, output of
+        bundestagswahl_2013_2017_core and the Direktmandate by party and Wahlkreis
+        ("direktmandate_wahlkreis") and by party and Bundesland
+        ("direktmandate_bundesland") for all parties
+
+    """
+
+    state = dict(arrays)
+    (
+        state["direktmandate_wahlkreis"],
+        state["direktmandate_bundesland"],
+    ) = direktmandate_arrays(
+        arrays["erststimmen"],
+        arrays["wahlkreis_land"],
+        len(arrays["initial_seats"]),
+    )
+    state.update(
+        bundestagswahl_2013_2017_core(
+            arrays["erststimmen"],
+            arrays["zweitstimmen_bundesland"],
+            arrays["zweitstimmen_bundesgebiet"],
+            arrays["wahlkreis_land"],
+            arrays["initial_seats"],
+        )
+    )
+
+    return state
+
+
+def update_erststimmen(state, wahlkreis, erststimmen_wahlkreis):
+    """Recalculate the results after the Erststimmen in one Wahlkreis changed.
+
+    Input:
+    state (dict): output of baseline_state or update_erststimmen, not modified
+    wahlkreis (int): position of the Wahlkreis
+    erststimmen_wahlkreis (np.ndarray): new Erststimmen by party in the Wahlkreis
+
+    Output:
+    new_state (dict): same as state for the changed Erststimmen
+
+    """
+
+    erststimmen_wahlkreis = np.asarray(erststimmen_wahlkreis, dtype=np.float64)
+    new_state = dict(state)
+    new_state["erststimmen"] = state["erststimmen"].copy()
+    new_state["erststimmen"][:, wahlkreis] = erststimmen_wahlkreis
+
+    # * Direktmandat of the Wahlkreis.
+    winner = (erststimmen_wahlkreis == erststimmen_wahlkreis.max()).astype(np.int64)
+    change = winner - state["direktmandate_wahlkreis"][:, wahlkreis]
+    if not change.any():
+        return new_state
+
+    land = state["wahlkreis_land"][wahlkreis]
+    new_state["direktmandate_wahlkreis"] = state["direktmandate_wahlkreis"].copy()
+    new_state["direktmandate_wahlkreis"][:, wahlkreis] = winner
+    new_state["direktmandate_bundesland"] = state["direktmandate_bundesland"].copy()
+    new_state["direktmandate_bundesland"][:, land] += change
+
+    # * A new eligible party changes the first stage in all Bundesländer.
+    eligible = eligible_parties_arrays(
+        state["zweitstimmen_bundesgebiet"],
+        new_state["direktmandate_bundesland"].sum(axis=1),
+    )
+    if not np.array_equal(eligible, state["eligible"]):
+        new_state.update(
+            bundestagswahl_2013_2017_core(
+                new_state["erststimmen"],
+                state["zweitstimmen_bundesland"],
+                state["zweitstimmen_bundesgebiet"],
+                state["wahlkreis_land"],
+                state["initial_seats"],
+            )
+        )
+        return new_state
+
+    # * Mindestsitzzahl of the Bundesland, Listenplätze stay the same.
+    direktmandate_eligible = new_state["direktmandate_bundesland"][eligible]
+    listenplätze = state["listenplätze"]
+    mindestsitzzahl = state["mindestsitzzahl"].copy()
+    mindestsitzzahl[:, land] = np.maximum(
+        listenplätze[:, land], direktmandate_eligible[:, land]
+    )
+
+    # * Number of Ausgleichsmandate (definite size of Bundestag)
+    zweitstimmen_eligible = state["zweitstimmen_bundesland"][eligible]
+    seats_rounded = seats_rounded_arrays(
+        state["zweitstimmen_bundesgebiet"][eligible], mindestsitzzahl
+    )
+
+    # * Redistribution only for parties with other seats or Direktmandate.
+    bundestagssitze = state["bundestagssitze"].copy()
+    changed = (seats_rounded != state["seats_rounded"]) | (
+        direktmandate_eligible[:, land] != state["direktmandate"][:, land]
+    )
+    for partei in np.flatnonzero(changed):
+        bundestagssitze[partei], _ = sainte_lague_divisor(
+            zweitstimmen_eligible[partei],
+            seats_rounded[partei],
+            min_seats=direktmandate_eligible[partei],
+        )
+
+    new_state.update(
+        {
+            "direktmandate": direktmandate_eligible,
+            "mindestsitzzahl": mindestsitzzahl,
+            "seats_rounded": seats_rounded,
+            "bundestagssitze": bundestagssitze,
+            "überhang": np.maximum(0, direktmandate_eligible - listenplätze),
+            "ausgleich": bundestagssitze - mindestsitzzahl,
+        }
+    )
+
+    return new_state
+
+
+def bundestagssitze_all_parties(state):
+    """Seats by party and Bundesland including the parties that are not eligible.
+
+    Input:
+    state (dict): output of baseline_state or update_erststimmen
+
+    Output:
+    bundestagssitze (np.ndarray): seats by party and Bundesland
+
+    """
+
+    bundestagssitze = np.zeros(state["zweitstimmen_bundesland"].shape, dtype=np.int64)
+    bundestagssitze[state["eligible"]] = state["bundestagssitze"]
+
+    return bundestagssitze
+
+
+def sensitivity_erststimmen(state):
+    """Let the runner-up win each Wahlkreis by one vote and count changed seats.
+
+    Input:
+    state (dict): output of baseline_state
+
+    Output:
+    effect_changed_erststimme (pd.DataFrame): by Wahlkreis the number of changed
+        seats ("# geänderte Sitze") and the necessary additional Erststimmen for
+        the runner-up ("benötigte Stimmen")
+
+    """
+
+    bundestagssitze = bundestagssitze_all_parties(state)
+    num_changes = np.zeros(len(state["wahlkreise"]), dtype=np.int64)
+    num_votes_manipulated = np.zeros(len(state["wahlkreise"]), dtype=np.int64)
+
+    for wahlkreis in range(len(state["wahlkreise"])):
+        # replace value of second largest party by value of largest party + 1
+        erststimmen_manipulated = state["erststimmen"][:, wahlkreis].copy()
+        largest_party, second_largest_party = np.argsort(
+            -erststimmen_manipulated, kind="stable"
+        )[:2]
+        num_votes_manipulated[wahlkreis] = (
+            erststimmen_manipulated[largest_party]
+            + 1
+            - erststimmen_manipulated[second_largest_party]
+        )
+        erststimmen_manipulated[second_largest_party] = (
+            erststimmen_manipulated[largest_party] + 1
+        )
+
+        state_manipulated = update_erststimmen(
+            state, wahlkreis, erststimmen_manipulated
+        )
+        num_changes[wahlkreis] = np.abs(
+            bundestagssitze - bundestagssitze_all_parties(state_manipulated)
+        ).sum()
+
+    effect_changed_erststimme = pd.DataFrame(
+        {"# geänderte Sitze": num_changes, "benötigte Stimmen": num_votes_manipulated},
+        index=state["wahlkreise"],
+    )
+
+    return effect_changed_erststimme
+
+
+def update_zweitstimmen(state, partei, land, change):
+    """Recalculate the results after the Zweitstimmen of one Landesliste changed.
+
+    Only the first-stage allocation of the Bundesland and the national divisor
+    step are recalculated unless the set of eligible parties changes.
+
+    Input:
+    state (dict): output of baseline_state, not modified
+    partei (int): position of the party
+    land (int): position of the Bundesland
+    change (int): change in Zweitstimmen of the party in the Bundesland
+
+    Output:
+    new_state (dict): same as state for the changed Zweitstimmen
+
+    """
+
+    new_state = dict(state)
+    new_state["zweitstimmen_bundesland"] = state["zweitstimmen_bundesland"].copy()
+    new_state["zweitstimmen_bundesland"][partei, land] += change
+    new_state["zweitstimmen_bundesgebiet"] = state["zweitstimmen_bundesgebiet"].copy()
+    new_state["zweitstimmen_bundesgebiet"][partei] += change
+
+    # * The 5% threshold depends on the votes of all parties.
+    eligible = eligible_parties_arrays(
+        new_state["zweitstimmen_bundesgebiet"],
+        state["direktmandate_bundesland"].sum(axis=1),
+    )
+    if not np.array_equal(eligible, state["eligible"]):
+        new_state.update(
+            bundestagswahl_2013_2017_core(
+                state["erststimmen"],
+                new_state["zweitstimmen_bundesland"],
+                new_state["zweitstimmen_bundesgebiet"],
+                state["wahlkreis_land"],
+                state["initial_seats"],
+            )
+        )
+        return new_state
+    if partei not in eligible:
+        return new_state
+
+    # * Listenplätze and Mindestsitzzahl of the Bundesland.
+    zweitstimmen_eligible = new_state["zweitstimmen_bundesland"][eligible]
+    direktmandate_eligible = state["direktmandate"]
+    listenplätze = state["listenplätze"].copy()
+    listenplätze[:, land], _ = sainte_lague_divisor(
+        zweitstimmen_eligible[:, land], state["initial_seats"][land]
+    )
+    mindestsitzzahl = state["mindestsitzzahl"].copy()
+    mindestsitzzahl[:, land] = np.maximum(
+        listenplätze[:, land], direktmandate_eligible[:, land]
+    )
+
+    # * Number of Ausgleichsmandate (definite size of Bundestag)
+    seats_rounded = seats_rounded_arrays(
+        new_state["zweitstimmen_bundesgebiet"][eligible], mindestsitzzahl
+    )
+
+    # * Redistribution for the changed party and parties with other seats.
+    bundestagssitze = state["bundestagssitze"].copy()
+    changed = seats_rounded != state["seats_rounded"]
+    changed[np.flatnonzero(eligible == partei)] = True
+    for position in np.flatnonzero(changed):
+        bundestagssitze[position], _ = sainte_lague_divisor(
+            zweitstimmen_eligible[position],
+            seats_rounded[position],
+            min_seats=direktmandate_eligible[position],
+        )
+
+    new_state.update(
+        {
+            "listenplätze": listenplätze,
+            "mindestsitzzahl": mindestsitzzahl,
+            "seats_rounded": seats_rounded,
+            "bundestagssitze": bundestagssitze,
+            "überhang": np.maximum(0, direktmandate_eligible - listenplätze),
+            "ausgleich": bundestagssitze - mindestsitzzahl,
+        }
+    )
+
+    return new_state
+
+
+def smallest_decisive_change(seats_changed, max_change):
+    """Find the smallest change in votes for which seats_changed is True.
+
+    The change is doubled until the seats change (exponential search), then the
+    interval between the last change without and the first change with an effect
+    is bisected. Changes in between the evaluated ones are assumed to behave
+    monotonically.
+
+    Input:
+    seats_changed (function): takes the number of changed votes and returns
+        whether any seat changes
+    max_change (int): largest change in votes to consider
+
+    Output:
+    decisive_change (int): smallest change in votes that changes a seat,
+        None if there is none up to max_change
+
+    """
+
+    if max_change < 1:
+        return None
+
+    lower = 0
+    upper = 1
+    while not seats_changed(upper):
+        if upper == max_change:
+            return None
+        lower = upper
+        upper = min(2 * upper, max_change)
+
+    while upper - lower > 1:
+        middle = (lower + upper) // 2
+        if seats_changed(middle):
+            upper = middle
+        else:
+            lower = middle
+
+    return upper
+
+
+def decisive_votes(state, max_change=1_000_000):
+    """Find for each Landesliste the smallest increase and decrease of
+    Zweitstimmen that changes any seat in the Bundestag.
+
+    Input:
+    state (dict): output of baseline_state
+    max_change (int): largest change in Zweitstimmen to consider
+
+    Output:
+    decisive (pd.DataFrame): by party, Bundesland and direction ("Richtung",
+        +1 or -1) the necessary change in Zweitstimmen ("benötigte Stimmen"),
+        the number of changed seats ("# geänderte Sitze") and which seats change
+        ("geänderte Sitze")
+
+    """
+
+    parteien = state["parteien"]
+    bundesländer = state["bundesländer"]
+    bundestagssitze = bundestagssitze_all_parties(state)
+
+    rows = []
+    for partei in state["eligible"]:
+        for land in range(len(bundesländer)):
+            votes = state["zweitstimmen_bundesland"][partei, land]
+            if votes == 0:
+                continue
+            for richtung in [1, -1]:
+
+                def difference(change):
+                    new_state = update_zweitstimmen(
+                        state, partei, land, richtung * change
+                    )
+                    return bundestagssitze_all_parties(new_state) - bundestagssitze
+
+                def seats_changed(change):
+                    # A tie between Hoechstzahlen is decided by lot, one more
+                    # vote is needed to change the seat for sure. Other errors
+                    # are not a tie and are raised.
+                    try:
+                        return difference(change).any()
+                    except ValueError as error:
+                        if str(error) != TIE_MESSAGE:
+                            raise
+                        return False
+
+                limit = max_change if richtung == 1 else min(max_change, int(votes))
+                decisive_change = smallest_decisive_change(seats_changed, limit)
+
+                if decisive_change is None:
+                    rows.append(
+                        [parteien[partei], bundesländer[land], richtung, None, 0, ""]
+                    )
+                    continue
+
+                seats_difference = difference(decisive_change)
+                changes = [
+                    f"{parteien[changed_partei]} {bundesländer[changed_land]} "
+                    f"{seats_difference[changed_partei, changed_land]:+d}"
+                    for changed_partei, changed_land in zip(
+                        *np.nonzero(seats_difference)
+                    )
+                ]
+                rows.append(
+                    [
+                        parteien[partei],
+                        bundesländer[land],
+                        richtung,
+                        decisive_change,
+                        int(np.abs(seats_difference).sum()),
+                        "; ".join(changes),
+                    ]
+                )
+
+    decisive = pd.DataFrame(
+        rows,
+        columns=[
+            "Partei",
+            "Bundesland",
+            "Richtung",
+            "benötigte Stimmen",
+            "# geänderte Sitze",
+            "geänderte Sitze",
+        ],
+    ).set_index(["Partei", "Bundesland", "Richtung"])
+
+    return decisive
@@ -0,0 +1,253 @@
+"""Monte Carlo simulation of the seat distribution in the Bundestag.
+
+The results of the Bundestagswahl 2017 (as prepared by load_data.py) are
+perturbed with a correlated national swing by party and Dirichlet noise on the
+party shares in each Wahlkreis. The draws are split into chunks of fixed size,
+every chunk gets its own random number stream spawned from one SeedSequence
+and is evaluated with one of the engines of functions_reforms in a process pool.
+Hence the result only depends on the seed, not on the number of workers.
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.functions_instrumentation import combine_telemetry
+from src.analysis.functions_instrumentation import divisor_telemetry
+from src.analysis.functions_law import votes_by_stimme
+from src.analysis.functions_mapping import sum_by_land
+from src.analysis.functions_mapping import wahlkreis_mapping
+from src.analysis.functions_reforms import ENGINES
+
+
+def baseline_votes(raw_data, bundesländer_wahlkreise):
+    """Collect the votes of each party in each Wahlkreis as arrays.
+
+    Input:
+    raw_data (DataFrame): cleaned election data
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list
+        with all of the Wahlkreise in this Bundesland
+
+    Output:
+    baseline (dict): "parteien", "bundesländer", "wahlkreise" labels,
+        "erststimmen" and "zweitstimmen" parties × Wahlkreise,
+        "wahlkreis_land" the Bundesland code of each Wahlkreis and the compiled
+        "mapping" (wahlkreis_mapping)
+
+    """
+
+    mapping = wahlkreis_mapping(bundesländer_wahlkreise)
+    votes = votes_by_stimme(raw_data, mapping["wahlkreise"])
+
+    baseline = {
+        "parteien": votes["parteien"].tolist(),
+        "bundesländer": mapping["bundesländer"],
+        "wahlkreise": mapping["wahlkreise"],
+        "erststimmen": votes["votes"][0].astype(np.float64),
+        "zweitstimmen": votes["votes"][1].astype(np.float64),
+        "wahlkreis_land": mapping["wahlkreis_land"],
+        "mapping": mapping,
+    }
+
+    return baseline
+
+
+def perturb_votes(votes, swing, concentration, rng):
+    """Draw votes by party and Wahlkreis around the observed votes.
+
+    The party shares in each Wahlkreis are shifted by the national swing and then
+    drawn from a Dirichlet distribution. Parties that did not run in a Wahlkreis
+    keep zero votes, the number of valid votes in each Wahlkreis is unchanged.
+
+    Input:
+    votes (np.ndarray): votes by party and Wahlkreis
+    swing (np.ndarray): national swing on the log scale, draws × parties
+    concentration (float): concentration of the Dirichlet distribution, the
+        higher the less noise in the Wahlkreise
+    rng (np.random.Generator): random number generator
+
+    Output:
+    votes_drawn (np.ndarray): votes by draw, party and Wahlkreis
+
+    """
+
+    total = votes.sum(axis=0)
+    with np.errstate(invalid="ignore"):
+        shares = np.nan_to_num(votes / total)
+
+    alpha = shares[None, :, :] * np.exp(swing)[:, :, None]
+    alpha = concentration * alpha / alpha.sum(axis=1, keepdims=True)
+    draws = rng.gamma(alpha)
+    with np.errstate(invalid="ignore"):
+        shares_drawn = np.nan_to_num(draws / draws.sum(axis=1, keepdims=True))
+
+    return np.rint(shares_drawn * total)
+
+
+def simulate_chunk(task):
+    """Draw and evaluate one chunk of elections.
+
+    Input:
+    task (dict): "seed" (np.random.SeedSequence) of the chunk, "n_draws",
+        "baseline" (output of baseline_votes), "law" and "state" of the engine,
+        "mapping" (land_mapping of the Wahlkreise), "concentration" and
+        "swing_cov"
+
+    Output:
+    chunk (dict): "seats" and "überhang" by draw and party,
+        "bundestag_size" by draw and "telemetry" of the divisor procedures
+
+    """
+
+    rng = np.random.default_rng(task["seed"])
+    baseline = task["baseline"]
+    n_parteien = len(baseline["parteien"])
+
+    swing = rng.multivariate_normal(
+        np.zeros(n_parteien), task["swing_cov"], size=task["n_draws"]
+    )
+    erststimmen = perturb_votes(
+        baseline["erststimmen"], swing, task["concentration"], rng
+    )
+    zweitstimmen = perturb_votes(
+        baseline["zweitstimmen"], swing, task["concentration"], rng
+    )
+
+    # Aggregate Zweitstimmen from Wahlkreise to Bundesländer.
+    zweitstimmen_bundesland = sum_by_land(zweitstimmen, task["mapping"])
+
+    # Count the allocations of this chunk only, a worker evaluates several chunks.
+    with divisor_telemetry() as telemetry:
+        results = ENGINES[task["law"]]["compute"](
+            task["state"], erststimmen, zweitstimmen_bundesland
+        )
+    seats = results["bundestagssitze"].sum(axis=2)
+
+    chunk = {
+        "seats": seats,
+        "überhang": results["überhang"].sum(axis=2),
+        "bundestag_size": seats.sum(axis=1),
+        "telemetry": telemetry,
+    }
+
+    return chunk
+
+
+def simulate_seat_distribution(
+    baseline,
+    initial_seats,
+    n_draws,
+    seed=0,
+    concentration=2000,
+    swing_sd=0.1,
+    swing_cov=None,
+    chunk_size=250,
+    n_workers=None,
+    law="2013_2017",
+):
+    """Simulate the distribution of seats, Überhangmandate and Bundestag size.
+
+    Input:
+    baseline (dict): output of baseline_votes
+    initial_seats (np.ndarray): Sitzkontingent of each Bundesland, in the order
+        of baseline["bundesländer"]
+    n_draws (int): number of simulated elections
+    seed (int): seed of the SeedSequence all random number streams are spawned from
+    concentration (float): concentration of the Dirichlet noise in the Wahlkreise
+    swing_sd (float): standard deviation of the national swing of each party on
+        the log scale, only used if swing_cov is None
+    swing_cov (np.ndarray): covariance matrix of the national swing by party
+    chunk_size (int): number of draws evaluated at once, the result depends on it
+    n_workers (int): number of processes, 1 evaluates all chunks in this process,
+        None uses all cores
+    law (str): electoral law, one of the keys of ENGINES in functions_reforms
+
+    Output:
+    distribution (dict): "seats" and "überhang" (pd.DataFrame draws × parties),
+        "bundestag_size" (pd.Series by draw) and "telemetry" the counters of
+        the divisor procedures of all chunks (see divisor_telemetry)
+
+    """
+
+    n_parteien = len(baseline["parteien"])
+    if swing_cov is None:
+        swing_cov = swing_sd ** 2 * np.eye(n_parteien)
+
+    # The state of the law does not depend on the votes, prepare it once. The
+    # mapping to the Bundesländer is compiled with the baseline.
+    state = ENGINES[law]["prepare"](
+        baseline["wahlkreis_land"], len(baseline["bundesländer"]), initial_seats
+    )
+    mapping = baseline["mapping"]
+
+    n_chunks = -(-n_draws // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [
+        {
+            "seed": seeds[chunk],
+            "n_draws": min(chunk_size, n_draws - chunk * chunk_size),
+            "baseline": baseline,
+            "law": law,
+            "state": state,
+            "mapping": mapping,
+            "concentration": concentration,
+            "swing_cov": swing_cov,
+        }
+        for chunk in range(n_chunks)
+    ]
+
+    if n_workers == 1:
+        chunks = [simulate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunks = list(executor.map(simulate_chunk, tasks))
+
+    distribution = {
+        "seats": pd.DataFrame(
+            np.concatenate([chunk["seats"] for chunk in chunks]),
+            columns=baseline["parteien"],
+        ),
+        "überhang": pd.DataFrame(
+            np.concatenate([chunk["überhang"] for chunk in chunks]),
+            columns=baseline["parteien"],
+        ),
+        "bundestag_size": pd.Series(
+            np.concatenate([chunk["bundestag_size"] for chunk in chunks]),
+            name="bundestag_size",
+        ),
+        "telemetry": combine_telemetry([chunk["telemetry"] for chunk in chunks]),
+    }
+
+    return distribution
+
+
+def summarize_distribution(distribution, quantiles=(0.05, 0.5, 0.95)):
+    """Summarize the simulated seats by party and the size of the Bundestag.
+
+    Input:
+    distribution (dict): output of simulate_seat_distribution
+    quantiles (tuple): quantiles to report
+
+    Output:
+    summary (pd.DataFrame): mean, standard deviation and quantiles of the seats
+        and Überhangmandate of each party and of the Bundestag size
+
+    """
+
+    seats = distribution["seats"].loc[:, distribution["seats"].any()]
+    table = pd.concat(
+        {
+            "Sitze": seats,
+            "Überhang": distribution["überhang"][seats.columns],
+        },
+        axis=1,
+    )
+    table[("Bundestag", "Größe")] = distribution["bundestag_size"]
+
+    summary = pd.concat(
+        [table.mean(), table.std(), table.quantile(list(quantiles)).T], axis=1
+    )
+    summary.columns = ["mean", "sd"] + [f"q{quantile:g}" for quantile in quantiles]
+
+    return summary
@@ -0,0 +1,226 @@
+"""Erststimmen as sparse matrix of the candidacies.
+
+Most parties only run in a few Wahlkreise, so the Erststimmen are stored in
+compressed sparse row (CSR) format with one row per scenario and Wahlkreis:
+"indptr" holds the offsets of the rows, "indices" the parties (ascending within
+a row) and "data" the votes of each candidacy. Winners and sums by Bundesland
+are segment reductions over the candidacies, so memory and time grow with the
+number of candidacies instead of parties × Wahlkreise.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+def candidacies_to_csr(scenario, wahlkreis, partei, votes, shape, labels=None):
+    """Build the sparse Erststimmen from a list of candidacies.
+
+    Input:
+    scenario (np.ndarray): scenario of each candidacy
+    wahlkreis (np.ndarray): position of the Wahlkreis of each candidacy
+    partei (np.ndarray): position of the party of each candidacy
+    votes (np.ndarray): Erststimmen of each candidacy
+    shape (tuple): number of scenarios, parties and Wahlkreise
+    labels (dict): "parteien" and "wahlkreise", optional
+
+    Output:
+    erststimmen (dict): "indptr", "indices", "data", "shape" and the labels
+
+    """
+
+    n_scenarios, n_parteien, n_wahlkreise = shape
+    row = np.asarray(scenario, dtype=np.int64) * n_wahlkreise + np.asarray(
+        wahlkreis, dtype=np.int64
+    )
+    partei = np.asarray(partei, dtype=np.int64)
+    order = np.lexsort((partei, row))
+
+    counts = np.bincount(row, minlength=n_scenarios * n_wahlkreise)
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    erststimmen = {
+        "indptr": indptr,
+        "indices": partei[order],
+        "data": np.asarray(votes, dtype=np.float64)[order],
+        "shape": (n_scenarios, n_parteien, n_wahlkreise),
+    }
+    if labels is not None:
+        erststimmen.update(labels)
+
+    return erststimmen
+
+
+def sparse_erststimmen(erststimmen):
+    """Convert dense Erststimmen to the sparse format, dropping zeros.
+
+    Input:
+    erststimmen (pd.DataFrame or np.ndarray): parties × Wahlkreise (a DataFrame
+        keeps its labels) or scenarios × parties × Wahlkreise
+
+    Output:
+    erststimmen (dict): output of candidacies_to_csr
+
+    """
+
+    labels = None
+    if isinstance(erststimmen, pd.DataFrame):
+        labels = {
+            "parteien": erststimmen.index,
+            "wahlkreise": erststimmen.columns.tolist(),
+        }
+    values = np.asarray(erststimmen, dtype=np.float64)
+    if values.ndim == 2:
+        values = values[None]
+
+    scenario, partei, wahlkreis = np.nonzero(values)
+    erststimmen = candidacies_to_csr(
+        scenario,
+        wahlkreis,
+        partei,
+        values[scenario, partei, wahlkreis],
+        values.shape,
+        labels,
+    )
+
+    return erststimmen
+
+
+def row_reductions(erststimmen):
+    """Winner, highest and total Erststimmen of each row (scenario and Wahlkreis).
+
+    A tie goes to the first of the tied parties and a Wahlkreis without votes to
+    the first party, like np.argmax of the dense Erststimmen.
+
+    Input:
+    erststimmen (dict): sparse Erststimmen
+
+    Output:
+    winner (np.ndarray): position of the winning party, scenarios × Wahlkreise
+    maximum (np.ndarray): Erststimmen of the winner, scenarios × Wahlkreise
+    total (np.ndarray): valid Erststimmen, scenarios × Wahlkreise
+
+    """
+
+    n_scenarios, _, n_wahlkreise = erststimmen["shape"]
+    indptr, data = erststimmen["indptr"], erststimmen["data"]
+    counts = np.diff(indptr)
+    row = np.repeat(np.arange(len(counts)), counts)
+
+    maximum = np.zeros(len(counts))
+    total = np.zeros(len(counts))
+    winner = np.zeros(len(counts), dtype=np.int64)
+    filled = counts > 0
+    if filled.any():
+        # Empty rows hold no candidacies, so the segments of the filled rows
+        # follow each other without gaps.
+        maximum[filled] = np.maximum.reduceat(data, indptr[:-1][filled])
+        total[filled] = np.add.reduceat(data, indptr[:-1][filled])
+        # The parties are ascending within a row, the first maximum wins.
+        at_maximum = np.flatnonzero(data == maximum[row])
+        first = at_maximum[np.r_[True, row[at_maximum][1:] != row[at_maximum][:-1]]]
+        winner[row[first]] = erststimmen["indices"][first]
+        # Without any votes the first party wins, as for the dense Erststimmen.
+        winner[maximum <= 0] = 0
+
+    shape = (n_scenarios, n_wahlkreise)
+
+    return winner.reshape(shape), maximum.reshape(shape), total.reshape(shape)
+
+
+def direktmandate_sparse(erststimmen, wahlkreis_land, n_länder):
+    """Determine the winner of each Wahlkreis and count the Direktmandate by
+    Bundesland, same as direktmandate_batch of the dense Erststimmen.
+
+    Input:
+    erststimmen (dict): sparse Erststimmen
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    winner (np.ndarray): position of the winning party, scenarios × Wahlkreise
+    direktmandate (np.ndarray): Direktmandate, scenarios × parties × Bundesländer
+
+    """
+
+    n_scenarios, n_parteien, _ = erststimmen["shape"]
+    winner, _, _ = row_reductions(erststimmen)
+    direktmandate = np.bincount(
+        (
+            (np.arange(n_scenarios)[:, None] * n_parteien + winner) * n_länder
+            + wahlkreis_land
+        ).ravel(),
+        minlength=n_scenarios * n_parteien * n_länder,
+    ).reshape(n_scenarios, n_parteien, n_länder)
+
+    return winner, direktmandate
+
+
+def direktmandate_sparse_tied(erststimmen, wahlkreis_land, n_länder):
+    """Count the Direktmandate by Bundesland like direktmandate of the dense
+    Erststimmen: every party at the highest Erststimmen of a Wahlkreis wins it,
+    in a Wahlkreis without votes every party.
+
+    Input:
+    erststimmen (dict): sparse Erststimmen
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    direktmandate (np.ndarray): Direktmandate, scenarios × parties × Bundesländer
+
+    """
+
+    n_scenarios, n_parteien, n_wahlkreise = erststimmen["shape"]
+    wahlkreis_land = np.asarray(wahlkreis_land)
+    _, maximum, _ = row_reductions(erststimmen)
+    maximum = maximum.ravel()
+    row = np.repeat(
+        np.arange(n_scenarios * n_wahlkreise), np.diff(erststimmen["indptr"])
+    )
+    scenario, wahlkreis = np.divmod(row, n_wahlkreise)
+    at_maximum = (erststimmen["data"] == maximum[row]) & (maximum[row] > 0)
+    direktmandate = np.bincount(
+        (
+            (scenario * n_parteien + erststimmen["indices"]) * n_länder
+            + wahlkreis_land[wahlkreis]
+        )[at_maximum],
+        minlength=n_scenarios * n_parteien * n_länder,
+    ).reshape(n_scenarios, n_parteien, n_länder)
+
+    # The dense Erststimmen of all parties are zero, so all are at the maximum.
+    scenario, wahlkreis = np.divmod(np.flatnonzero(maximum <= 0), n_wahlkreise)
+    without_votes = np.bincount(
+        scenario * n_länder + wahlkreis_land[wahlkreis],
+        minlength=n_scenarios * n_länder,
+    ).reshape(n_scenarios, 1, n_länder)
+
+    return direktmandate + without_votes
+
+
+def land_sums_sparse(erststimmen, wahlkreis_land, n_länder):
+    """Sum the Erststimmen of each party by Bundesland.
+
+    Input:
+    erststimmen (dict): sparse Erststimmen
+    wahlkreis_land (np.ndarray): Bundesland code of each Wahlkreis
+    n_länder (int): number of Bundesländer
+
+    Output:
+    erststimmen_bundesland (np.ndarray): scenarios × parties × Bundesländer
+
+    """
+
+    n_scenarios, n_parteien, n_wahlkreise = erststimmen["shape"]
+    row = np.repeat(
+        np.arange(n_scenarios * n_wahlkreise), np.diff(erststimmen["indptr"])
+    )
+    scenario, wahlkreis = np.divmod(row, n_wahlkreise)
+    erststimmen_bundesland = np.bincount(
+        (scenario * n_parteien + erststimmen["indices"]) * n_länder
+        + np.asarray(wahlkreis_land)[wahlkreis],
+        weights=erststimmen["data"],
+        minlength=n_scenarios * n_parteien * n_länder,
+    ).reshape(n_scenarios, n_parteien, n_länder)
+
+    return erststimmen_bundesland
@@ -0,0 +1,444 @@
+"""Columnar cache for the data pipeline.
+
+Parsed csv files are stored as Parquet files named after a hash of the source
+file and the parser arguments, so a changed source file is parsed again while an
+unchanged one is read back (memory-mapped) without touching the csv. The
+cleaned outputs of load_data.py are written as typed Parquet files next to the
+json and pickle files.
+
+Results of whole functions are cached by a hash of their inputs in two tiers:
+a least recently used dict in memory and pickle files on disk which survive the
+process. The pickle files are kept by the version of the code that computed
+them, so results of an older version are never returned.
+
+"""
+import hashlib
+import os
+import pickle
+import sys
+import types
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import BLD
+
+CACHE_DIR = BLD / "cache"
+
+# Raise to invalidate all cached results, e.g. if their format changes.
+CACHE_VERSION = 1
+
+# Version of the code by function, see code_version.
+CODE_VERSIONS = {}
+
+# Hashes of pd.Index objects by id, with the object (see index_hash).
+INDEX_HASHES = OrderedDict()
+INDEX_HASHES_SIZE = 256
+
+# Hashes of the labels and dtypes of DataFrames by id (see frame_labels_hash).
+FRAME_LABELS = OrderedDict()
+FRAME_LABELS_SIZE = 64
+
+# Objects hashed by their repr, which is exact for them.
+SCALARS = (str, bytes, int, float, complex, bool, type(None), np.generic)
+
+
+def source_hash(path, **read_csv_kwargs):
+    """Hash the content of a source file together with the parser arguments.
+
+    Input:
+    path (str or Path): source file
+    read_csv_kwargs: arguments passed to pd.read_csv
+
+    Output:
+    key (str): hexadecimal hash
+
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(repr(sorted(read_csv_kwargs.items())).encode())
+
+    return digest.hexdigest()[:16]
+
+
+def index_hash(index):
+    """Hash the labels and dtype of a pd.Index, memoized by the object.
+
+    pd.Index objects are immutable, new labels of a frame are a new object. The
+    memo holds the objects, so their ids are not reused while they are cached.
+
+    Input:
+    index (pd.Index): labels
+
+    Output:
+    key (bytes): hash
+
+    """
+
+    entry = INDEX_HASHES.get(id(index))
+    if entry is None or entry[0] is not index:
+        digest = hashlib.sha256(repr((index.tolist(), str(index.dtype))).encode())
+        entry = (index, digest.digest())
+        INDEX_HASHES[id(index)] = entry
+        if len(INDEX_HASHES) > INDEX_HASHES_SIZE:
+            INDEX_HASHES.popitem(last=False)
+    else:
+        INDEX_HASHES.move_to_end(id(index))
+
+    return entry[1]
+
+
+def frame_labels_hash(data, dtype):
+    """Hash the index, columns and dtypes of a DataFrame, memoized by the frame.
+
+    The entry is used while the frame has the same index and columns objects and
+    to_numpy gives the same dtype. A column changed in place to another dtype
+    with the same values after to_numpy (e.g. int32 in an int64 frame) is not
+    detected.
+
+    Input:
+    data (pd.DataFrame): frame
+    dtype (np.dtype): dtype of data.to_numpy()
+
+    Output:
+    key (bytes): hash
+
+    """
+
+    entry = FRAME_LABELS.get(id(data))
+    if (
+        entry is not None
+        and entry[0]() is data
+        and entry[1] is data.index
+        and entry[2] is data.columns
+        and entry[3] == dtype
+    ):
+        FRAME_LABELS.move_to_end(id(data))
+        return entry[4]
+
+    digest = hashlib.sha256(index_hash(data.index))
+    digest.update(index_hash(data.columns))
+    # The dtypes by column as codes, the repr of dtypes is slow.
+    dtypes = data.dtypes.to_numpy()
+    if len(set(dtypes)) > 1:
+        codes, dtypes = pd.factorize(dtypes)
+        digest.update(codes.tobytes())
+    else:
+        dtypes = dtypes[:1]
+    digest.update(repr([str(dtype) for dtype in dtypes]).encode())
+
+    FRAME_LABELS[id(data)] = (
+        weakref.ref(data),
+        data.index,
+        data.columns,
+        dtype,
+        digest.digest(),
+    )
+    if len(FRAME_LABELS) > FRAME_LABELS_SIZE:
+        FRAME_LABELS.popitem(last=False)
+
+    return FRAME_LABELS[id(data)][4]
+
+
+def content_hash(*objects):
+    """Hash the content of pandas objects, arrays and plain Python objects.
+
+    pandas objects are hashed with their index and labels, so equal values with
+    different labels give different keys. The values are hashed on every call, the
+    labels once per pd.Index object (index_hash) and the dtypes of a DataFrame
+    once per frame (frame_labels_hash).
+
+    Input:
+    objects: pd.Series, pd.DataFrame, pd.Index, np.ndarray, numbers, strings
+        and None or dicts, lists and tuples of them
+
+    Output:
+    key (str): hexadecimal hash
+
+    """
+
+    digest = hashlib.sha256()
+    for item in objects:
+        if isinstance(item, (pd.Series, pd.DataFrame)):
+            values = item.to_numpy()
+            dtype = values.dtype
+            if dtype == object:
+                values = pd.util.hash_pandas_object(item, index=False).to_numpy()
+            digest.update(np.ascontiguousarray(values))
+            if isinstance(item, pd.DataFrame):
+                digest.update(frame_labels_hash(item, dtype))
+            else:
+                digest.update(index_hash(item.index))
+                digest.update(repr((item.name, str(item.dtype))).encode())
+        elif isinstance(item, np.ndarray):
+            digest.update(repr((item.shape, str(item.dtype))).encode())
+            digest.update(np.ascontiguousarray(item))
+        elif isinstance(item, pd.Index):
+            digest.update(index_hash(item))
+        elif isinstance(item, dict):
+            # By content, the repr of large arrays is abbreviated.
+            keys = sorted(item, key=repr)
+            digest.update(content_hash(keys, *[item[key] for key in keys]).encode())
+        elif isinstance(item, (list, tuple)):
+            digest.update(type(item).__name__.encode())
+            # By type, which is faster than checking every element.
+            kinds = set(map(type, item))
+            joined = "\0".join(item) if kinds == {str} else None
+            if joined is not None and joined.count("\0") == len(item) - 1:
+                # Labels without NUL, joining is faster than the repr.
+                digest.update(f"{len(item)}\0{joined}".encode())
+            elif all(issubclass(kind, SCALARS) for kind in kinds):
+                digest.update(repr(item).encode())
+            else:
+                digest.update(content_hash(*item).encode())
+        elif isinstance(item, SCALARS):
+            digest.update(repr(item).encode())
+        else:
+            raise TypeError(f"Cannot hash the content of {type(item).__name__}.")
+        digest.update(b"|")
+
+    return digest.hexdigest()
+
+
+def code_version(function):
+    """Hash the source of the module of a function and of all modules of the same
+    package it uses, directly or through other modules.
+
+    Input:
+    function (function): function defined in a module file
+
+    Output:
+    version (str): hexadecimal hash, changes with CACHE_VERSION and the source
+
+    """
+
+    name = (function.__module__, function.__qualname__)
+    if name not in CODE_VERSIONS:
+        package = function.__module__.split(".")[0]
+        modules = set()
+        pending = [function.__module__]
+        while pending:
+            module = pending.pop()
+            if module in modules or module not in sys.modules:
+                continue
+            modules.add(module)
+            for item in vars(sys.modules[module]).values():
+                if isinstance(item, types.ModuleType):
+                    used = item.__name__
+                else:
+                    used = getattr(item, "__module__", None)
+                if isinstance(used, str) and used.split(".")[0] == package:
+                    pending.append(used)
+
+        digest = hashlib.sha256(repr(CACHE_VERSION).encode())
+        for module in sorted(modules):
+            path = getattr(sys.modules[module], "__file__", None)
+            if path is not None:
+                digest.update(module.encode())
+                digest.update(Path(path).read_bytes())
+        CODE_VERSIONS[name] = digest.hexdigest()[:16]
+
+    return CODE_VERSIONS[name]
+
+
+def write_table(data, path):
+    """Write a DataFrame as Parquet file.
+
+    Input:
+    data (pd.DataFrame): data with unique column labels
+    path (str or Path): Parquet file
+
+    """
+
+    data = data.copy()
+    data.columns = [str(column) for column in data.columns]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    data.to_parquet(path, engine="pyarrow")
+
+
+def read_table(path):
+    """Read a Parquet file written by write_table memory-mapped.
+
+    Input:
+    path (str or Path): Parquet file
+
+    Output:
+    data (pd.DataFrame): data with the stored dtypes
+
+    """
+
+    return pd.read_parquet(path, engine="pyarrow", memory_map=True)
+
+
+def cached_read_csv(path, cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """Read a csv file through the Parquet cache.
+
+    Input:
+    path (str or Path): csv file
+    cache_dir (Path): directory of the cached Parquet files
+    read_csv_kwargs: arguments passed to pd.read_csv
+
+    Output:
+    data (pd.DataFrame): same as pd.read_csv(path, **read_csv_kwargs)
+
+    """
+
+    key = source_hash(path, **read_csv_kwargs)
+    cache_path = Path(cache_dir) / f"{Path(path).stem}-{key}.parquet"
+
+    if cache_path.exists():
+        data = read_table(cache_path)
+        # Missing values in object columns are read back as None, pd.read_csv
+        # returns np.nan (which labels are compared with by identity).
+        for column in data.columns[data.dtypes == object]:
+            values = data[column].to_numpy(dtype=object, copy=True)
+            values[pd.isna(values)] = np.nan
+            data[column] = values
+    else:
+        data = pd.read_csv(path, **read_csv_kwargs)
+        write_table(data, cache_path)
+
+    # Without header the columns are labelled by position.
+    if read_csv_kwargs.get("header", "infer") is None:
+        data.columns = range(data.shape[1])
+
+    return data
+
+
+def typed_votes(data):
+    """Type the cleaned election results for storage.
+
+    Partei stays a string column since it becomes the index of all results.
+
+    Input:
+    data (pd.DataFrame): cleaned election data with columns Partei, Stimme and
+        one column of votes by Gebiet
+
+    Output:
+    data (pd.DataFrame): same as input with int64 votes and categorical Stimme
+
+    """
+
+    data = data.copy()
+    gebiete = [column for column in data.columns if column not in ["Partei", "Stimme"]]
+    data[gebiete] = data[gebiete].apply(pd.to_numeric).astype("int64")
+    data["Stimme"] = data["Stimme"].astype("category")
+
+    return data
+
+
+def result_cache(directory=CACHE_DIR / "results", memory_size=128, disk_size=1 << 28):
+    """Create a two-tier cache of function results.
+
+    Input:
+    directory (str or Path): directory of the pickle files, None keeps the cache in
+        memory only
+    memory_size (int): maximum number of results held in memory
+    disk_size (int): maximum number of bytes of the pickle files
+
+    Output:
+    cache (dict): "memory" (OrderedDict), the limits and "info" with the number of
+        memory hits, disk hits and misses
+
+    """
+
+    cache = {
+        "memory": OrderedDict(),
+        "memory_size": memory_size,
+        "directory": None if directory is None else Path(directory),
+        "disk_size": disk_size,
+        "info": {"memory_hits": 0, "disk_hits": 0, "misses": 0},
+    }
+
+    return cache
+
+
+def evict_disk(cache):
+    """Delete the least recently used pickle files above the size of the cache.
+
+    Input:
+    cache (dict): output of result_cache
+
+    """
+
+    files = [(entry.stat(), entry) for entry in cache["directory"].glob("*/*.pickle")]
+    size = sum(stat.st_size for stat, _ in files)
+    for stat, entry in sorted(files, key=lambda file: file[0].st_mtime):
+        if size <= cache["disk_size"]:
+            break
+        entry.unlink(missing_ok=True)
+        size -= stat.st_size
+
+
+def cached_call(cache, function, *args):
+    """Call a function through a result cache.
+
+    The key is the content hash of the name of the function, its code_version
+    and the arguments. The pickle files are stored in a directory by
+    code_version, files of older versions are evicted first as they are no
+    longer used. Results found on disk are moved into memory, new results are
+    stored in both tiers. The result must be picklable and is returned as a copy.
+
+    Input:
+    cache (dict): output of result_cache
+    function (function): function of the arguments only
+    args: arguments accepted by content_hash
+
+    Output:
+    result: copy of function(*args)
+
+    """
+
+    version = code_version(function)
+    key = content_hash(function.__module__, function.__qualname__, version, *args)
+    memory = cache["memory"]
+    info = cache["info"]
+    path = None
+    if cache["directory"] is not None:
+        path = cache["directory"] / version / f"{key}.pickle"
+
+    if key in memory:
+        info["memory_hits"] += 1
+        memory.move_to_end(key)
+    else:
+        if path is not None and path.exists():
+            info["disk_hits"] += 1
+            with open(path, "rb") as handle:
+                memory[key] = copy_result(pickle.load(handle))
+            # The modification time marks the last use for the eviction.
+            os.utime(path)
+        else:
+            info["misses"] += 1
+            # The copy consolidates the frames, which makes the copies of hits
+            # cheaper.
+            memory[key] = copy_result(function(*args))
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temporary = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(temporary, "wb") as handle:
+                    pickle.dump(memory[key], handle, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporary, path)
+                evict_disk(cache)
+        if len(memory) > cache["memory_size"]:
+            memory.popitem(last=False)
+
+    return copy_result(memory[key])
+
+
+def copy_result(result):
+    """Copy pandas objects and arrays, also inside tuples, lists and dicts."""
+
+    if isinstance(result, (pd.Series, pd.DataFrame, np.ndarray)):
+        return result.copy()
+    if isinstance(result, (tuple, list)):
+        return type(result)(copy_result(item) for item in result)
+    if isinstance(result, dict):
+        return {name: copy_result(item) for name, item in result.items()}
+
+    return result
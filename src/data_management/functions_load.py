@@ -0,0 +1,544 @@
+"""Functions to load the election results of the Bundeswahlleiter.
+
+The files btwYYYY_kerg.csv come in two layouts. Until 2002 each party has one
+column per Stimme below a header row "Wahlkreis;;Land;..." (in 1949 there was
+only one Stimme). From 2005 on each party has four columns (Erst- and
+Zweitstimmen, each final and of the previous election) below a header row
+"Nr;Gebiet;gehört zu;...". Both are brought into one long format.
+
+Municipal results are read in chunks and summed up to the Wahlkreise on the
+fly (wahlkreis_totals), so files with millions of rows fit into memory.
+
+"""
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from src.config import SRC
+from src.data_management.functions_cache import CACHE_DIR
+from src.data_management.functions_cache import read_table
+from src.data_management.functions_cache import source_hash
+from src.data_management.functions_cache import write_table
+
+ELECTION_RESULTS = SRC / "original_data" / "election_results"
+
+# Official numbering of the Bundesländer.
+BUNDESLÄNDER = {
+    1: "Schleswig-Holstein",
+    2: "Hamburg",
+    3: "Niedersachsen",
+    4: "Bremen",
+    5: "Nordrhein-Westfalen",
+    6: "Hessen",
+    7: "Rheinland-Pfalz",
+    8: "Baden-Württemberg",
+    9: "Bayern",
+    10: "Saarland",
+    11: "Berlin",
+    12: "Brandenburg",
+    13: "Mecklenburg-Vorpommern",
+    14: "Sachsen",
+    15: "Sachsen-Anhalt",
+    16: "Thüringen",
+}
+
+KÜRZEL = {
+    "SH": 1,
+    "HH": 2,
+    "NI": 3,
+    "HB": 4,
+    "NW": 5,
+    "HE": 6,
+    "RP": 7,
+    "BW": 8,
+    "BY": 9,
+    "SL": 10,
+    "BE": 11,
+    "BB": 12,
+    "MV": 13,
+    "SN": 14,
+    "ST": 15,
+    "TH": 16,
+}
+
+PARTEIEN = {
+    "Christlich Demokratische Union Deutschlands": "CDU",
+    "Sozialdemokratische Partei Deutschlands": "SPD",
+    "Christlich-Soziale Union in Bayern e.V.": "CSU",
+    "BÜNDNIS 90/DIE GRÜNEN": "Grüne",
+    "Freie Demokratische Partei": "FDP",
+    "Alternative für Deutschland": "AfD",
+    "C D U": "CDU",
+    "S P D": "SPD",
+    "C S U": "CSU",
+    "F.D.P.": "FDP",
+    "GRÜNE": "Grüne",
+    "GRUENE": "Grüne",
+    "Die Linke.": "DIE LINKE",
+}
+
+# Columns that are not votes for a party.
+NO_PARTEI = ["", "Wahlberechtigte", "Wähler", "Ungültige", "Gültige"]
+
+COLUMNS = ["Wahl", "Nr", "Gebiet", "Ebene", "Land", "Partei", "Stimme", "Anzahl"]
+CATEGORICAL = ["Gebiet", "Ebene", "Land", "Partei", "Stimme"]
+
+# Rows of a csv file parsed at once by the streaming functions.
+CHUNK_SIZE = 100_000
+
+
+def read_text(path):
+    """Read a file of the Bundeswahlleiter, which is either utf-8 or cp1252
+    encoded.
+
+    Input:
+    path (str or Path): file
+
+    Output:
+    text (str): content of the file
+
+    """
+
+    content = Path(path).read_bytes()
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("cp1252")
+
+
+def read_kerg(path):
+    """Read the results of one Bundestagswahl in long format.
+
+    Land rows get the number 900 + Land and the Bund row the number 999 in all
+    years. Votes of parties that did not run in a Gebiet are 0.
+
+    Input:
+    path (str or Path): file btwYYYY_kerg.csv
+
+    Output:
+    data (pd.DataFrame): columns Wahl, Nr, Gebiet, Ebene (Wahlkreis, Land or
+        Bund), Land, Partei, Stimme (Erststimmen, Zweitstimmen or Stimmen in
+        1949) and Anzahl, the labels as categorical
+
+    """
+
+    wahl = int(re.search(r"btw(\d{4})_kerg", Path(path).name).group(1))
+    lines = read_text(path).splitlines()[5:]
+    n_columns = max(line.count(";") for line in lines) + 1
+    table = pd.read_csv(
+        io.StringIO("\n".join(lines)),
+        sep=";",
+        header=None,
+        names=range(n_columns),
+        dtype=str,
+        skip_blank_lines=False,
+    ).fillna("")
+    table = table.apply(lambda column: column.str.strip())
+
+    # * Header rows: party, Stimme and (from 2005 on) final or previous election.
+    if table.iat[0, 0] == "Wahlkreis":
+        partei = table.iloc[0]
+        stimme = table.iloc[1].replace("", "Stimmen")
+        keep = pd.Series(True, index=table.columns)
+    else:
+        partei = table.iloc[0].replace("", np.nan).ffill().fillna("")
+        stimme = table.iloc[1].replace("", np.nan).ffill().fillna("")
+        keep = table.iloc[2] == "Endgültig"
+    keep &= ~partei.isin(NO_PARTEI) & (table.columns >= 3)
+
+    rows = table[table[0].str.fullmatch(r"\d+")]
+    nr = rows[0].astype(int)
+    zugehörigkeit = rows[2]
+
+    # * Ebene and Land of each Gebiet from the column Land or gehört zu.
+    land_code = pd.to_numeric(zugehörigkeit.replace(KÜRZEL), errors="coerce").mod(900)
+    # Until 2013 the Bund has the number 999, in 2017 the number 99.
+    ist_bund = (
+        zugehörigkeit.str.upper().eq("BUND")
+        | nr.eq(999)
+        | (zugehörigkeit.eq("") & nr.eq(99))
+    )
+    ist_land = (zugehörigkeit.eq("99") | nr.between(901, 916)) & ~ist_bund
+    land_code = land_code.mask(ist_land, nr.mod(900)).mask(ist_bund)
+    nr = nr.mask(ist_land, 900 + nr.mod(900)).mask(ist_bund, 999)
+
+    gebiete = pd.DataFrame(
+        {
+            "Wahl": wahl,
+            "Nr": nr,
+            "Gebiet": rows[1],
+            "Ebene": np.select([ist_bund, ist_land], ["Bund", "Land"], "Wahlkreis"),
+            "Land": land_code.map(BUNDESLÄNDER),
+        }
+    )
+
+    # * One row per Gebiet, party and Stimme.
+    votes = rows.loc[:, keep]
+    votes.columns = pd.MultiIndex.from_arrays(
+        [partei[keep].replace(PARTEIEN), stimme[keep]], names=["Partei", "Stimme"]
+    )
+    votes = votes.replace("", "0").apply(pd.to_numeric).astype("int64")
+    votes = votes.stack(["Partei", "Stimme"]).astype("int64").rename("Anzahl")
+
+    data = gebiete.join(votes.reset_index(level=["Partei", "Stimme"]), how="inner")
+    data = data.reset_index(drop=True)[COLUMNS]
+    data = data.astype({column: "category" for column in CATEGORICAL})
+
+    return data
+
+
+def kerg_cache_path(path, cache_dir=CACHE_DIR):
+    """Determine the Parquet file caching the long format of a results file.
+
+    Input:
+    path (str or Path): file btwYYYY_kerg.csv
+    cache_dir (Path): directory of the cached Parquet files
+
+    Output:
+    cache_path (Path): Parquet file, changes with the content of path
+
+    """
+
+    key = source_hash(path, layout="long")
+
+    return Path(cache_dir) / f"{Path(path).stem}-long-{key}.parquet"
+
+
+def cache_kerg(path, cache_path):
+    """Read the results of one Bundestagswahl and store them in the cache.
+
+    Input:
+    path (str or Path): file btwYYYY_kerg.csv
+    cache_path (Path): Parquet file
+
+    """
+
+    write_table(read_kerg(path), cache_path)
+
+
+def load_elections(
+    directory=ELECTION_RESULTS, years=None, cache_dir=CACHE_DIR, n_workers=None
+):
+    """Load the results of several Bundestagswahlen in long format.
+
+    Cached files are read memory-mapped, the others are parsed in a process pool.
+
+    Input:
+    directory (Path): directory with the files btwYYYY_kerg.csv
+    years (list): years of the elections, None loads all files in directory
+    cache_dir (Path): directory of the cached Parquet files
+    n_workers (int): number of processes, 1 parses all files in this process,
+        None uses all cores
+
+    Output:
+    data (pd.DataFrame): output of read_kerg for all elections
+
+    """
+
+    paths = sorted(Path(directory).glob("btw*_kerg.csv"))
+    if years is not None:
+        paths = [path for path in paths if int(path.name[3:7]) in years]
+    cache_paths = [kerg_cache_path(path, cache_dir) for path in paths]
+    missing = [
+        (path, cache_path)
+        for path, cache_path in zip(paths, cache_paths)
+        if not cache_path.exists()
+    ]
+
+    if n_workers == 1 or len(missing) <= 1:
+        for path, cache_path in missing:
+            cache_kerg(path, cache_path)
+    elif missing:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(cache_kerg, *zip(*missing)))
+
+    results = [read_table(cache_path) for cache_path in cache_paths]
+    data = pd.concat(
+        [result.drop(columns=CATEGORICAL) for result in results], ignore_index=True
+    )
+    data = data.astype({"Wahl": "int16", "Nr": "int16"})
+    for column in CATEGORICAL:
+        data[column] = union_categoricals([result[column] for result in results])
+    data = data[COLUMNS]
+
+    return data
+
+
+def clean_election_results(data):
+    """Clean the results of the Bundestagswahl 2017 by Gebiet.
+
+    Input:
+    data (pd.DataFrame): btw2017_kerg.csv read without header after skipping
+        the first five rows
+
+    Output:
+    raw_data (pd.DataFrame): columns Partei, Stimme and the votes in each Gebiet
+        (Wahlkreise, Bundesländer and Bundesgebiet), one row per party and
+        Stimme
+
+    """
+
+    # * The header rows hold the party, the Stimme and final or previous result.
+    partei = data.iloc[0].ffill()
+    stimme = data.iloc[1].ffill()
+    columns = (data.iloc[2] == "Endgültig") & ~partei.isin(NO_PARTEI)
+    rows = data.index[3:][data.loc[3:, 1].notna()]
+
+    votes = data.loc[rows, columns].apply(pd.to_numeric).fillna(0).astype("int64")
+    votes.index = data.loc[rows, 1].tolist()
+
+    raw_data = votes.T.reset_index(drop=True)
+    raw_data.insert(0, "Partei", partei[columns].replace(PARTEIEN).tolist())
+    raw_data.insert(1, "Stimme", stimme[columns].tolist())
+
+    return raw_data
+
+
+def wahlkreise_by_bundesland(data):
+    """Collect the Wahlkreise of each Bundesland.
+
+    Input:
+    data (pd.DataFrame): btw2017_kerg.csv read without header after skipping
+        the first five rows
+
+    Output:
+    bundesländer_wahlkreise (dict): contains for each Bundesland a list with all
+        of the Wahlkreise in this Bundesland, in the order of the file
+
+    """
+
+    gebiete = data.loc[3:, [0, 1, 2]].dropna(subset=[1])
+    gehört_zu = pd.to_numeric(gebiete[2], errors="coerce")
+
+    bundesländer = gebiete[gehört_zu == 99]
+    wahlkreise = gebiete[gehört_zu.notna() & (gehört_zu != 99)]
+    wahlkreise = wahlkreise.groupby(gehört_zu, sort=False)[1].apply(list)
+
+    bundesländer_wahlkreise = dict(
+        zip(
+            bundesländer[1],
+            wahlkreise.reindex(pd.to_numeric(bundesländer[0])).tolist(),
+        )
+    )
+
+    return bundesländer_wahlkreise
+
+
+def clean_population(data):
+    """Select the number of Germans in each Bundesland.
+
+    Input:
+    data (pd.DataFrame): bevoelkerung_2016.csv read without header after
+        skipping the first five rows
+
+    Output:
+    population (pd.DataFrame): columns Bundesland and Deutsche
+
+    """
+
+    insgesamt = data[2] == "Insgesamt"
+    population = pd.DataFrame(
+        {
+            "Bundesland": data.loc[insgesamt, 1],
+            "Deutsche": pd.to_numeric(data.loc[insgesamt, 5]),
+        }
+    ).reset_index(drop=True)
+
+    return population
+
+
+def candidate_lists(data):
+    """Split the Bewerber into lists by Bundesland and party.
+
+    Input:
+    data (pd.DataFrame): btw2017bewerb_gewaehlt.csv
+
+    Output:
+    listen (dict): contains for each Bundesland a dict with the Bewerber of each
+        party sorted by Liste_Platz
+
+    """
+
+    kürzel = {key: BUNDESLÄNDER[code] for key, code in KÜRZEL.items()}
+    bundesland = data["Wahlkreis_Land"].fillna(data["Liste_Land"]).replace(kürzel)
+    partei = data["Wahlkreis_ParteiBez"].fillna(data["Liste_ParteiBez"])
+    bewerber = data.drop(
+        columns=[
+            "Wahlkreis_Land",
+            "Wahlkreis_ParteiBez",
+            "Wahlkreis_ParteiKurzBez",
+            "Liste_Land",
+            "Liste_ParteiBez",
+            "Liste_ParteiKurzBez",
+        ]
+    )
+
+    listen = {}
+    for (land, name), group in bewerber.groupby([bundesland, partei]):
+        listen.setdefault(land, {})[name] = group.sort_values(
+            by=["Liste_Platz"]
+        ).reset_index(drop=True)
+
+    return listen
+
+
+def gemeinden_wahlkreise(data):
+    """Assign each Gemeinde its Wahlkreis.
+
+    Input:
+    data (pd.DataFrame): 20170228_BTW17_WKr_Gemeinden_ASCII.csv
+
+    Output:
+    gemeinde_wahlkreis (dict): Wahlkreis by name of the Gemeinde (without the
+        suffix after the first comma)
+
+    """
+
+    gemeinden = data["Gemeindename"].str.split(", ", n=1).str[0]
+
+    return dict(zip(gemeinden, data["Wahlkreis-Bez"]))
+
+
+def read_gemeinden_chunks(path, chunksize=CHUNK_SIZE):
+    """Read the assignment of the Gemeinden to the Wahlkreise in chunks.
+
+    Input:
+    path (str or Path): file like 20170228_BTW17_WKr_Gemeinden_ASCII.csv
+    chunksize (int): number of rows per chunk
+
+    Output:
+    chunks (generator): pd.DataFrame with the columns Wahlkreis-Bez and
+        Gemeindename
+
+    """
+
+    with pd.read_csv(
+        path,
+        sep=";",
+        skiprows=7,
+        header=0,
+        usecols=["Wahlkreis-Bez", "Gemeindename"],
+        dtype=str,
+        encoding="cp1252",
+        chunksize=chunksize,
+    ) as reader:
+        yield from reader
+
+
+def stream_gemeinden_wahlkreise(path, chunksize=CHUNK_SIZE):
+    """Assign each Gemeinde its Wahlkreis without reading the whole file.
+
+    Input:
+    path (str or Path): file like 20170228_BTW17_WKr_Gemeinden_ASCII.csv
+    chunksize (int): number of rows per chunk
+
+    Output:
+    gemeinde_wahlkreis (dict): same as gemeinden_wahlkreise
+
+    """
+
+    gemeinde_wahlkreis = {}
+    for chunk in read_gemeinden_chunks(path, chunksize):
+        gemeinde_wahlkreis.update(gemeinden_wahlkreise(chunk))
+
+    return gemeinde_wahlkreis
+
+
+def read_results_chunks(path, chunksize=CHUNK_SIZE, **read_csv_kwargs):
+    """Read municipal (or precinct) results in long format in chunks.
+
+    Input:
+    path (str or Path): csv file with one row per Gemeinde, party and Stimme and
+        the columns Partei, Stimme, Anzahl and Wahlkreis and/or Gemeinde
+    chunksize (int): number of rows per chunk
+    read_csv_kwargs: further arguments of pd.read_csv, e.g. sep or encoding
+
+    Output:
+    chunks (generator): pd.DataFrame with at most chunksize rows
+
+    """
+
+    read_csv_kwargs = {"sep": ";", **read_csv_kwargs}
+    with pd.read_csv(
+        path,
+        dtype={"Anzahl": "int64"},
+        chunksize=chunksize,
+        **read_csv_kwargs,
+    ) as reader:
+        yield from reader
+
+
+def wahlkreis_totals(chunks, wahlkreise, gemeinde_wahlkreis=None):
+    """Aggregate municipal results to the votes by Wahlkreis.
+
+    Only the totals of the Wahlkreise are kept, so the memory does not grow with
+    the number of rows and the chunks can come from a generator like
+    read_results_chunks.
+
+    Input:
+    chunks (iterable): pd.DataFrame with the columns Partei, Stimme, Anzahl and
+        Wahlkreis or Gemeinde (or both, the Wahlkreis is needed for Gemeinden
+        split into several Wahlkreise)
+    wahlkreise (list): all Wahlkreise, e.g. from wahlkreise_by_bundesland
+    gemeinde_wahlkreis (dict): Wahlkreis by Gemeinde (gemeinden_wahlkreise) for
+        the rows without a Wahlkreis, only needed if there are such rows
+
+    Output:
+    raw_data (pd.DataFrame): columns Partei, Stimme and the votes in each
+        Wahlkreis, one row per party and Stimme like clean_election_results
+
+    """
+
+    wahlkreise = pd.Index(wahlkreise)
+    totals = {}
+    for chunk in chunks:
+        if "Wahlkreis" in chunk:
+            wahlkreis = chunk["Wahlkreis"]
+        else:
+            wahlkreis = pd.Series(np.nan, index=chunk.index, dtype=object)
+        missing = wahlkreis.isna()
+        if "Gemeinde" in chunk and missing.any():
+            if gemeinde_wahlkreis is None:
+                raise ValueError(
+                    f"{missing.sum()} rows without a Wahlkreis, pass "
+                    "gemeinde_wahlkreis to assign their Gemeinden."
+                )
+            wahlkreis = wahlkreis.fillna(chunk["Gemeinde"].map(gemeinde_wahlkreis))
+        position = wahlkreise.get_indexer(wahlkreis)
+        if (position < 0).any():
+            unknown = chunk.loc[position < 0].iloc[0]
+            raise ValueError(
+                f"{(position < 0).sum()} rows without a known Wahlkreis, e.g. "
+                f"{unknown.to_dict()}."
+            )
+
+        # Sum within the chunk before adding to the totals.
+        partei, parteien = pd.factorize(chunk["Partei"])
+        stimme, stimmen = pd.factorize(chunk["Stimme"])
+        pairs, rows = np.unique(partei * len(stimmen) + stimme, return_inverse=True)
+        keys = zip(parteien[pairs // len(stimmen)], stimmen[pairs % len(stimmen)])
+        votes = np.bincount(
+            rows * len(wahlkreise) + position,
+            weights=chunk["Anzahl"].to_numpy(dtype=np.float64),
+            minlength=len(pairs) * len(wahlkreise),
+        )
+        votes = np.rint(votes).astype(np.int64).reshape(len(pairs), len(wahlkreise))
+        for key, row in zip(keys, votes):
+            if key in totals:
+                totals[key] += row
+            else:
+                totals[key] = row
+
+    raw_data = pd.DataFrame(
+        np.array(list(totals.values()), dtype=np.int64).reshape(-1, len(wahlkreise)),
+        columns=wahlkreise,
+    )
+    raw_data.insert(0, "Partei", [partei for partei, _ in totals])
+    raw_data.insert(1, "Stimme", [stimme for _, stimme in totals])
+
+    return raw_data
@@ -0,0 +1,79 @@
+"""Inputs of the seat allocation shared by the tests: the Bundestagswahl 2017
+cleaned from the original data as load_data.py does, and a small synthetic
+election.
+
+"""
+import pandas as pd
+import pytest
+
+from src.analysis.benchmark_suite import synthetic_election
+from src.analysis.functions_law import allocation_seats_after2013
+from src.analysis.functions_law import votes_by_stimme
+from src.analysis.functions_law import votes_frame
+from src.config import SRC
+from src.data_management.functions_cache import typed_votes
+from src.data_management.functions_load import clean_election_results
+from src.data_management.functions_load import clean_population
+from src.data_management.functions_load import wahlkreise_by_bundesland
+
+ORIGINAL_DATA = SRC / "original_data"
+
+
+@pytest.fixture(scope="session")
+def data_2017():
+    """Cleaned results, Wahlkreise and population of 2017."""
+
+    kerg = pd.read_csv(
+        ORIGINAL_DATA / "election_results" / "btw2017_kerg.csv",
+        sep=";",
+        skiprows=5,
+        header=None,
+    )
+    population = pd.read_csv(
+        ORIGINAL_DATA / "population" / "bevoelkerung_2016.csv",
+        sep=";",
+        skiprows=5,
+        header=None,
+        encoding="cp1252",
+    )
+
+    return {
+        "raw_data": typed_votes(clean_election_results(kerg)),
+        "bundesländer_wahlkreise": wahlkreise_by_bundesland(kerg),
+        "population": clean_population(population).set_index("Bundesland")["Deutsche"],
+    }
+
+
+@pytest.fixture(scope="session")
+def election_2017(data_2017):
+    """Input of bundestagswahl_2013_2017 for 2017, like bundestag_2017.py."""
+
+    bundesländer_wahlkreise = data_2017["bundesländer_wahlkreise"]
+    bundesländer = list(bundesländer_wahlkreise.keys())
+    wahlkreise = [
+        wahlkreis
+        for bundesland in bundesländer
+        for wahlkreis in bundesländer_wahlkreise[bundesland]
+    ]
+    votes = votes_by_stimme(
+        data_2017["raw_data"], wahlkreise + bundesländer + ["Bundesgebiet"]
+    )
+
+    return {
+        "erststimmen": votes_frame(votes, "Erststimmen", wahlkreise),
+        "zweitstimmen_bundesland": votes_frame(votes, "Zweitstimmen", bundesländer),
+        "zweitstimmen_bundesgebiet": votes_frame(
+            votes, "Zweitstimmen", ["Bundesgebiet"]
+        ),
+        "bundesländer_wahlkreise": bundesländer_wahlkreise,
+        "initial_seats_by_state": allocation_seats_after2013(
+            data_2017["population"], 598
+        ),
+    }
+
+
+@pytest.fixture(scope="session")
+def synthetic():
+    """Small synthetic election in the format of election_2017."""
+
+    return synthetic_election(n_parteien=12, n_wahlkreise=80, n_länder=5, seed=1)
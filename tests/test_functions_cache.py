@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.functions_law import bundestagswahl_2013_2017
+from src.analysis.functions_law import cached_bundestagswahl_2013_2017
+from src.data_management.functions_cache import content_hash
+from src.data_management.functions_cache import result_cache
+
+ARGUMENTS = [
+    "erststimmen",
+    "zweitstimmen_bundesland",
+    "zweitstimmen_bundesgebiet",
+    "bundesländer_wahlkreise",
+    "initial_seats_by_state",
+]
+
+
+def test_result_cache_hits(election_2017, tmp_path):
+    arguments = [election_2017[name] for name in ARGUMENTS]
+    expected = bundestagswahl_2013_2017(*arguments)
+    cache = result_cache(tmp_path)
+
+    first = cached_bundestagswahl_2013_2017(*arguments, cache=cache)
+    # Changing a result must not change the cached one.
+    first[0].iloc[0, 0] = -1
+    second = cached_bundestagswahl_2013_2017(*arguments, cache=cache)
+    # A new cache finds the result on disk.
+    other_cache = result_cache(tmp_path)
+    third = cached_bundestagswahl_2013_2017(*arguments, cache=other_cache)
+
+    for result in [second, third]:
+        for frame, expected_frame in zip(result, expected):
+            pd.testing.assert_frame_equal(frame, expected_frame)
+    assert cache["info"] == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
+    assert other_cache["info"] == {"memory_hits": 0, "disk_hits": 1, "misses": 0}
+
+
+def test_result_cache_misses_changed_votes(election_2017, tmp_path):
+    arguments = [election_2017[name] for name in ARGUMENTS]
+    cache = result_cache(tmp_path)
+    cached_bundestagswahl_2013_2017(*arguments, cache=cache)
+
+    erststimmen = arguments[0].copy()
+    erststimmen.iloc[0, 0] += 1
+    cached_bundestagswahl_2013_2017(erststimmen, *arguments[1:], cache=cache)
+
+    assert cache["info"]["misses"] == 2
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        (["a", "b"], ["a\0b"]),
+        (["a", "b"], ["ab"]),
+        (["a", "b"], ("a", "b")),
+        ([1, 2], ["1", "2"]),
+        (pd.Series([1, 2]), pd.Series([1, 2], index=[1, 2])),
+        (pd.Series([1, 2]), pd.Series([1.0, 2.0])),
+        (np.arange(4), np.arange(4).reshape(2, 2)),
+        ({"a": [1]}, {"a": [2]}),
+    ],
+)
+def test_content_hash_distinguishes(first, second):
+    assert content_hash(first) != content_hash(second)
+
+
+def test_content_hash_by_content():
+    frame = pd.DataFrame({"a": [1, 2], "b": [3, 4]})
+
+    assert content_hash(frame) == content_hash(frame.copy())
+    assert content_hash({"a": [1], "b": "c"}) == content_hash({"b": "c", "a": [1]})
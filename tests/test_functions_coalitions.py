@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import functions_coalitions
+from src.analysis.functions_coalitions import coalition_majorities
+from src.analysis.functions_coalitions import majority_probabilities
+
+
+def test_coalition_majorities_match_all_subsets():
+    seats_by_party = pd.Series(
+        [246, 153, 94, 80, 69, 67, 0],
+        index=["CDU", "SPD", "AfD", "FDP", "LINKE", "Grüne", "X"],
+    )
+    parteien = seats_by_party[seats_by_party > 0]
+    majority = parteien.sum() // 2 + 1
+
+    coalitions = coalition_majorities(seats_by_party)
+
+    assert len(coalitions) == 2 ** len(parteien) - 1
+    for size in range(1, len(parteien) + 1):
+        for members in itertools.combinations(parteien.index, size):
+            row = coalitions.loc["+".join(members)]
+            sum_seats = parteien[list(members)].sum()
+            assert row["sum_seats"] == sum_seats
+            assert row["majority"] == (sum_seats >= majority)
+            assert row["minimal"] == (
+                sum_seats >= majority
+                and all(sum_seats - parteien[partei] < majority for partei in members)
+            )
+
+
+def test_majority_probabilities_match_loop(monkeypatch):
+    rng = np.random.default_rng(0)
+    seats = pd.DataFrame(rng.integers(0, 100, (50, 4)), columns=list("ABCD"))
+    seats["E"] = 0
+    # Several chunks of draws.
+    monkeypatch.setattr(functions_coalitions, "CHUNK_ENTRIES", 60)
+
+    probabilities = majority_probabilities(seats)
+
+    assert len(probabilities) == 2 ** 4 - 1
+    for label, probability in probabilities["probability"].items():
+        members = label.split("+")
+        wins = seats[members].sum(axis=1) >= seats.sum(axis=1) // 2 + 1
+        assert probability == wins.mean()
@@ -0,0 +1,42 @@
+import threading
+
+import numpy as np
+
+from src.analysis.functions_instrumentation import divisor_telemetry
+from src.analysis.functions_instrumentation import instrument
+from src.analysis.functions_instrumentation import stage
+from src.analysis.functions_law import sainte_lague_report
+
+
+def in_thread(function):
+    thread = threading.Thread(target=function)
+    thread.start()
+    thread.join()
+
+
+def test_recorder_only_sees_its_own_thread():
+    def other_stages():
+        with stage("other"):
+            pass
+
+    with instrument() as recorder:
+        with stage("outer"):
+            with stage("inner"):
+                in_thread(other_stages)
+
+    assert [event["name"] for event in recorder["events"]] == ["inner", "outer"]
+    assert [event["depth"] for event in recorder["events"]] == [1, 0]
+
+
+def test_divisor_telemetry_only_counts_its_own_thread():
+    def other_allocation():
+        sainte_lague_report(np.array([300.0, 200.0, 100.0]), 6)
+
+    with divisor_telemetry() as outer:
+        with divisor_telemetry() as inner:
+            sainte_lague_report(np.array([300.0, 200.0, 100.0]), 6)
+            in_thread(other_allocation)
+
+    assert inner["calls"] == 1
+    assert outer["calls"] == 1
+    assert outer["max_iterations"] == inner["max_iterations"]
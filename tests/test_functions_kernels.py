@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.analysis.benchmark_suite import backend_parity
+from src.analysis.benchmark_suite import run_backends
+from src.analysis.functions_kernels import COMPILED
+from src.analysis.functions_law_arrays import election_arrays
+from src.analysis.functions_reforms import ENGINES
+
+ARGUMENTS = [
+    "erststimmen",
+    "zweitstimmen_bundesland",
+    "zweitstimmen_bundesgebiet",
+    "bundesländer_wahlkreise",
+    "initial_seats_by_state",
+]
+
+pytestmark = pytest.mark.skipif(not COMPILED, reason="numba is not installed")
+
+
+def test_backend_parity():
+    assert backend_parity(n_cases=12) == []
+
+
+@pytest.mark.parametrize("law", list(ENGINES))
+def test_engines_do_not_depend_on_backend(election_2017, law):
+    arrays = election_arrays(*[election_2017[name] for name in ARGUMENTS])
+    rng = np.random.default_rng(0)
+    erststimmen = arrays["erststimmen"] * rng.uniform(
+        0.8, 1.2, (20,) + arrays["erststimmen"].shape
+    )
+    zweitstimmen_bundesland = arrays["zweitstimmen_bundesland"] * rng.uniform(
+        0.8, 1.2, (20,) + arrays["zweitstimmen_bundesland"].shape
+    )
+    engine = ENGINES[law]
+    state = engine["prepare"](
+        arrays["wahlkreis_land"], len(arrays["bundesländer"]), arrays["initial_seats"]
+    )
+
+    numpy_results, kernel_results = run_backends(
+        lambda: engine["compute"](state, erststimmen, zweitstimmen_bundesland)
+    )
+
+    for name in numpy_results:
+        np.testing.assert_array_equal(numpy_results[name], kernel_results[name])
@@ -0,0 +1,197 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.former_law import sainte_lague_last_loops
+from benchmarks.former_law import sainte_lague_new_loops
+from src.analysis.functions_law import allocation_seats_after2013
+from src.analysis.functions_law import direktmandate
+from src.analysis.functions_law import sainte_lague_last
+from src.analysis.functions_law import sainte_lague_margins
+from src.analysis.functions_law import sainte_lague_new
+from src.analysis.functions_law import sainte_lague_report
+
+
+def former(function, *args):
+    """Run a former stepping search, None if it does not converge."""
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        try:
+            return function(*args)
+        # The steps of 50 jump over all divisors that yield the seats.
+        except RecursionError:
+            return None
+
+
+def random_votes(seed, n_min=3, n_max=10):
+    rng = np.random.default_rng(seed)
+    votes = pd.Series(rng.integers(50_000, 5_000_000, rng.integers(n_min, n_max)))
+    return votes, rng
+
+
+def assert_divisor_yields(report, votes, available_seats, min_seats=0):
+    assert report["converged"]
+    assert report["seats"].sum() == available_seats
+    rounded = np.maximum(np.rint(votes / report["divisor"]), min_seats)
+    np.testing.assert_array_equal(rounded, report["seats"])
+
+
+def test_sainte_lague_new_matches_former_search_2017(election_2017):
+    zweitstimmen = election_2017["zweitstimmen_bundesgebiet"]["Bundesgebiet"]
+    zweitstimmen = zweitstimmen[zweitstimmen / zweitstimmen.sum() > 0.05]
+    for votes, seats in [
+        (zweitstimmen, 598),
+        (zweitstimmen, 709),
+        (election_2017["zweitstimmen_bundesland"].loc[zweitstimmen.index[0]], 200),
+    ]:
+        expected = former(sainte_lague_new_loops, votes.sum() / seats, votes, seats)
+        result = sainte_lague_new(votes.sum() / seats, votes, seats)
+        pd.testing.assert_series_equal(result, expected, check_dtype=False)
+
+
+def test_initial_seats_match_former_search_2017(data_2017):
+    population = data_2017["population"]
+    expected = former(sainte_lague_new_loops, population.sum() / 598, population, 598)
+    result = allocation_seats_after2013(population, 598)
+    pd.testing.assert_series_equal(result, expected, check_dtype=False)
+
+
+def test_sainte_lague_last_matches_former_search_2017(election_2017):
+    # Landeslisten of the largest party with its Direktmandate.
+    zweitstimmen = election_2017["zweitstimmen_bundesland"]
+    partei = election_2017["zweitstimmen_bundesgebiet"]["Bundesgebiet"].idxmax()
+    direktmandate_bundesland = pd.Series(
+        {
+            bundesland: direktmandate(election_2017["erststimmen"][wahlkreise])
+            .loc[partei]
+            .sum()
+            for bundesland, wahlkreise in election_2017[
+                "bundesländer_wahlkreise"
+            ].items()
+        }
+    )
+    votes = zweitstimmen.loc[partei]
+    for seats in [200, 250]:
+        expected = former(
+            sainte_lague_last_loops,
+            votes.sum() / seats,
+            votes,
+            seats,
+            direktmandate_bundesland,
+        )
+        result = sainte_lague_last(
+            votes.sum() / seats, votes, seats, direktmandate_bundesland
+        )
+        pd.testing.assert_series_equal(
+            result, expected, check_dtype=False, check_names=False
+        )
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_sainte_lague_new_matches_former_search(seed):
+    votes, rng = random_votes(seed)
+    seats = int(rng.integers(50, 700))
+    preliminary_divisor = votes.sum() / seats
+
+    expected = former(sainte_lague_new_loops, preliminary_divisor, votes, seats)
+    result = sainte_lague_new(preliminary_divisor, votes, seats)
+
+    if expected is not None:
+        pd.testing.assert_series_equal(result, expected, check_dtype=False)
+    report = sainte_lague_report(votes.to_numpy(), seats)
+    assert_divisor_yields(report, votes.to_numpy(), seats)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_sainte_lague_last_matches_former_search(seed):
+    votes, rng = random_votes(seed, n_max=17)
+    direktmandate_bundesland = pd.Series(rng.integers(0, 20, len(votes)))
+    seats = int(max(direktmandate_bundesland.sum(), rng.integers(50, 300)))
+    preliminary_divisor = votes.sum() / seats
+
+    expected = former(
+        sainte_lague_last_loops,
+        preliminary_divisor,
+        votes,
+        seats,
+        direktmandate_bundesland,
+    )
+    result = sainte_lague_last(
+        preliminary_divisor, votes, seats, direktmandate_bundesland
+    )
+
+    if expected is not None:
+        pd.testing.assert_series_equal(result, expected, check_dtype=False)
+    report = sainte_lague_report(
+        votes.to_numpy(), seats, min_seats=direktmandate_bundesland.to_numpy()
+    )
+    assert_divisor_yields(
+        report, votes.to_numpy(), seats, direktmandate_bundesland.to_numpy()
+    )
+
+
+def test_sainte_lague_report_tie():
+    report = sainte_lague_report(np.array([100.0, 100.0, 50.0]), 1)
+
+    assert not report["converged"]
+    assert np.isnan(report["divisor"])
+    assert report["seats"].sum() == 1
+
+
+def brute_force_margins(votes, seats, min_seats):
+    """Change the votes of each entity one by one until its seats change."""
+
+    allocated_seats = sainte_lague_report(votes, seats, min_seats)["seats"]
+
+    def first_change(entity, changes, direction):
+        for change in changes:
+            changed = votes.copy()
+            changed[entity] += direction * change
+            report = sainte_lague_report(changed, seats, min_seats)
+            # A tie is decided by lot, the seat is not changed for sure.
+            if report["converged"] and (
+                direction * (report["seats"][entity] - allocated_seats[entity]) > 0
+            ):
+                return change
+        return np.inf
+
+    limit = int(10 * votes.sum())
+    votes_to_next_seat = [
+        first_change(entity, range(1, limit), 1) for entity in range(len(votes))
+    ]
+    votes_to_lose_seat = [
+        first_change(entity, range(1, int(votes[entity]) + 1), -1)
+        for entity in range(len(votes))
+    ]
+
+    return allocated_seats, votes_to_next_seat, votes_to_lose_seat
+
+
+def distinct_hoechstzahlen(votes, seats):
+    """Whether no two entities share a Hoechstzahl, so every tie after changing
+    the votes of one entity involves this entity."""
+
+    hoechstzahlen = votes[:, None] / (np.arange(seats + 1) + 0.5)
+    return len(np.unique(hoechstzahlen)) == hoechstzahlen.size
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("with_min_seats", [False, True])
+def test_sainte_lague_margins_match_brute_force(seed, with_min_seats):
+    rng = np.random.default_rng(seed)
+    seats = int(rng.integers(3, 10))
+    votes = rng.integers(5, 60, rng.integers(2, 6)).astype(float)
+    while not distinct_hoechstzahlen(votes, seats):
+        votes = rng.integers(5, 60, len(votes)).astype(float)
+    min_seats = rng.integers(0, 2, len(votes)) if with_min_seats else None
+
+    allocated_seats, votes_to_next_seat, votes_to_lose_seat = brute_force_margins(
+        votes, seats, min_seats
+    )
+    result = sainte_lague_margins(votes, allocated_seats, min_seats)
+
+    np.testing.assert_array_equal(result[0], votes_to_next_seat)
+    np.testing.assert_array_equal(result[1], votes_to_lose_seat)
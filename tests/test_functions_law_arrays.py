@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.functions_law import bundestagswahl_2013_2017
+from src.analysis.functions_law_arrays import bundestagswahl_2013_2017_arrays
+from src.analysis.functions_law_arrays import bundestagswahl_2013_2017_batch
+from src.analysis.functions_law_arrays import election_arrays
+
+ARGUMENTS = [
+    "erststimmen",
+    "zweitstimmen_bundesland",
+    "zweitstimmen_bundesgebiet",
+    "bundesländer_wahlkreise",
+    "initial_seats_by_state",
+]
+
+
+@pytest.fixture(params=["election_2017", "synthetic"])
+def election(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_arrays_match_pandas(election):
+    arguments = [election[name] for name in ARGUMENTS]
+
+    expected = bundestagswahl_2013_2017(*arguments)
+    result = bundestagswahl_2013_2017_arrays(*arguments)
+
+    for frame, expected_frame in zip(result, expected):
+        pd.testing.assert_frame_equal(frame, expected_frame, check_dtype=False)
+
+
+def scenarios(arrays, n_scenarios, seed):
+    """Perturb the votes of election_arrays by up to 20% per party and Gebiet."""
+
+    rng = np.random.default_rng(seed)
+
+    def perturb(votes):
+        noise = rng.uniform(0.8, 1.2, (n_scenarios,) + votes.shape)
+        return np.rint(votes * noise)
+
+    erststimmen = perturb(arrays["erststimmen"])
+    zweitstimmen_bundesland = perturb(arrays["zweitstimmen_bundesland"])
+    return erststimmen, zweitstimmen_bundesland
+
+
+def test_batch_matches_pandas(election):
+    arguments = [election[name] for name in ARGUMENTS]
+    arrays = election_arrays(*arguments)
+    erststimmen, zweitstimmen_bundesland = scenarios(arrays, 6, seed=0)
+    parteien = pd.Index(arrays["parteien"], name="Partei")
+
+    results = bundestagswahl_2013_2017_batch(
+        erststimmen,
+        zweitstimmen_bundesland,
+        arrays["wahlkreis_land"],
+        arrays["initial_seats"],
+    )
+
+    for scenario in range(len(erststimmen)):
+        bundestagssitze = bundestagswahl_2013_2017(
+            pd.DataFrame(
+                erststimmen[scenario],
+                index=parteien,
+                columns=arrays["wahlkreise"],
+            ),
+            pd.DataFrame(
+                zweitstimmen_bundesland[scenario],
+                index=parteien,
+                columns=arrays["bundesländer"],
+            ),
+            pd.DataFrame(
+                {"Bundesgebiet": zweitstimmen_bundesland[scenario].sum(axis=1)},
+                index=parteien,
+            ),
+            election["bundesländer_wahlkreise"],
+            election["initial_seats_by_state"],
+        )[0]
+        expected = (
+            bundestagssitze.T.reindex(index=parteien)
+            .reindex(columns=arrays["bundesländer"])
+            .fillna(0)
+        )
+        np.testing.assert_array_equal(
+            results["bundestagssitze"][scenario], expected.to_numpy()
+        )
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.former_load_data import clean_loops
+from src.analysis.benchmark_suite import read_files
+from src.data_management.functions_load import candidate_lists
+from src.data_management.functions_load import clean_election_results
+from src.data_management.functions_load import clean_population
+from src.data_management.functions_load import gemeinden_wahlkreise
+from src.data_management.functions_load import read_results_chunks
+from src.data_management.functions_load import wahlkreis_totals
+from src.data_management.functions_load import wahlkreise_by_bundesland
+
+
+def test_clean_matches_former_loops():
+    files = read_files()
+    former = clean_loops(files)
+
+    # The former loops keep the numbers as strings and name the columns 0.
+    raw_data = former["raw_data"].copy()
+    raw_data.iloc[:, 2:] = raw_data.iloc[:, 2:].astype(np.int64)
+    pd.testing.assert_frame_equal(
+        clean_election_results(files["kerg"]),
+        raw_data,
+        check_dtype=False,
+        check_names=False,
+    )
+    assert wahlkreise_by_bundesland(files["kerg"]) == (
+        former["bundesländer_wahlkreise"]
+    )
+    pd.testing.assert_frame_equal(
+        clean_population(files["population"]),
+        former["population"].astype({"Deutsche": np.int64}),
+        check_names=False,
+    )
+    listen = candidate_lists(files["bewerber"])
+    assert listen.keys() == former["listen"].keys()
+    for bundesland, parteien in former["listen"].items():
+        assert listen[bundesland].keys() == parteien.keys()
+        for partei, liste in parteien.items():
+            pd.testing.assert_frame_equal(listen[bundesland][partei], liste)
+    assert gemeinden_wahlkreise(files["gemeinden"]) == former["gemeinde_wahlkreis"]
+
+
+@pytest.fixture(scope="module")
+def municipal_2017(data_2017):
+    """Split the votes of each Wahlkreis of 2017 over three Gemeinden."""
+
+    wahlkreise = [
+        wahlkreis
+        for wahlkreise in data_2017["bundesländer_wahlkreise"].values()
+        for wahlkreis in wahlkreise
+    ]
+    raw_data = data_2017["raw_data"]
+    raw_data = raw_data.assign(Stimme=raw_data["Stimme"].astype(str))
+    long = raw_data.melt(
+        id_vars=["Partei", "Stimme"],
+        value_vars=wahlkreise,
+        var_name="Wahlkreis",
+        value_name="Anzahl",
+    )
+
+    rng = np.random.default_rng(0)
+    shares = rng.dirichlet(np.ones(3), len(long))
+    anzahl = np.diff(
+        np.rint(np.cumsum(shares, axis=1) * long["Anzahl"].to_numpy()[:, None]),
+        prepend=0,
+        axis=1,
+    )
+    rows = [
+        long.assign(
+            Gemeinde=long["Wahlkreis"] + f" {gemeinde}",
+            Anzahl=anzahl[:, gemeinde].astype(np.int64),
+        )
+        for gemeinde in range(3)
+    ]
+    municipal = pd.concat(rows).sample(frac=1, random_state=0)
+
+    return municipal, raw_data[["Partei", "Stimme"] + wahlkreise], wahlkreise
+
+
+def sort_rows(data):
+    return data.sort_values(["Partei", "Stimme"]).reset_index(drop=True)
+
+
+def test_wahlkreis_totals_match_raw_data(municipal_2017, tmp_path):
+    municipal, raw_data, wahlkreise = municipal_2017
+    path = tmp_path / "gemeinden.csv"
+    municipal.to_csv(path, sep=";", index=False)
+
+    totals = wahlkreis_totals(read_results_chunks(path, chunksize=5_000), wahlkreise)
+
+    pd.testing.assert_frame_equal(sort_rows(totals), sort_rows(raw_data))
+
+
+def test_wahlkreis_totals_by_gemeinde(municipal_2017):
+    municipal, raw_data, wahlkreise = municipal_2017
+    gemeinde_wahlkreis = dict(zip(municipal["Gemeinde"], municipal["Wahlkreis"]))
+    # Half of the rows only name their Gemeinde.
+    municipal = municipal.assign(
+        Wahlkreis=municipal["Wahlkreis"].where(np.arange(len(municipal)) % 2 == 0)
+    )
+    chunks = np.array_split(municipal, 7)
+
+    totals = wahlkreis_totals(chunks, wahlkreise, gemeinde_wahlkreis)
+
+    pd.testing.assert_frame_equal(sort_rows(totals), sort_rows(raw_data))
+    with pytest.raises(ValueError, match="gemeinde_wahlkreis"):
+        wahlkreis_totals(chunks, wahlkreise)
@@ -0,0 +1,107 @@
+import copy
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.former_people import allocate_listenplaetze_loops
+from src.analysis.benchmark_suite import read_files
+from src.analysis.functions_people import allocate_listenplaetze
+from src.analysis.functions_people import mark_direktmandate
+from src.analysis.functions_people import prepare_lists
+from src.data_management.functions_load import candidate_lists
+
+
+@pytest.fixture(scope="module")
+def listen_2017():
+    return prepare_lists(candidate_lists(read_files()["bewerber"]))
+
+
+def direktkandidaten_frame(listen):
+    """Bundesland, party, position and Wahlkreis of every direct candidate."""
+
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "Bundesland": bundesland,
+                    "Partei": partei,
+                    "position": np.arange(len(liste)),
+                    "Wahlkreis": liste["Wahlkreis_Bez"].to_numpy(),
+                }
+            )
+            for bundesland, parteien in listen.items()
+            for partei, liste in parteien.items()
+        ]
+    ).dropna(subset=["Wahlkreis"])
+
+
+def marked(listen):
+    return {
+        (bundesland, partei, position)
+        for bundesland, parteien in listen.items()
+        for partei, liste in parteien.items()
+        for position in np.flatnonzero(liste["Sitz_Bundestag"].to_numpy())
+    }
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_allocate_listenplaetze_matches_former_loops(listen_2017, seed):
+    rng = np.random.default_rng(seed)
+    listen = copy.deepcopy(listen_2017)
+    bundesländer = list(listen.keys())
+    parteien = sorted({partei for liste in listen.values() for partei in liste})
+    eligible_parties = list(rng.choice(parteien, 8, replace=False))
+
+    # Some candidates hold a Direktmandat already, some quotas exceed the lists.
+    for parteilisten in listen.values():
+        for liste in parteilisten.values():
+            liste["Sitz_Bundestag"] = (rng.random(len(liste)) < 0.2).astype(int)
+    available_list_seats = pd.DataFrame(
+        rng.integers(-2, 30, (len(eligible_parties), len(bundesländer))),
+        index=eligible_parties,
+        columns=bundesländer,
+    )
+    # The former loops need a list for every party with seats in a Bundesland.
+    for bundesland in bundesländer:
+        for partei in eligible_parties:
+            if partei not in listen[bundesland]:
+                available_list_seats.loc[partei, bundesland] = 0
+
+    result = allocate_listenplaetze(
+        copy.deepcopy(listen), bundesländer, eligible_parties, available_list_seats
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = allocate_listenplaetze_loops(
+            copy.deepcopy(listen), bundesländer, eligible_parties, available_list_seats
+        )
+
+    assert marked(result) == marked(expected)
+
+
+def test_mark_direktmandate_marks_tied_winners(listen_2017):
+    kandidaten = direktkandidaten_frame(listen_2017)
+    wahlkreise = kandidaten["Wahlkreis"].unique()[:20].tolist()
+    kandidaten = kandidaten[kandidaten["Wahlkreis"].isin(wahlkreise)]
+    parteien = kandidaten["Partei"].unique()
+
+    # The first candidate of each Wahlkreis wins, in the first Wahlkreis the
+    # first two candidates are tied.
+    winners = kandidaten.groupby("Wahlkreis", sort=False).head(1)
+    winners = pd.concat(
+        [winners, kandidaten[kandidaten["Wahlkreis"] == wahlkreise[0]].iloc[1:2]]
+    )
+    assert len(winners) == len(wahlkreise) + 1
+    direktmandate = pd.DataFrame(0, index=parteien, columns=wahlkreise)
+    for partei, wahlkreis in zip(winners["Partei"], winners["Wahlkreis"]):
+        direktmandate.loc[partei, wahlkreis] = 1
+
+    result = mark_direktmandate(
+        copy.deepcopy(listen_2017), {"Land": wahlkreise}, direktmandate
+    )
+
+    assert marked(result) == set(
+        zip(winners["Bundesland"], winners["Partei"], winners["position"])
+    )
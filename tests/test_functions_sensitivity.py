@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from src.analysis.functions_law import TIE_MESSAGE
+from src.analysis.functions_law_arrays import election_arrays
+from src.analysis.functions_sensitivity import baseline_state
+from src.analysis.functions_sensitivity import bundestagssitze_all_parties
+from src.analysis.functions_sensitivity import decisive_votes
+from src.analysis.functions_sensitivity import smallest_decisive_change
+from src.analysis.functions_sensitivity import update_erststimmen
+from src.analysis.functions_sensitivity import update_zweitstimmen
+
+ARGUMENTS = [
+    "erststimmen",
+    "zweitstimmen_bundesland",
+    "zweitstimmen_bundesgebiet",
+    "bundesländer_wahlkreise",
+    "initial_seats_by_state",
+]
+
+RESULTS = [
+    "eligible",
+    "direktmandate",
+    "listenplätze",
+    "mindestsitzzahl",
+    "seats_rounded",
+    "bundestagssitze",
+    "überhang",
+    "ausgleich",
+]
+
+
+@pytest.fixture(scope="module", params=["election_2017", "synthetic"])
+def arrays(request):
+    election = request.getfixturevalue(request.param)
+    return election_arrays(*[election[name] for name in ARGUMENTS])
+
+
+def assert_same_results(state, expected):
+    for name in RESULTS:
+        np.testing.assert_array_equal(state[name], expected[name], err_msg=name)
+
+
+def test_update_erststimmen_matches_full_recompute(arrays):
+    state = baseline_state(arrays)
+    rng = np.random.default_rng(0)
+    for wahlkreis in rng.choice(len(arrays["wahlkreise"]), 10, replace=False):
+        # The runner-up wins the Wahlkreis by one vote.
+        erststimmen_wahlkreis = arrays["erststimmen"][:, wahlkreis].copy()
+        first, second = np.argsort(-erststimmen_wahlkreis, kind="stable")[:2]
+        erststimmen_wahlkreis[second] = erststimmen_wahlkreis[first] + 1
+
+        new_state = update_erststimmen(state, wahlkreis, erststimmen_wahlkreis)
+        changed = dict(arrays, erststimmen=arrays["erststimmen"].copy())
+        changed["erststimmen"][:, wahlkreis] = erststimmen_wahlkreis
+
+        assert_same_results(new_state, baseline_state(changed))
+
+
+def test_update_erststimmen_does_not_modify_state(arrays):
+    state = baseline_state(arrays)
+    bundestagssitze = state["bundestagssitze"].copy()
+    erststimmen_wahlkreis = arrays["erststimmen"][::-1, 0].copy()
+
+    update_erststimmen(state, 0, erststimmen_wahlkreis)
+
+    np.testing.assert_array_equal(state["bundestagssitze"], bundestagssitze)
+    np.testing.assert_array_equal(state["erststimmen"], arrays["erststimmen"])
+
+
+@pytest.mark.parametrize("change", [-200_000, -5_000, 5_000, 200_000])
+def test_update_zweitstimmen_matches_full_recompute(arrays, change):
+    state = baseline_state(arrays)
+    rng = np.random.default_rng(abs(change))
+    for _ in range(5):
+        partei = rng.integers(len(arrays["parteien"]))
+        land = rng.integers(len(arrays["bundesländer"]))
+        if arrays["zweitstimmen_bundesland"][partei, land] + change < 0:
+            continue
+
+        new_state = update_zweitstimmen(state, partei, land, change)
+        changed = dict(
+            arrays,
+            zweitstimmen_bundesland=arrays["zweitstimmen_bundesland"].copy(),
+            zweitstimmen_bundesgebiet=arrays["zweitstimmen_bundesgebiet"].copy(),
+        )
+        changed["zweitstimmen_bundesland"][partei, land] += change
+        changed["zweitstimmen_bundesgebiet"][partei] += change
+
+        assert_same_results(new_state, baseline_state(changed))
+
+
+@pytest.mark.parametrize("threshold", [1, 2, 3, 7, 64, 65, 999, 1000, 1001])
+def test_smallest_decisive_change_matches_linear_search(threshold):
+    calls = []
+
+    def seats_changed(change):
+        calls.append(change)
+        return change >= threshold
+
+    expected = next(
+        (change for change in range(1, 1001) if seats_changed(change)), None
+    )
+    calls.clear()
+
+    assert smallest_decisive_change(seats_changed, 1000) == expected
+    assert len(calls) <= 2 * np.log2(1000) + 2
+
+
+def test_decisive_votes_are_smallest(synthetic):
+    state = baseline_state(election_arrays(*[synthetic[name] for name in ARGUMENTS]))
+    bundestagssitze = bundestagssitze_all_parties(state)
+    decisive = decisive_votes(state, max_change=100_000).dropna()
+
+    assert len(decisive) > 0
+    for (partei, bundesland, richtung), row in decisive.iterrows():
+        position = state["parteien"].index(partei)
+        land = state["bundesländer"].index(bundesland)
+        change = int(row["benötigte Stimmen"])
+
+        # One vote less leaves all seats or ends in a tie decided by lot.
+        try:
+            seats = bundestagssitze_all_parties(
+                update_zweitstimmen(state, position, land, richtung * (change - 1))
+            )
+            assert np.array_equal(seats, bundestagssitze)
+        except ValueError as error:
+            assert str(error) == TIE_MESSAGE
+
+        seats = bundestagssitze_all_parties(
+            update_zweitstimmen(state, position, land, richtung * change)
+        )
+        assert np.abs(seats - bundestagssitze).sum() == row["# geänderte Sitze"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.functions_simulation import baseline_votes
+from src.analysis.functions_simulation import simulate_seat_distribution
+
+
+@pytest.fixture(scope="module")
+def baseline_2017(data_2017, election_2017):
+    baseline = baseline_votes(
+        data_2017["raw_data"], data_2017["bundesländer_wahlkreise"]
+    )
+    initial_seats = (
+        election_2017["initial_seats_by_state"]
+        .reindex(baseline["bundesländer"])
+        .to_numpy()
+    )
+    return baseline, initial_seats
+
+
+@pytest.mark.parametrize("law", ["2013_2017", "2023"])
+def test_simulation_does_not_depend_on_workers(baseline_2017, law):
+    baseline, initial_seats = baseline_2017
+    distributions = [
+        simulate_seat_distribution(
+            baseline,
+            initial_seats,
+            n_draws=50,
+            seed=3,
+            chunk_size=20,
+            n_workers=n_workers,
+            law=law,
+        )
+        for n_workers in [1, 3]
+    ]
+
+    for name in ["seats", "überhang"]:
+        pd.testing.assert_frame_equal(distributions[0][name], distributions[1][name])
+    pd.testing.assert_series_equal(
+        distributions[0]["bundestag_size"], distributions[1]["bundestag_size"]
+    )
+    assert distributions[0]["telemetry"] == distributions[1]["telemetry"]
+
+
+def test_simulation_depends_on_seed(baseline_2017):
+    baseline, initial_seats = baseline_2017
+    seats = [
+        simulate_seat_distribution(
+            baseline, initial_seats, n_draws=20, seed=seed, n_workers=1
+        )["seats"]
+        for seed in [0, 1]
+    ]
+
+    assert not np.array_equal(seats[0].to_numpy(), seats[1].to_numpy())
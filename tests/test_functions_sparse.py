@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.functions_law import bundestagswahl_2013_2017
+from src.analysis.functions_law import direktmandate
+from src.analysis.functions_law_arrays import direktmandate_batch
+from src.analysis.functions_sparse import direktmandate_sparse_tied
+from src.analysis.functions_sparse import land_sums_sparse
+from src.analysis.functions_sparse import sparse_erststimmen
+
+ARGUMENTS = [
+    "erststimmen",
+    "zweitstimmen_bundesland",
+    "zweitstimmen_bundesgebiet",
+    "bundesländer_wahlkreise",
+    "initial_seats_by_state",
+]
+
+
+def small_erststimmen(rng, n_scenarios):
+    """Few votes per party, so there are many ties and Wahlkreise without votes."""
+
+    n_parteien, n_wahlkreise = rng.integers(1, 6), rng.integers(1, 9)
+    erststimmen = rng.integers(0, 3, (n_scenarios, n_parteien, n_wahlkreise))
+    erststimmen = erststimmen * (rng.random(n_wahlkreise) > 0.2)
+    wahlkreis_land = rng.integers(0, 3, n_wahlkreise)
+    return erststimmen.astype(float), wahlkreis_land
+
+
+def dense_direktmandate(erststimmen, wahlkreis_land, n_länder):
+    winners = pd.DataFrame(erststimmen).apply(direktmandate).to_numpy()
+    return np.stack(
+        [winners[:, wahlkreis_land == land].sum(axis=1) for land in range(n_länder)],
+        axis=1,
+    )
+
+
+@pytest.mark.parametrize("name", ["election_2017", "synthetic"])
+def test_sparse_erststimmen_match_dense(request, name):
+    election = request.getfixturevalue(name)
+    arguments = [election[argument] for argument in ARGUMENTS]
+
+    expected = bundestagswahl_2013_2017(*arguments)
+    result = bundestagswahl_2013_2017(
+        sparse_erststimmen(election["erststimmen"]), *arguments[1:]
+    )
+
+    for frame, expected_frame in zip(result, expected):
+        pd.testing.assert_frame_equal(frame, expected_frame)
+
+
+def test_sparse_ties_match_dense():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        erststimmen, wahlkreis_land = small_erststimmen(rng, 3)
+        result = direktmandate_sparse_tied(
+            sparse_erststimmen(erststimmen), wahlkreis_land, 3
+        )
+        for scenario in range(len(erststimmen)):
+            np.testing.assert_array_equal(
+                result[scenario],
+                dense_direktmandate(erststimmen[scenario], wahlkreis_land, 3),
+            )
+
+
+def test_sparse_batch_match_dense():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        erststimmen, wahlkreis_land = small_erststimmen(rng, 4)
+        sparse = sparse_erststimmen(erststimmen)
+        for result, expected in zip(
+            direktmandate_batch(sparse, wahlkreis_land, 3),
+            direktmandate_batch(erststimmen, wahlkreis_land, 3),
+        ):
+            np.testing.assert_array_equal(result, expected)
+        np.testing.assert_array_equal(
+            land_sums_sparse(sparse, wahlkreis_land, 3),
+            np.stack(
+                [
+                    erststimmen[:, :, wahlkreis_land == land].sum(axis=2)
+                    for land in range(3)
+                ],
+                axis=2,
+            ),
+        )
+
+
+def test_sparse_erststimmen_of_several_scenarios_raise(election_2017):
+    arguments = [election_2017[argument] for argument in ARGUMENTS]
+    erststimmen = sparse_erststimmen(
+        np.stack([election_2017["erststimmen"].to_numpy()] * 2)
+    )
+    erststimmen.update(
+        parteien=election_2017["erststimmen"].index,
+        wahlkreise=election_2017["erststimmen"].columns.tolist(),
+    )
+
+    with pytest.raises(ValueError, match="2 scenarios"):
+        bundestagswahl_2013_2017(erststimmen, *arguments[1:])
+    with pytest.raises(ValueError, match="labels"):
+        bundestagswahl_2013_2017(
+            sparse_erststimmen(election_2017["erststimmen"].to_numpy()),
+            *arguments[1:],
+        )